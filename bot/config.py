@@ -19,4 +19,13 @@ class BotConfig:
     token: str = _load_token()
         
     # ИСПОЛЬЗУЕМ SQLITE вместо PostgreSQL
-    database_url: str = "sqlite:///coffee_quality.db"
\ No newline at end of file
+    database_url: str = "sqlite:///coffee_quality.db"
+    # Состояния диалогов переживают перезапуск бота
+    persistence_path: str = "bot_state.db"
+    # Сжатые бэкапы coffee_quality.db (database/backup.py)
+    backup_dir: str = "backups"
+    # Локальный кэш миниатюр фото оценок (utils/photo_cache.py), 0 - выключен
+    photo_cache_dir: str = "photo_cache"
+    photo_cache_budget_mb: int = 200
+    # Процессы рисования графиков статистики (utils/charts.py)
+    chart_workers: int = 2
\ No newline at end of file
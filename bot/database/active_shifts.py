@@ -0,0 +1,99 @@
+"""Индекс смен, открытых для чек-листа прямо сейчас, поверх снимка расписания"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import threading
+import logging
+
+from .schedule_snapshot import ScheduleSnapshot, SnapshotShift, get_schedule_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Чек-лист доступен за час до начала смены и в течение часа после окончания
+CHECKLIST_WINDOW = timedelta(hours=1)
+# Период фонового обновления индекса (JobQueue)
+ACTIVE_SHIFTS_REFRESH_SECONDS = 60
+
+@dataclass(frozen=True)
+class ActiveShift:
+    """Смена сотрудника с окном доступности чек-листа"""
+    shift: SnapshotShift
+    user_id: Optional[int]
+    starts_at: datetime
+    ends_at: datetime
+
+    @property
+    def opens_at(self) -> datetime:
+        return self.starts_at - CHECKLIST_WINDOW
+
+    @property
+    def closes_at(self) -> datetime:
+        return self.ends_at + CHECKLIST_WINDOW
+
+    def is_open(self, now: datetime) -> bool:
+        return self.opens_at <= now <= self.closes_at
+
+    def is_in_progress(self, now: datetime) -> bool:
+        return self.starts_at <= now < self.ends_at
+
+def _make_active_shift(shift: SnapshotShift, user_id: Optional[int]) -> ActiveShift:
+    starts_at = datetime.combine(shift.shift_date, shift.start_time)
+    ends_at = datetime.combine(shift.shift_date, shift.end_time)
+    # Смена через полночь заканчивается на следующий день
+    if ends_at <= starts_at:
+        ends_at += timedelta(days=1)
+    return ActiveShift(shift=shift, user_id=user_id, starts_at=starts_at, ends_at=ends_at)
+
+class ActiveShiftIndex:
+    """Смены вчера/сегодня/завтра по сотруднику: вчерашние ночные и завтрашние ранние тоже попадают в окно"""
+
+    def __init__(self, snapshot: ScheduleSnapshot, day: date):
+        self.snapshot = snapshot
+        self.day = day
+        self.by_iiko_id: Dict[str, Tuple[ActiveShift, ...]] = {}
+        self.iiko_id_by_user_id: Dict[int, str] = {
+            user.user_id: iiko_id for iiko_id, user in snapshot.users.items()
+        }
+
+        shifts_by_iiko_id: Dict[str, List[ActiveShift]] = {}
+        for offset in (-1, 0, 1):
+            for slot in snapshot.by_date.get(day + timedelta(days=offset), {}).values():
+                for shift in slot:
+                    user = snapshot.users.get(shift.iiko_id)
+                    shifts_by_iiko_id.setdefault(shift.iiko_id, []).append(
+                        _make_active_shift(shift, user.user_id if user else None)
+                    )
+        for iiko_id, shifts in shifts_by_iiko_id.items():
+            self.by_iiko_id[iiko_id] = tuple(sorted(shifts, key=lambda active: active.starts_at))
+
+    def get_for_iiko_id(self, iiko_id: str, now: Optional[datetime] = None) -> Optional[ActiveShift]:
+        """Смена, на которой сотрудник сейчас (идущая смена важнее соседней, чье окно тоже открыто)"""
+        now = now or datetime.now()
+        open_shifts = [active for active in self.by_iiko_id.get(str(iiko_id), ()) if active.is_open(now)]
+        if not open_shifts:
+            return None
+        return min(open_shifts, key=lambda active: (not active.is_in_progress(now), active.starts_at))
+
+    def get_for_user_id(self, user_id: int, now: Optional[datetime] = None) -> Optional[ActiveShift]:
+        iiko_id = self.iiko_id_by_user_id.get(user_id)
+        if iiko_id is None:
+            return None
+        return self.get_for_iiko_id(iiko_id, now)
+
+_index: Optional[ActiveShiftIndex] = None
+_index_lock = threading.Lock()
+
+def get_active_shift_index() -> ActiveShiftIndex:
+    """Актуальный индекс: перестраивается при смене дня или снимка расписания"""
+    global _index
+    snapshot = get_schedule_snapshot()
+    today = date.today()
+    with _index_lock:
+        if _index is None or _index.snapshot is not snapshot or _index.day != today:
+            _index = ActiveShiftIndex(snapshot, today)
+            logger.debug(f"🕒 Индекс активных смен перестроен: {len(_index.by_iiko_id)} сотрудников")
+        return _index
+
+def refresh_active_shift_index():
+    """Прогреть снимок и индекс заранее, чтобы нажатие кнопки не ждало запросов к БД"""
+    get_active_shift_index()
@@ -0,0 +1,179 @@
+"""Архив старых оценок и отметок чек-листа: горячие таблицы и их индексы остаются маленькими"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+import sqlite3
+import threading
+import logging
+
+from .models import engine
+
+logger = logging.getLogger(__name__)
+
+# Строки старше стольких полных месяцев уезжают в архив
+ARCHIVE_AFTER_MONTHS = 12
+# Строк за транзакцию: бот не ждет запись дольше одной пачки
+BATCH_SIZE = 5000
+
+@dataclass(frozen=True)
+class ArchivedTable:
+    """Горячая таблица, ее архив и выражение даты, по которому режем"""
+    table: str
+    date_expr: str
+    index_columns: str
+
+    @property
+    def archive_table(self) -> str:
+        return f"{self.table}_archive"
+
+DRINK_REVIEWS = ArchivedTable("drink_reviews", "DATE(created_at)", "created_at")
+CHECKLIST_LOGS = ArchivedTable("checklist_logs", "shift_date", "shift_date, point")
+ARCHIVED_TABLES = (DRINK_REVIEWS, CHECKLIST_LOGS)
+
+# table -> дата, раньше которой строки лежат только в архиве (None - архива нет)
+_boundaries: Optional[Dict[str, date]] = None
+_boundaries_lock = threading.Lock()
+
+def _connect() -> sqlite3.Connection:
+    return sqlite3.connect(engine.url.database, timeout=30)
+
+def _load_boundaries() -> Dict[str, date]:
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='archive_watermarks'")
+        if not cursor.fetchone():
+            return {}
+        cursor.execute("SELECT table_name, archived_before FROM archive_watermarks")
+        return {name: date.fromisoformat(archived_before) for name, archived_before in cursor.fetchall()}
+    finally:
+        conn.close()
+
+def get_archive_boundary(spec: ArchivedTable) -> Optional[date]:
+    """Дата, раньше которой строки таблицы лежат в архиве"""
+    global _boundaries
+    with _boundaries_lock:
+        if _boundaries is None:
+            _boundaries = _load_boundaries()
+        return _boundaries.get(spec.table)
+
+def reaches_archive(spec: ArchivedTable, start_date: Optional[date]) -> bool:
+    """Нужен ли архив для периода, начинающегося с start_date (None - с начала времен)"""
+    boundary = get_archive_boundary(spec)
+    return boundary is not None and (start_date is None or start_date < boundary)
+
+def source_sql(spec: ArchivedTable, columns: Sequence[str], start_date: Optional[date]) -> str:
+    """FROM-источник для отчета: горячая таблица или она же вместе с архивом"""
+    if not reaches_archive(spec, start_date):
+        return spec.table
+    column_list = ", ".join(columns)
+    return (
+        f"(SELECT {column_list} FROM {spec.table} "
+        f"UNION ALL SELECT {column_list} FROM {spec.archive_table})"
+    )
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+def _ensure_archive_table(cursor: sqlite3.Cursor, spec: ArchivedTable) -> List[str]:
+    """Создать архив по образцу горячей таблицы и дотянуть новые колонки. Возвращает общие колонки."""
+    hot_columns = _columns(cursor, spec.table)
+    archive_columns = _columns(cursor, spec.archive_table)
+    if not archive_columns:
+        cursor.execute(f"CREATE TABLE {spec.archive_table} AS SELECT * FROM {spec.table} WHERE 0")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{spec.archive_table}_date "
+            f"ON {spec.archive_table} ({spec.index_columns})"
+        )
+        archive_columns = list(hot_columns)
+    for column in hot_columns:
+        if column not in archive_columns:
+            cursor.execute(f"ALTER TABLE {spec.archive_table} ADD COLUMN {column}")
+    return hot_columns
+
+def _months_ago(today: date, months: int) -> date:
+    """Первое число месяца, отстоящего на months месяцев назад"""
+    month_index = today.year * 12 + today.month - 1 - months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def archive_table(spec: ArchivedTable, cutoff: date) -> int:
+    """Перенести строки spec старше cutoff в архив. Возвращает количество перенесенных строк."""
+    conn = _connect()
+    cursor = conn.cursor()
+    moved = 0
+    try:
+        columns = _ensure_archive_table(cursor, spec)
+        column_list = ", ".join(columns)
+        # Граница сдвигается до переноса: пока идут пачки, отчеты уже читают обе таблицы
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS archive_watermarks "
+            "(table_name TEXT PRIMARY KEY, archived_before DATE NOT NULL)"
+        )
+        cursor.execute(
+            "INSERT INTO archive_watermarks (table_name, archived_before) VALUES (?, ?) "
+            "ON CONFLICT(table_name) DO UPDATE SET archived_before = MAX(archived_before, excluded.archived_before)",
+            (spec.table, cutoff.isoformat())
+        )
+        conn.commit()
+        _forget_boundaries()
+
+        while True:
+            # Каждая пачка - одна транзакция: строка всегда ровно в одной из таблиц
+            # Строка с наибольшим id остается: без AUTOINCREMENT SQLite иначе выдал бы новым строкам id из архива
+            cursor.execute(
+                f"SELECT id FROM {spec.table} WHERE {spec.date_expr} < ? "
+                f"AND id < (SELECT MAX(id) FROM {spec.table}) ORDER BY id LIMIT ?",
+                (cutoff.isoformat(), BATCH_SIZE)
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            placeholders = ", ".join("?" * len(ids))
+            cursor.execute(
+                f"INSERT INTO {spec.archive_table} ({column_list}) "
+                f"SELECT {column_list} FROM {spec.table} WHERE id IN ({placeholders})",
+                ids
+            )
+            cursor.execute(f"DELETE FROM {spec.table} WHERE id IN ({placeholders})", ids)
+            conn.commit()
+            moved += len(ids)
+        return moved
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Ошибка архивации {spec.table}: {e}")
+        raise
+    finally:
+        conn.close()
+
+def archive_old_rows(months: int = ARCHIVE_AFTER_MONTHS, today: Optional[date] = None) -> Dict[str, int]:
+    """Перенести в архив строки старше months полных месяцев из всех архивируемых таблиц"""
+    cutoff = _months_ago(today or date.today(), months)
+    moved = {spec.table: archive_table(spec, cutoff) for spec in ARCHIVED_TABLES}
+    if any(moved.values()):
+        logger.info(f"🗄️ Архивация до {cutoff}: " + ", ".join(f"{table} {count}" for table, count in moved.items()))
+    return moved
+
+def clear_with_archive(spec: ArchivedTable) -> int:
+    """Удалить все строки таблицы вместе с архивом. Возвращает количество удаленных строк."""
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM {spec.table}")
+        deleted = cursor.rowcount
+        if _columns(cursor, spec.archive_table):
+            cursor.execute(f"DELETE FROM {spec.archive_table}")
+            deleted += cursor.rowcount
+        conn.commit()
+        return deleted
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Ошибка очистки {spec.table}: {e}")
+        raise
+    finally:
+        conn.close()
+
+def _forget_boundaries():
+    global _boundaries
+    with _boundaries_lock:
+        _boundaries = None
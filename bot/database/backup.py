@@ -0,0 +1,128 @@
+"""Онлайн-бэкап coffee_quality.db: согласованный снимок без остановки бота"""
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+import logging
+
+from bot.config import BotConfig
+from .models import engine
+
+logger = logging.getLogger(__name__)
+
+# Страниц за шаг backup API: между шагами блокировка снимается и бот может писать
+PAGES_PER_STEP = 256
+STEP_PAUSE_SECONDS = 0.005
+# Запись в БД во время копирования перезапускает его; после стольких перезапусков - VACUUM INTO
+MAX_RESTARTS = 5
+# Сколько последних бэкапов каждого типа хранить
+BACKUPS_TO_KEEP = 14
+
+class _TooManyRestarts(Exception):
+    pass
+
+def _database_path() -> str:
+    return engine.url.database
+
+def _backup_dir() -> Path:
+    path = Path(BotConfig.backup_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _copy_online(source_path: str, target_path: str):
+    """Постраничное копирование через sqlite3 backup API"""
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        # Кто-то записал в БД - SQLite начал копирование заново
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(STEP_PAUSE_SECONDS)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=PAGES_PER_STEP, progress=progress)
+    finally:
+        target.close()
+        source.close()
+
+def _copy_vacuum_into(source_path: str, target_path: str):
+    """Снимок одной читающей транзакцией (заодно без пустых страниц)"""
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    source = sqlite3.connect(source_path)
+    try:
+        source.execute("VACUUM INTO ?", (target_path,))
+    finally:
+        source.close()
+
+def create_backup(label: str = "scheduled", keep: int = BACKUPS_TO_KEEP) -> Path:
+    """Снять бэкап в backups/coffee_quality_<label>_<время>.db.gz. Блокирующая - вызывать вне event loop."""
+    started = time.monotonic()
+    source_path = _database_path()
+    backup_dir = _backup_dir()
+    name = f"coffee_quality_{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+    raw_path = backup_dir / f"{name}.tmp"
+    partial_path = backup_dir / f"{name}.gz.part"
+    final_path = backup_dir / f"{name}.gz"
+
+    try:
+        try:
+            _copy_online(source_path, str(raw_path))
+        except _TooManyRestarts:
+            logger.warning("⚠️ БД часто меняется во время бэкапа, снимаем через VACUUM INTO")
+            _copy_vacuum_into(source_path, str(raw_path))
+
+        check = sqlite3.connect(str(raw_path))
+        try:
+            result = check.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            check.close()
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Бэкап не прошел quick_check: {result}")
+
+        with open(raw_path, "rb") as raw, gzip.open(partial_path, "wb", compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed)
+        # Готовый файл появляется целиком или не появляется вовсе
+        os.replace(partial_path, final_path)
+    except Exception as e:
+        logger.error(f"❌ Ошибка бэкапа БД: {e}")
+        raise
+    finally:
+        for leftover in (raw_path, partial_path):
+            if leftover.exists():
+                leftover.unlink()
+
+    removed = prune_backups(label, keep)
+    logger.info(
+        f"📦 Бэкап {final_path.name}: {final_path.stat().st_size // 1024} КБ "
+        f"за {time.monotonic() - started:.1f} сек, удалено старых: {removed}"
+    )
+    return final_path
+
+def list_backups(label: Optional[str] = None) -> List[Path]:
+    """Бэкапы от новых к старым"""
+    pattern = f"coffee_quality_{label}_*.db.gz" if label else "coffee_quality_*.db.gz"
+    return sorted(_backup_dir().glob(pattern), key=lambda path: path.stat().st_mtime, reverse=True)
+
+def prune_backups(label: str, keep: int = BACKUPS_TO_KEEP) -> int:
+    """Удалить старые бэкапы типа label, оставив keep последних"""
+    outdated = list_backups(label)[keep:]
+    for path in outdated:
+        path.unlink()
+    return len(outdated)
+
+def restore_backup(backup_path: Path, target_path: str):
+    """Распаковать бэкап в отдельный файл (живую БД не трогает)"""
+    with gzip.open(backup_path, "rb") as packed, open(target_path, "wb") as raw:
+        shutil.copyfileobj(packed, raw)
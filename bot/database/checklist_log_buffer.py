@@ -0,0 +1,223 @@
+"""Буфер отметок чек-листа: пользователю отвечаем сразу, в checklist_logs пишем пачками"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+import json
+import os
+import threading
+import logging
+
+from sqlalchemy import and_, delete, exists, insert, literal, select, Date, DateTime
+
+from .models import SessionLocal, ChecklistLog
+from .report_cache import invalidate_report_cache
+
+logger = logging.getLogger(__name__)
+
+CHECKLIST_OUTBOX_PATH = "checklist_outbox.jsonl"
+# Часть outbox, которая сейчас пишется в БД (суффикс к пути outbox)
+FLUSHING_SUFFIX = ".flushing"
+# Как часто накопленные отметки уходят в БД
+FLUSH_INTERVAL_SECONDS = 0.3
+
+@dataclass(frozen=True)
+class CompletionEvent:
+    """Итоговое состояние задачи на смене (не переключение - повтор безопасен)"""
+    user_id: int
+    task_id: int
+    shift_date: date
+    shift_type: str
+    point: str
+    completed: bool
+    recorded_at: datetime
+
+    @property
+    def key(self) -> Tuple[int, date, str]:
+        return self.task_id, self.shift_date, self.point
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "user_id": self.user_id,
+            "task_id": self.task_id,
+            "shift_date": self.shift_date.isoformat(),
+            "shift_type": self.shift_type,
+            "point": self.point,
+            "completed": self.completed,
+            "recorded_at": self.recorded_at.isoformat(),
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> "CompletionEvent":
+        data = json.loads(line)
+        return cls(
+            user_id=data["user_id"],
+            task_id=data["task_id"],
+            shift_date=date.fromisoformat(data["shift_date"]),
+            shift_type=data["shift_type"],
+            point=data["point"],
+            completed=data["completed"],
+            recorded_at=datetime.fromisoformat(data["recorded_at"]),
+        )
+
+def completion_statement(event: CompletionEvent):
+    """Запрос, приводящий checklist_logs к состоянию события.
+
+    Повторная отметка не создает дубликат, снятие удаляет отметку независимо от того, кто ее поставил.
+    """
+    task_filter = and_(
+        ChecklistLog.task_id == event.task_id,
+        ChecklistLog.shift_date == event.shift_date,
+        ChecklistLog.point == event.point
+    )
+    if not event.completed:
+        return delete(ChecklistLog).where(task_filter)
+
+    values = select(
+        literal(event.user_id), literal(event.task_id), literal(event.shift_date, Date),
+        literal(event.shift_type), literal(event.point), literal(event.recorded_at, DateTime),
+        literal(event.user_id)
+    ).where(~exists().where(task_filter))
+    return insert(ChecklistLog).from_select(
+        ['user_id', 'task_id', 'shift_date', 'shift_type', 'point', 'completed_at', 'completed_by_user_id'],
+        values
+    )
+
+def apply_completion_events(events: List[CompletionEvent]):
+    """Записать пачку событий одной транзакцией"""
+    db = SessionLocal()
+    try:
+        for event in events:
+            db.execute(completion_statement(event))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка записи пачки отметок чек-листа: {e}")
+        raise
+    finally:
+        db.close()
+
+    for shift_date in {event.shift_date for event in events}:
+        invalidate_report_cache(shift_date)
+
+class ChecklistLogBuffer:
+    """Отметки копятся в памяти (последнее состояние на задачу) и в outbox-файле на случай падения.
+
+    При записи пачки outbox переименовывается в .flushing вместе с забранными событиями, новые отметки
+    идут в свежий файл. После записи в БД .flushing удаляется, так что outbox не растет под потоком отметок.
+    """
+
+    def __init__(self, outbox_path: str = CHECKLIST_OUTBOX_PATH):
+        self.outbox_path = outbox_path
+        self._pending: Dict[Tuple[int, date, str], CompletionEvent] = {}
+        self._lock = threading.Lock()
+        # Пишет в БД только один flush одновременно
+        self._flush_lock = threading.Lock()
+        self._outbox = None
+
+    @property
+    def flushing_path(self) -> str:
+        return self.outbox_path + FLUSHING_SUFFIX
+
+    def record(self, event: CompletionEvent):
+        """Принять отметку: строка в outbox и итоговое состояние в памяти"""
+        with self._lock:
+            if self._outbox is None:
+                self._outbox = open(self.outbox_path, "a", encoding="utf-8")
+            self._outbox.write(event.to_json() + "\n")
+            self._outbox.flush()
+            self._pending[event.key] = event
+
+    def pending_states(self, shift_date: date, point: str) -> Dict[int, bool]:
+        """Еще не записанные состояния задач смены: task_id -> выполнено"""
+        with self._lock:
+            return {
+                event.task_id: event.completed
+                for event in self._pending.values()
+                if event.shift_date == shift_date and event.point == point
+            }
+
+    def flush(self) -> int:
+        """Записать накопленное в БД. Возвращает количество записанных событий."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+                if not batch:
+                    return 0
+                # Строки забранных событий уходят в .flushing, новые отметки - в свежий outbox
+                self._rotate_outbox()
+
+            try:
+                apply_completion_events(list(batch.values()))
+            except Exception:
+                with self._lock:
+                    # Возвращаем в очередь, более свежие отметки не перетираем
+                    restored = [event for key, event in batch.items() if key not in self._pending]
+                    for event in restored:
+                        self._pending[event.key] = event
+                    # и в outbox: после падения они должны восстановиться из него
+                    self._append_outbox(restored)
+                    os.remove(self.flushing_path)
+                return 0
+
+            os.remove(self.flushing_path)
+            logger.debug(f"💾 Записано отметок чек-листа: {len(batch)}")
+            return len(batch)
+
+    def _append_outbox(self, events: List[CompletionEvent]):
+        if not events:
+            return
+        if self._outbox is None:
+            self._outbox = open(self.outbox_path, "a", encoding="utf-8")
+        self._outbox.write("".join(event.to_json() + "\n" for event in events))
+        self._outbox.flush()
+
+    def _rotate_outbox(self):
+        """Перенести outbox в .flushing (дописать, если .flushing остался после падения)"""
+        if self._outbox is not None:
+            self._outbox.close()
+            self._outbox = None
+        if not os.path.exists(self.outbox_path):
+            # Пишем то, что восстановлено из .flushing, или outbox еще не создан
+            open(self.flushing_path, "a", encoding="utf-8").close()
+            return
+        if not os.path.exists(self.flushing_path):
+            os.replace(self.outbox_path, self.flushing_path)
+            return
+        with open(self.outbox_path, encoding="utf-8") as source, \
+                open(self.flushing_path, "a", encoding="utf-8") as target:
+            target.write(source.read())
+        os.remove(self.outbox_path)
+
+    def recover(self) -> int:
+        """Дописать в БД отметки из outbox, оставшиеся после падения бота"""
+        # .flushing старше outbox: читаем первым, чтобы более поздние состояния победили
+        paths = [path for path in (self.flushing_path, self.outbox_path) if os.path.exists(path)]
+        if not paths:
+            return 0
+
+        with self._lock:
+            for path in paths:
+                with open(path, encoding="utf-8") as handle:
+                    for line_number, line in enumerate(handle, start=1):
+                        if not line.strip():
+                            continue
+                        try:
+                            event = CompletionEvent.from_json(line)
+                        except (ValueError, KeyError) as e:
+                            # Недописанная последняя строка при падении
+                            logger.warning(f"⚠️ Пропущена строка {line_number} {path}: {e}")
+                            continue
+                        self._pending[event.key] = event
+            recovered = len(self._pending)
+            if not recovered:
+                # Только пустые или битые строки - перечитывать их при каждом старте незачем
+                for path in paths:
+                    os.remove(path)
+
+        if recovered:
+            logger.info(f"🔄 Восстановлено {recovered} отметок чек-листа из outbox")
+        self.flush()
+        return recovered
+
+checklist_log_buffer = ChecklistLogBuffer()
@@ -1,9 +1,15 @@
 """Операции для работы с чек-листами"""
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from .models import SessionLocal, ChecklistTemplate, HybridShiftAssignment, ChecklistLog, User, Schedule, ShiftType, HybridAssignmentTask
-from typing import Optional, List, Dict
-from datetime import date, datetime, time, timedelta
+from sqlalchemy import and_, or_, text, select
+from .models import SessionLocal, ChecklistTemplate, HybridShiftAssignment, ChecklistLog, Schedule, ShiftType, HybridAssignmentTask
+from .read_models import TaskView, HybridAssignmentView, TASK_COLUMNS, HYBRID_ASSIGNMENT_COLUMNS
+from .unit_of_work import use_session
+from .report_cache import invalidate_report_cache
+from .checklist_log_buffer import checklist_log_buffer, CompletionEvent
+from .active_shifts import ActiveShift, get_active_shift_index
+from .archive import CHECKLIST_LOGS, reaches_archive, source_sql
+from typing import Optional, List
+from datetime import date, datetime, time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,6 +27,7 @@ def create_checklist_template(day_of_week: int, shift_type: str, task_descriptio
         )
         db.add(template)
         db.commit()
+        invalidate_report_cache()
         db.refresh(template)
         logger.info(f"Создан шаблон чек-листа ID {template.id} {shift_type} день {day_of_week}")
         return template
@@ -32,22 +39,19 @@ def create_checklist_template(day_of_week: int, shift_type: str, task_descriptio
         db.close()
 
 def get_checklist_templates(day_of_week: Optional[int] = None, 
-                          shift_type: Optional[str] = None) -> List[ChecklistTemplate]:
+                          shift_type: Optional[str] = None, db: Optional[Session] = None) -> List[TaskView]:
     """Получить шаблоны чек-листов с фильтрами"""
-    db = SessionLocal()
-    try:
-        query = db.query(ChecklistTemplate).filter(ChecklistTemplate.is_active == 1)
+    with use_session(db) as db:
+        query = select(*TASK_COLUMNS).where(ChecklistTemplate.is_active == 1)
         
         #if point:
-            #query = query.filter(ChecklistTemplate.point == point)
+            #query = query.where(ChecklistTemplate.point == point)
         if day_of_week is not None:
-            query = query.filter(ChecklistTemplate.day_of_week == day_of_week)
+            query = query.where(ChecklistTemplate.day_of_week == day_of_week)
         if shift_type:
-            query = query.filter(ChecklistTemplate.shift_type == shift_type)
+            query = query.where(ChecklistTemplate.shift_type == shift_type)
         
-        return query.order_by(ChecklistTemplate.order_index).all()
-    finally:
-        db.close()
+        return [TaskView(*row) for row in db.execute(query.order_by(ChecklistTemplate.order_index))]
 
 def update_checklist_template(template_id: int, **kwargs) -> Optional[ChecklistTemplate]:
     """Обновить шаблон чек-листа"""
@@ -63,6 +67,7 @@ def update_checklist_template(template_id: int, **kwargs) -> Optional[ChecklistT
         
         template.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_report_cache()
         db.refresh(template)
         logger.info(f"Шаблон чек-листа ID {template_id} обновлен")
         return template
@@ -84,6 +89,7 @@ def delete_checklist_template(template_id: int) -> bool:
         template.is_active = 0
         template.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_report_cache()
         logger.info(f"Шаблон чек-листа ID {template_id} деактивирован")
         return True
     except Exception as e:
@@ -93,61 +99,17 @@ def delete_checklist_template(template_id: int) -> bool:
     finally:
         db.close()
 
-def get_current_shift_for_user(user_id: int) -> Optional[Dict]:
+def get_current_shift_for_user(user_id: int) -> Optional[ActiveShift]:
     """Определить текущую смену пользователя с учетом временного окна (+-1 час)"""
-    db = SessionLocal()
-    try:
-        now = datetime.now()
-        today = now.date()
-        
-        # Получаем пользователя
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user or not user.iiko_id:
-            return None
-        
-        # Ищем смены на сегодня для пользователя
-        shifts = db.query(Schedule).join(ShiftType).filter(
-            and_(
-                Schedule.iiko_id == str(user.iiko_id),
-                Schedule.shift_date == today
-            )
-        ).all()
-        
-        for shift in shifts:
-            shift_type = shift.shift_type_obj
-            if not shift_type:
-                continue
-            
-            start_time = shift_type.start_time
-            end_time = shift_type.end_time
-            
-            start_dt = datetime.combine(today, start_time)
-            end_dt = datetime.combine(today, end_time)
-            
-            if end_dt <= start_dt:
-                end_dt += timedelta(days=1)
-            
-            start_window = start_dt - timedelta(hours=1)
-            end_window = end_dt + timedelta(hours=1)
-            
-            if start_window <= now <= end_window:
-                return {
-                    'shift': shift,
-                    'shift_type': shift_type,
-                    'day_of_week': today.weekday(),
-                    'point': shift_type.point
-                }
-        
-        return None
-    finally:
-        db.close()
+    return get_active_shift_index().get_for_user_id(user_id)
 
-def check_hybrid_shift_exists(point: str, shift_date: date) -> bool:
+def get_current_shift_for_iiko_id(iiko_id: str) -> Optional[ActiveShift]:
+    """Текущая смена сотрудника по iiko_id (для эмуляции)"""
+    return get_active_shift_index().get_for_iiko_id(iiko_id)
+
+def check_hybrid_shift_exists(point: str, shift_date: date, db: Optional[Session] = None) -> bool:
     """Проверить, есть ли пересмен на точке в указанную дату"""
-    db = SessionLocal()
-    try:
-        day_of_week = shift_date.weekday()
-        
+    with use_session(db) as db:
         # Ищем смены типа 'hybrid' на эту дату и точку
         hybrid_shifts = db.query(Schedule).join(ShiftType).filter(
             and_(
@@ -158,165 +120,116 @@ def check_hybrid_shift_exists(point: str, shift_date: date) -> bool:
         ).count()
         
         return hybrid_shifts > 0
-    finally:
-        db.close()
 
-def get_tasks_for_shift(user_id: int, shift_date: date, shift_type: str, point: str) -> List[ChecklistTemplate]:
+def get_tasks_for_shift(user_id: int, shift_date: date, shift_type: str, point: str,
+                        db: Optional[Session] = None) -> List[TaskView]:
     """Получить задачи для конкретной смены с учетом пересменов"""
-    db = SessionLocal()
-    try:
+    with use_session(db) as db:
         day_of_week = shift_date.weekday()
-        hybrid_exists = check_hybrid_shift_exists(point, shift_date)
+        hybrid_exists = check_hybrid_shift_exists(point, shift_date, db)
         
         if shift_type == 'hybrid':
             # Для пересмена получаем назначенные ему задачи
             if not hybrid_exists:
                 return []
-            assignment = get_hybrid_assignment(day_of_week)
+            assignment = get_hybrid_assignment(day_of_week, db)
             if not assignment:
                 return []
             
-            morning_tasks = get_hybrid_assignment_tasks(assignment.id, 'morning')
-            evening_tasks = get_hybrid_assignment_tasks(assignment.id, 'evening')
+            morning_tasks = get_hybrid_assignment_tasks(assignment.id, 'morning', db)
+            evening_tasks = get_hybrid_assignment_tasks(assignment.id, 'evening', db)
             return morning_tasks + evening_tasks
             
         elif shift_type == 'morning':
             # Для утра - исключаем задачи, переданные пересмену
-            morning_tasks = get_checklist_templates(day_of_week=day_of_week, shift_type='morning')
+            morning_tasks = get_checklist_templates(day_of_week=day_of_week, shift_type='morning', db=db)
             if hybrid_exists:
-                assignment = get_hybrid_assignment(day_of_week)
+                assignment = get_hybrid_assignment(day_of_week, db)
                 if assignment:
-                    hybrid_morning_tasks = get_hybrid_assignment_tasks(assignment.id, 'morning')
+                    hybrid_morning_tasks = get_hybrid_assignment_tasks(assignment.id, 'morning', db)
                     hybrid_task_ids = [t.id for t in hybrid_morning_tasks]
                     morning_tasks = [task for task in morning_tasks if task.id not in hybrid_task_ids]
             return morning_tasks
             
         elif shift_type == 'evening':
             # Для вечера - аналогично утру
-            evening_tasks = get_checklist_templates(day_of_week=day_of_week, shift_type='evening')
+            evening_tasks = get_checklist_templates(day_of_week=day_of_week, shift_type='evening', db=db)
             if hybrid_exists:
-                assignment = get_hybrid_assignment(day_of_week)
+                assignment = get_hybrid_assignment(day_of_week, db)
                 if assignment:
-                    hybrid_evening_tasks = get_hybrid_assignment_tasks(assignment.id, 'evening')
+                    hybrid_evening_tasks = get_hybrid_assignment_tasks(assignment.id, 'evening', db)
                     hybrid_task_ids = [t.id for t in hybrid_evening_tasks]
                     evening_tasks = [task for task in evening_tasks if task.id not in hybrid_task_ids]
             return evening_tasks
         
         return []
-    finally:
-        db.close()
 
-def get_completed_tasks_for_shift(shift_date: date, point: str) -> List[int]:
+def get_completed_tasks_for_shift(shift_date: date, point: str, db: Optional[Session] = None) -> List[int]:
     """Получить список выполненных задач для смены на дату и точке"""
-    db = SessionLocal()
-    try:
-        completed_tasks = db.query(ChecklistLog.task_id).filter(
-            and_(
-                ChecklistLog.shift_date == shift_date,
-                ChecklistLog.point == point
-            )
-        ).all()
-        return [task_id for (task_id,) in completed_tasks]
-    finally:
-        db.close()
-
-def mark_task_completed(user_id: int, task_id: int, shift_date: date, shift_type: str, point: str) -> bool:
-    """Отметить задачу как выполненную"""
-    db = SessionLocal()
-    try:
-        # Проверяем, не выполнена ли уже задача
-        existing = db.query(ChecklistLog).filter(
-            and_(
-                ChecklistLog.task_id == task_id,
-                ChecklistLog.shift_date == shift_date,
-                ChecklistLog.point == point
-            )
-        ).first()
-        
-        if existing:
-            return True  # Уже выполнена
-        
-        log_entry = ChecklistLog(
-            user_id=user_id,
-            task_id=task_id,
-            shift_date=shift_date,
-            shift_type=shift_type,
-            point=point,
-            completed_by_user_id=user_id
-        )
-        db.add(log_entry)
-        db.commit()
-        logger.info(f"Задача {task_id} отмечена как выполненная пользователем {user_id}")
-        return True
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при отметке задачи: {e}")
-        return False
-    finally:
-        db.close()
+    with use_session(db) as db:
+        if reaches_archive(CHECKLIST_LOGS, shift_date):
+            # Старая смена: одним запросом по горячей таблице и архиву
+            completed_tasks = db.execute(
+                text(f"SELECT task_id FROM {source_sql(CHECKLIST_LOGS, ('task_id', 'shift_date', 'point'), shift_date)} "
+                     f"WHERE shift_date = :shift_date AND point = :point"),
+                {"shift_date": shift_date.isoformat(), "point": point}
+            ).all()
+        else:
+            completed_tasks = db.query(ChecklistLog.task_id).filter(
+                and_(
+                    ChecklistLog.shift_date == shift_date,
+                    ChecklistLog.point == point
+                )
+            ).all()
 
-def toggle_task_completion(user_id: int, task_id: int, shift_date: date, shift_type: str, point: str) -> Optional[bool]:
-    """Переключить выполнение задачи. Возвращает True если выполнено, False если снято."""
-    db = SessionLocal()
-    try:
-        existing = db.query(ChecklistLog).filter(
-            and_(
-                ChecklistLog.task_id == task_id,
-                ChecklistLog.shift_date == shift_date,
-                ChecklistLog.point == point
-            )
-        ).first()
+    # Поверх БД - отметки, которые буфер еще не успел записать
+    completed = {task_id for (task_id,) in completed_tasks}
+    for task_id, is_completed in checklist_log_buffer.pending_states(shift_date, point).items():
+        if is_completed:
+            completed.add(task_id)
+        else:
+            completed.discard(task_id)
+    return list(completed)
 
-        if existing:
-            db.delete(existing)
-            db.commit()
-            logger.info(f"Задача {task_id} снята пользователем {user_id}")
-            return False
+def set_task_completion(user_id: int, task_id: int, shift_date: date, shift_type: str, point: str,
+                        completed: bool) -> Optional[bool]:
+    """Установить состояние задачи. Возвращает новое состояние или None при ошибке.
 
-        log_entry = ChecklistLog(
+    Отметка сразу видна в get_completed_tasks_for_shift, в БД ее пачкой записывает checklist_log_buffer.
+    """
+    try:
+        checklist_log_buffer.record(CompletionEvent(
             user_id=user_id,
             task_id=task_id,
             shift_date=shift_date,
             shift_type=shift_type,
             point=point,
-            completed_by_user_id=user_id
-        )
-        db.add(log_entry)
-        db.commit()
-        logger.info(f"Задача {task_id} отмечена как выполненная пользователем {user_id}")
-        return True
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при переключении задачи: {e}")
+            completed=completed,
+            recorded_at=datetime.utcnow()
+        ))
+    except OSError as e:
+        logger.error(f"Ошибка при записи отметки задачи в outbox: {e}")
         return None
-    finally:
-        db.close()
+    action = "отмечена как выполненная" if completed else "снята"
+    logger.info(f"Задача {task_id} {action} пользователем {user_id}")
+    return completed
 
-def get_hybrid_assignments() -> List[HybridShiftAssignment]:
-    """Получить все распределения задач для пересменов"""
+def get_hybrid_assignments() -> List[HybridAssignmentView]:
+    """Получить все распределения задач для пересменов (задачи - get_hybrid_assignment_tasks)"""
     db = SessionLocal()
     try:
-        from sqlalchemy.orm import joinedload
-        
-        return db.query(HybridShiftAssignment).options(
-            joinedload(HybridShiftAssignment.assigned_tasks).joinedload(HybridAssignmentTask.task)
-        ).order_by(HybridShiftAssignment.day_of_week).all()
+        rows = db.execute(select(*HYBRID_ASSIGNMENT_COLUMNS).order_by(HybridShiftAssignment.day_of_week))
+        return [HybridAssignmentView(*row) for row in rows]
     finally:
         db.close()
 
-def get_hybrid_assignment(day_of_week: int) -> Optional[HybridShiftAssignment]:
+def get_hybrid_assignment(day_of_week: int, db: Optional[Session] = None) -> Optional[HybridAssignmentView]:
     """Получить распределение для конкретного дня"""
-    db = SessionLocal()
-    try:
-        from sqlalchemy.orm import joinedload
-        
-        return db.query(HybridShiftAssignment).options(
-            joinedload(HybridShiftAssignment.assigned_tasks).joinedload(HybridAssignmentTask.task)
-        ).filter(
-            HybridShiftAssignment.day_of_week == day_of_week
+    with use_session(db) as db:
+        row = db.execute(
+            select(*HYBRID_ASSIGNMENT_COLUMNS).where(HybridShiftAssignment.day_of_week == day_of_week).limit(1)
         ).first()
-    finally:
-        db.close()
+        return HybridAssignmentView(*row) if row else None
 
 def delete_hybrid_assignment(assignment_id: int) -> bool:
     """Удалить распределение"""
@@ -326,6 +239,7 @@ def delete_hybrid_assignment(assignment_id: int) -> bool:
         if assignment:
             db.delete(assignment)
             db.commit()
+            invalidate_report_cache()
             logger.info(f"Удалено распределение ID {assignment_id}")
             return True
         return False
@@ -383,6 +297,7 @@ def create_hybrid_assignment_with_tasks(day_of_week: int, morning_task_ids: List
             db.add(assignment_task)
         
         db.commit()
+        invalidate_report_cache()
         db.refresh(assignment)
         logger.info(f"Создано/обновлено распределение для {day_of_week} с {len(morning_task_ids)} утренними и {len(evening_task_ids)} вечерними задачами")
         return assignment
@@ -393,20 +308,15 @@ def create_hybrid_assignment_with_tasks(day_of_week: int, morning_task_ids: List
     finally:
         db.close()
         
-def get_hybrid_assignment_tasks(assignment_id: int, shift_type: str = None) -> List[ChecklistTemplate]:
+def get_hybrid_assignment_tasks(assignment_id: int, shift_type: str = None,
+                                db: Optional[Session] = None) -> List[TaskView]:
     """Получить задачи для распределения"""
-    db = SessionLocal()
-    try:
-        from sqlalchemy.orm import joinedload
-        
-        query = db.query(HybridAssignmentTask).options(
-            joinedload(HybridAssignmentTask.task)
-        ).filter(HybridAssignmentTask.assignment_id == assignment_id)
+    with use_session(db) as db:
+        query = select(*TASK_COLUMNS).join(
+            HybridAssignmentTask, HybridAssignmentTask.task_id == ChecklistTemplate.id
+        ).where(HybridAssignmentTask.assignment_id == assignment_id)
         
         if shift_type:
-            query = query.filter(HybridAssignmentTask.shift_type == shift_type)
+            query = query.where(HybridAssignmentTask.shift_type == shift_type)
         
-        assignment_tasks = query.all()
-        return [at.task for at in assignment_tasks if at.task]
-    finally:
-        db.close()
+        return [TaskView(*row) for row in db.execute(query.order_by(HybridAssignmentTask.id))]
@@ -1,21 +1,44 @@
 """Операции для статистики чек-листов"""
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, extract, case
-from typing import List, Dict, Optional, Tuple
+from sqlalchemy import and_, or_, func, extract, case, text
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from itertools import groupby
 from datetime import date, datetime, timedelta
 from collections import defaultdict
 import logging
 
 from .models import SessionLocal, User, Schedule, ShiftType, ChecklistTemplate, ChecklistLog
 from .checklist_operations import get_tasks_for_shift, get_completed_tasks_for_shift
+from .report_cache import cached_report
+from .archive import CHECKLIST_LOGS, reaches_archive
+from .schedule_operations import get_day_roster
 
 logger = logging.getLogger(__name__)
 
+def _load_users_by_iiko_ids(db: Session, shifts: List[Schedule],
+                            users_by_iiko_id: Optional[Dict[str, User]] = None) -> Dict[str, User]:
+    """Загрузить сотрудников смен одним IN-запросом (iiko_id -> User), дополняя уже загруженных"""
+    if users_by_iiko_id is None:
+        users_by_iiko_id = {}
+    missing_iiko_ids = {shift.iiko_id for shift in shifts} - users_by_iiko_id.keys()
+    if missing_iiko_ids:
+        for user in db.query(User).filter(User.iiko_id.in_(missing_iiko_ids)).all():
+            users_by_iiko_id[user.iiko_id] = user
+    return users_by_iiko_id
+
 def get_individual_stats(start_date: date, end_date: date, user_id: Optional[int] = None) -> List[Dict]:
     """
     Индивидуальная статистика по сотрудникам
     Возвращает список словарей с данными по каждому сотруднику и дню недели
     """
+    return list(iter_individual_stats(start_date, end_date, user_id))
+
+def iter_individual_stats(start_date: date, end_date: date, user_id: Optional[int] = None) -> Iterator[Dict]:
+    """Индивидуальная статистика построчно (сотрудник, день недели)"""
+    return cached_report('individual', start_date, end_date, (user_id,),
+                         lambda: _compute_individual_stats(start_date, end_date, user_id))
+
+def _compute_individual_stats(start_date: date, end_date: date, user_id: Optional[int]) -> Iterator[Dict]:
     db = SessionLocal()
     try:
         # Получаем пользователей (активных)
@@ -24,8 +47,6 @@ def get_individual_stats(start_date: date, end_date: date, user_id: Optional[int
             query = query.filter(User.id == user_id)
         users = query.all()
         
-        results = []
-        
         for user in users:
             if not user.iiko_id:
                 continue
@@ -33,7 +54,7 @@ def get_individual_stats(start_date: date, end_date: date, user_id: Optional[int
             # Находим все смены пользователя за период
             shifts = db.query(Schedule).join(ShiftType).filter(
                 and_(
-                    Schedule.iiko_id == str(user.iiko_id),
+                    Schedule.iiko_id == user.iiko_id,
                     Schedule.shift_date >= start_date,
                     Schedule.shift_date <= end_date,
                     Schedule.is_active == True
@@ -61,13 +82,15 @@ def get_individual_stats(start_date: date, end_date: date, user_id: Optional[int
                         user.id,
                         shift.shift_date,
                         shift_type_obj.shift_type,
-                        shift_type_obj.point
+                        shift_type_obj.point,
+                        db
                     )
                     
                     # Получаем выполненные задачи для этой смены
                     completed_task_ids = get_completed_tasks_for_shift(
                         shift.shift_date,
-                        shift_type_obj.point
+                        shift_type_obj.point,
+                        db
                     )
                     
                     total_tasks += len(tasks)
@@ -77,7 +100,7 @@ def get_individual_stats(start_date: date, end_date: date, user_id: Optional[int
                 
                 completion_percent = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
                 
-                results.append({
+                yield {
                     'user_id': user.id,
                     'user_name': user.name,
                     'weekday': weekday,
@@ -85,9 +108,7 @@ def get_individual_stats(start_date: date, end_date: date, user_id: Optional[int
                     'total_tasks': total_tasks,
                     'completed_tasks': completed_tasks,
                     'completion_percent': round(completion_percent, 1)
-                })
-        
-        return results
+                }
         
     finally:
         db.close()
@@ -97,6 +118,14 @@ def get_point_stats(start_date: date, end_date: date, point: Optional[str] = Non
     Статистика по точкам
     Возвращает данные по точкам и дням недели
     """
+    return list(iter_point_stats(start_date, end_date, point))
+
+def iter_point_stats(start_date: date, end_date: date, point: Optional[str] = None) -> Iterator[Dict]:
+    """Статистика по точкам построчно (точка, день недели)"""
+    return cached_report('point', start_date, end_date, (point,),
+                         lambda: _compute_point_stats(start_date, end_date, point))
+
+def _compute_point_stats(start_date: date, end_date: date, point: Optional[str]) -> Iterator[Dict]:
     db = SessionLocal()
     try:
         # Получаем все смены за период
@@ -112,6 +141,7 @@ def get_point_stats(start_date: date, end_date: date, point: Optional[str] = Non
             query = query.filter(ShiftType.point == point)
             
         shifts = query.all()
+        users_by_iiko_id = _load_users_by_iiko_ids(db, shifts)
         
         # Группируем смены по точке и дню недели
         shifts_by_point_weekday = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
@@ -127,15 +157,13 @@ def get_point_stats(start_date: date, end_date: date, point: Optional[str] = Non
             
             shifts_by_point_weekday[point_name][weekday][shift_type].append(shift)
         
-        results = []
-        
         for point_name, weekdays_data in shifts_by_point_weekday.items():
             for weekday, shift_types_data in weekdays_data.items():
-                morning_stats = _calculate_shift_type_stats(shifts_by_point_weekday[point_name][weekday].get('morning', []))
-                evening_stats = _calculate_shift_type_stats(shifts_by_point_weekday[point_name][weekday].get('evening', []))
-                hybrid_stats = _calculate_shift_type_stats(shifts_by_point_weekday[point_name][weekday].get('hybrid', []))
+                morning_stats = _calculate_shift_type_stats(shifts_by_point_weekday[point_name][weekday].get('morning', []), users_by_iiko_id, db)
+                evening_stats = _calculate_shift_type_stats(shifts_by_point_weekday[point_name][weekday].get('evening', []), users_by_iiko_id, db)
+                hybrid_stats = _calculate_shift_type_stats(shifts_by_point_weekday[point_name][weekday].get('hybrid', []), users_by_iiko_id, db)
                 
-                results.append({
+                yield {
                     'point': point_name,
                     'weekday': weekday,
                     'morning_avg_completion': morning_stats['avg_completion'],
@@ -144,17 +172,13 @@ def get_point_stats(start_date: date, end_date: date, point: Optional[str] = Non
                     'evening_shift_count': evening_stats['shift_count'],
                     'hybrid_avg_completion': hybrid_stats['avg_completion'],
                     'hybrid_shift_count': hybrid_stats['shift_count']
-                })
-        
-        return results
+                }
         
     finally:
         db.close()
 
-def _calculate_shift_type_stats(shifts: List[Schedule]) -> Dict:
+def _calculate_shift_type_stats(shifts: List[Schedule], users_by_iiko_id: Dict[str, User], db: Session) -> Dict:
     """Рассчитать статистику для списка смен одного типа"""
-    db = SessionLocal()
-    
     if not shifts:
         return {'avg_completion': 0, 'shift_count': 0}
     
@@ -165,8 +189,8 @@ def _calculate_shift_type_stats(shifts: List[Schedule]) -> Dict:
         if not shift_type_obj:
             continue
             
-        # Получаем первого пользователя для этой смены (для получения задач)
-        user = db.query(User).filter(User.iiko_id == shift.iiko_id).first()
+        # Сотрудник смены нужен для получения задач
+        user = users_by_iiko_id.get(shift.iiko_id)
         if not user:
             continue
             
@@ -174,12 +198,14 @@ def _calculate_shift_type_stats(shifts: List[Schedule]) -> Dict:
             user.id,
             shift.shift_date,
             shift_type_obj.shift_type,
-            shift_type_obj.point
+            shift_type_obj.point,
+            db
         )
         
         completed_task_ids = get_completed_tasks_for_shift(
             shift.shift_date,
-            shift_type_obj.point
+            shift_type_obj.point,
+            db
         )
         
         total_tasks = len(tasks)
@@ -200,6 +226,16 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
     Статистика по заданиям
     Возвращает данные по каждому заданию и точке
     """
+    return list(iter_task_stats(start_date, end_date, task_id, point))
+
+def iter_task_stats(start_date: date, end_date: date, task_id: Optional[int] = None,
+                    point: Optional[str] = None) -> Iterator[Dict]:
+    """Статистика по заданиям построчно (задание, точка)"""
+    return cached_report('task', start_date, end_date, (task_id, point),
+                         lambda: _compute_task_stats(start_date, end_date, task_id, point))
+
+def _compute_task_stats(start_date: date, end_date: date, task_id: Optional[int],
+                        point: Optional[str]) -> Iterator[Dict]:
     db = SessionLocal()
     try:
         # Получаем все шаблоны задач
@@ -208,7 +244,8 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
             query = query.filter(ChecklistTemplate.id == task_id)
         tasks = query.all()
         
-        results = []
+        # Сотрудники смен накапливаются между заданиями, каждый загружается один раз
+        users_by_iiko_id: Dict[str, User] = {}
         
         for task in tasks:
             # Для каждой точки, для которой нужно вывести статистику
@@ -230,6 +267,7 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
                         extract('dow', Schedule.shift_date) == task.day_of_week
                     )
                 ).all()
+                _load_users_by_iiko_ids(db, shifts, users_by_iiko_id)
                 
                 for shift in shifts:
                     shift_type_obj = shift.shift_type_obj
@@ -237,7 +275,7 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
                         continue
                     
                     # Проверяем, входит ли задача в чек-лист этой смены
-                    user = db.query(User).filter(User.iiko_id == shift.iiko_id).first()
+                    user = users_by_iiko_id.get(shift.iiko_id)
                     if not user:
                         continue
                     
@@ -245,7 +283,8 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
                         user.id,
                         shift.shift_date,
                         shift_type_obj.shift_type,
-                        point_name
+                        point_name,
+                        db
                     )
                     
                     # Проверяем, есть ли наша задача в чек-листе
@@ -256,13 +295,13 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
                     total_shifts_with_task += 1
                     
                     # Проверяем, выполнена ли задача в эту смену
-                    completed_task_ids = get_completed_tasks_for_shift(shift.shift_date, point_name)
+                    completed_task_ids = get_completed_tasks_for_shift(shift.shift_date, point_name, db)
                     if task.id in completed_task_ids:
                         completed_shifts_with_task += 1
                 
                 completion_percent = (completed_shifts_with_task / total_shifts_with_task * 100) if total_shifts_with_task > 0 else 0
                 
-                results.append({
+                yield {
                     'task_id': task.id,
                     'task_description': task.task_description,
                     'point': point_name,
@@ -271,13 +310,23 @@ def get_task_stats(start_date: date, end_date: date, task_id: Optional[int] = No
                     'total_shifts': total_shifts_with_task,
                     'completed_shifts': completed_shifts_with_task,
                     'completion_percent': round(completion_percent, 1)
-                })
-        
-        return results
+                }
         
     finally:
         db.close()
 
+def _load_archived_completions(db: Session, target_date: date, point: str) -> List[Tuple]:
+    """Отметки из архива: (task_id, имя выполнившего, completed_at строкой)"""
+    return db.execute(
+        text(
+            f"SELECT log.task_id, users.name, log.completed_at "
+            f"FROM {CHECKLIST_LOGS.archive_table} AS log "
+            f"LEFT JOIN users ON users.id = log.completed_by_user_id "
+            f"WHERE log.shift_date = :shift_date AND log.point = :point"
+        ),
+        {"shift_date": target_date.isoformat(), "point": point}
+    ).all()
+
 def get_detailed_log(target_date: date, point: str) -> List[Dict]:
     """
     Детальный лог выполнения за конкретный день и точку
@@ -285,34 +334,26 @@ def get_detailed_log(target_date: date, point: str) -> List[Dict]:
     """
     db = SessionLocal()
     try:
-        # Получаем все смены на эту дату и точку
-        shifts = db.query(Schedule).join(ShiftType).filter(
-            and_(
-                Schedule.shift_date == target_date,
-                ShiftType.point == point,
-                Schedule.is_active == True
-            )
-        ).all()
+        # Смены на эту дату и точку берутся из состава дня (снимок расписания или один запрос)
+        shifts_by_user = [
+            (entry.user_id, shift)
+            for entry in get_day_roster(target_date)
+            for shift in entry.shifts
+            if shift.point == point and shift.is_active
+        ]
         
-        if not shifts:
+        if not shifts_by_user:
             return []
         
         # Собираем все задачи для всех смен этого дня
         all_tasks = {}
-        for shift in shifts:
-            shift_type_obj = shift.shift_type_obj
-            if not shift_type_obj:
-                continue
-                
-            user = db.query(User).filter(User.iiko_id == shift.iiko_id).first()
-            if not user:
-                continue
-                
+        for user_id, shift in shifts_by_user:
             tasks = get_tasks_for_shift(
-                user.id,
+                user_id,
                 shift.shift_date,
-                shift_type_obj.shift_type,
-                point
+                shift.shift_type,
+                point,
+                db
             )
             for task in tasks:
                 all_tasks[task.id] = task
@@ -335,6 +376,14 @@ def get_detailed_log(target_date: date, point: str) -> List[Dict]:
                 'completed_at': completed.completed_at.strftime('%H:%M') if completed.completed_at else 'Неизвестно'
             })
         
+        # День за границей архивации: отметки лежат в архиве
+        if reaches_archive(CHECKLIST_LOGS, target_date):
+            for task_id, completed_by, completed_at in _load_archived_completions(db, target_date, point):
+                completion_info.setdefault(task_id, []).append({
+                    'completed_by': completed_by or 'Неизвестно',
+                    'completed_at': completed_at[11:16] if completed_at else 'Неизвестно'
+                })
+        
         # Формируем результат
         results = []
         for task in all_tasks.values():
@@ -364,3 +413,74 @@ def format_stats_period(start_date: date, end_date: date) -> str:
         return start_date.strftime('%d.%m.%Y')
     else:
         return f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
+
+def render_individual_stats(stats: Iterable[Dict], period_text: str) -> Iterator[str]:
+    """Строки отчета индивидуальной статистики (строки сотрудника идут подряд)"""
+    yield "👤 Индивидуальная статистика"
+    yield ""
+    yield f"Период: {period_text}"
+    yield ""
+    # Группа - сотрудник (user_id): у двух бариста может совпадать имя
+    for _, user_data in groupby(stats, key=lambda stat: stat['user_id']):
+        user_data = list(user_data)
+        yield f"👤 {user_data[0]['user_name']}:"
+        for stat in user_data:
+            weekday_name = get_weekday_name(stat['weekday'])
+            yield f"   {weekday_name}: {stat['completed_tasks']}/{stat['total_tasks']} ({stat['completion_percent']}%)"
+        yield ""
+
+def render_point_stats(stats: Iterable[Dict], period_text: str) -> Iterator[str]:
+    """Строки отчета статистики по точкам"""
+    yield "📍 Статистика по точкам"
+    yield ""
+    yield f"Период: {period_text}"
+    yield ""
+    for point_name, point_data in groupby(stats, key=lambda stat: stat['point']):
+        yield f"📍 {point_name}:"
+        for stat in point_data:
+            weekday_name = get_weekday_name(stat['weekday'])
+            yield f"   {weekday_name}:"
+            yield f"     🌅 Утро: {stat['morning_avg_completion']}% ({stat['morning_shift_count']} смен)"
+            yield f"     🌆 Вечер: {stat['evening_avg_completion']}% ({stat['evening_shift_count']} смен)"
+            if stat['hybrid_shift_count'] > 0:
+                yield f"     🔄 Пересмен: {stat['hybrid_avg_completion']}% ({stat['hybrid_shift_count']} смен)"
+        yield ""
+
+def render_task_stats(stats: Iterable[Dict], period_text: str, limit: Optional[int] = None) -> Iterator[str]:
+    """Строки отчета по заданиям. С limit выводятся первые задания и число оставшихся"""
+    yield "📝 Статистика по заданиям"
+    yield ""
+    yield f"Период: {period_text}"
+    yield ""
+    hidden = 0
+    for index, stat in enumerate(stats):
+        if limit is not None and index >= limit:
+            hidden += 1
+            continue
+        weekday_name = get_weekday_name(stat['day_of_week'])
+        yield f"📍 {stat['point']} | {weekday_name} | {stat['shift_type']}"
+        yield f"   {stat['task_description']}"
+        yield f"   Выполнено: {stat['completed_shifts']}/{stat['total_shifts']} ({stat['completion_percent']}%)"
+        yield ""
+    if hidden:
+        yield f"... и еще {hidden} заданий"
+
+def render_detailed_log(detailed_log: List[Dict], target_date: date, point: str,
+                        with_total: bool = False) -> Iterator[str]:
+    """Строки детального лога выполнения за день и точку"""
+    yield "📋 Детальный лог выполнения"
+    yield ""
+    yield f"📍 Точка: {point}"
+    yield f"📅 Дата: {target_date.strftime('%d.%m.%Y')}"
+    yield ""
+    completed_count = 0
+    for task_log in detailed_log:
+        status = "✅" if task_log['completed'] else "❌"
+        yield f"{status} {task_log['task_description']}"
+        if task_log['completed']:
+            completed_count += 1
+            for completion in task_log['completions']:
+                yield f"   👤 {completion['completed_by']} в {completion['completed_at']}"
+        yield ""
+    if with_total:
+        yield f"📊 Итого: {completed_count}/{len(detailed_log)} заданий выполнено"
@@ -0,0 +1,178 @@
+"""Операции для сезонных событий (тайный санта и т.п.)"""
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy import func, update
+
+from .models import SessionLocal, SeasonalEvent, EventParticipant
+from bot.utils.matching import derange, forbid_pairs, MatchingError
+
+logger = logging.getLogger(__name__)
+
+# Шаг распределения: участники и прошлые пары (даритель, получатель) -> {даритель: получатель}
+Matcher = Callable[[List[str], List[Tuple[str, str]]], Dict[str, str]]
+
+_matchers: Dict[str, Matcher] = {}
+# code -> id: события не удаляются, кэшируем навсегда
+_event_ids: Dict[str, int] = {}
+
+def register_matcher(kind: str):
+    """Декоратор: распределение для типа событий"""
+    def decorator(matcher: Matcher) -> Matcher:
+        _matchers[kind] = matcher
+        return matcher
+    return decorator
+
+@register_matcher("secret_santa")
+def match_secret_santa(participants: List[str], previous_pairs: List[Tuple[str, str]]) -> Dict[str, str]:
+    """Никто не дарит себе; по возможности без повторения прошлых пар"""
+    try:
+        return derange(participants, exclude=forbid_pairs(previous_pairs))
+    except MatchingError:
+        logger.warning("⚠️ Без повторов прошлых пар распределить нельзя, распределяем без ограничений")
+        return derange(participants)
+
+def get_or_create_event(code: str, kind: str, title: str, reveal_date: Optional[date] = None) -> int:
+    """Получить id события, создав его при первом обращении"""
+    event_id = _event_ids.get(code)
+    if event_id is not None:
+        return event_id
+
+    db = SessionLocal()
+    try:
+        event = db.query(SeasonalEvent).filter(SeasonalEvent.code == code).first()
+        if not event:
+            event = SeasonalEvent(code=code, kind=kind, title=title, reveal_date=reveal_date)
+            db.add(event)
+            db.commit()
+            logger.info(f"✅ Создано событие {code}")
+        _event_ids[code] = event.id
+        return event.id
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка при создании события {code}: {e}")
+        raise
+    finally:
+        db.close()
+
+def _get_or_add_participant(db, event_id: int, telegram_username: str) -> EventParticipant:
+    participant = db.query(EventParticipant).filter(
+        EventParticipant.event_id == event_id,
+        EventParticipant.telegram_username == telegram_username
+    ).first()
+    if not participant:
+        participant = EventParticipant(event_id=event_id, telegram_username=telegram_username)
+        db.add(participant)
+    return participant
+
+def set_participation(event_id: int, telegram_username: str, is_participant: bool):
+    """Вступить в событие или выйти из него (при выходе назначение сбрасывается)"""
+    db = SessionLocal()
+    try:
+        participant = _get_or_add_participant(db, event_id, telegram_username)
+        participant.is_participant = is_participant
+        if not is_participant:
+            participant.assigned_to = ''
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка при обновлении участия {telegram_username}: {e}")
+        raise
+    finally:
+        db.close()
+
+def save_wishlist(event_id: int, telegram_username: str, wishlist: str):
+    """Сохранить вишлист (заодно записывает в участники)"""
+    db = SessionLocal()
+    try:
+        participant = _get_or_add_participant(db, event_id, telegram_username)
+        participant.wishlist = wishlist
+        participant.is_participant = True
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка при сохранении вишлиста {telegram_username}: {e}")
+        raise
+    finally:
+        db.close()
+
+def get_participant(event_id: int, telegram_username: str) -> Optional[EventParticipant]:
+    """Запись участника (по индексу event_id + username)"""
+    db = SessionLocal()
+    try:
+        return db.query(EventParticipant).filter(
+            EventParticipant.event_id == event_id,
+            EventParticipant.telegram_username == telegram_username
+        ).first()
+    finally:
+        db.close()
+
+def count_participants(event_id: int) -> Tuple[int, int]:
+    """Количество участников и сколько из них уже получили назначение"""
+    db = SessionLocal()
+    try:
+        total, assigned = db.query(
+            func.count(EventParticipant.id),
+            func.count(EventParticipant.id).filter(EventParticipant.assigned_to != '')
+        ).filter(
+            EventParticipant.event_id == event_id,
+            EventParticipant.is_participant == True
+        ).one()
+        return total, assigned
+    finally:
+        db.close()
+
+def run_matching(event_id: int) -> int:
+    """Распределить участников шагом, зарегистрированным для типа события. Возвращает число назначений."""
+    db = SessionLocal()
+    try:
+        event = db.query(SeasonalEvent).filter(SeasonalEvent.id == event_id).one()
+        matcher = _matchers.get(event.kind)
+        if matcher is None:
+            raise ValueError(f"Нет распределения для событий типа {event.kind}")
+
+        rows = db.query(
+            EventParticipant.id, EventParticipant.telegram_username, EventParticipant.assigned_to
+        ).filter(
+            EventParticipant.event_id == event_id,
+            EventParticipant.is_participant == True
+        ).all()
+        if len(rows) < 2:
+            logger.error(f"Недостаточно участников для распределения события {event.code}")
+            return 0
+
+        participants = [row.telegram_username for row in rows]
+        previous_pairs = [(row.telegram_username, row.assigned_to) for row in rows if row.assigned_to]
+        assignments = matcher(participants, previous_pairs)
+
+        # Одна пачка UPDATE по первичному ключу
+        ids = {row.telegram_username: row.id for row in rows}
+        db.execute(update(EventParticipant), [
+            {"id": ids[giver], "assigned_to": receiver} for giver, receiver in assignments.items()
+        ])
+        db.commit()
+        logger.info(f"✅ Событие {event.code}: распределено {len(assignments)} участников")
+        return len(assignments)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка при распределении события {event_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+def clear_assignments(event_id: int) -> int:
+    """Сбросить все назначения события. Возвращает количество участников."""
+    db = SessionLocal()
+    try:
+        db.query(EventParticipant).filter(
+            EventParticipant.event_id == event_id
+        ).update({EventParticipant.assigned_to: ''}, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка при очистке распределения события {event_id}: {e}")
+        raise
+    finally:
+        db.close()
+    return count_participants(event_id)[0]
@@ -0,0 +1,136 @@
+"""Выгрузка сырых данных за период (CSV в zip или XLSX) потоком, без загрузки таблиц в память"""
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+import csv
+import importlib.util
+import io
+import os
+import sqlite3
+import tempfile
+import zipfile
+import logging
+
+from .models import engine
+from .archive import ArchivedTable, DRINK_REVIEWS, CHECKLIST_LOGS, reaches_archive
+
+logger = logging.getLogger(__name__)
+
+# Строк за один запрос: между пачками блокировка чтения снимается и бот может писать
+CHUNK_ROWS = 5000
+
+@dataclass(frozen=True)
+class ExportTable:
+    """Таблица выгрузки: имя файла, выражение даты для периода и архив (если есть)"""
+    table: str
+    date_expr: str
+    archive: Optional[ArchivedTable] = None
+
+EXPORT_TABLES = (
+    ExportTable("drink_reviews", "DATE(created_at)", DRINK_REVIEWS),
+    ExportTable("checklist_logs", "shift_date", CHECKLIST_LOGS),
+    ExportTable("schedule", "shift_date"),
+)
+
+def _connect() -> sqlite3.Connection:
+    # Только чтение: выгрузка не может ничего испортить
+    return sqlite3.connect(f"file:{engine.url.database}?mode=ro", uri=True, timeout=30)
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [column[1] for column in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _iter_chunks(conn: sqlite3.Connection, table: str, columns: Sequence[str], date_expr: str,
+                 start_date: date, end_date: date) -> Iterator[List[Tuple]]:
+    """Пачки строк периода по возрастанию rowid (keyset: каждая пачка - короткий отдельный запрос)"""
+    column_list = ", ".join(columns)
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT rowid, {column_list} FROM {table} "
+            f"WHERE rowid > ? AND {date_expr} BETWEEN ? AND ? ORDER BY rowid LIMIT ?",
+            (last_rowid, start_date.isoformat(), end_date.isoformat(), CHUNK_ROWS)
+        ).fetchall()
+        if not rows:
+            return
+        last_rowid = rows[-1][0]
+        yield [row[1:] for row in rows]
+
+def iter_export_chunks(conn: sqlite3.Connection, spec: ExportTable, start_date: date,
+                       end_date: date) -> Tuple[List[str], Iterator[List[Tuple]]]:
+    """Колонки таблицы и пачки ее строк за период: сначала архив (старые строки), потом горячая таблица"""
+    columns = _columns(conn, spec.table)
+
+    def chunks():
+        if spec.archive and reaches_archive(spec.archive, start_date):
+            archive_columns = set(_columns(conn, spec.archive.archive_table))
+            # Колонки, которых в архиве еще нет, выгружаются пустыми
+            selected = [column if column in archive_columns else "NULL" for column in columns]
+            yield from _iter_chunks(conn, spec.archive.archive_table, selected, spec.date_expr, start_date, end_date)
+        yield from _iter_chunks(conn, spec.table, columns, spec.date_expr, start_date, end_date)
+
+    return columns, chunks()
+
+def _write_csv_zip(conn: sqlite3.Connection, path: Path, start_date: date, end_date: date) -> int:
+    rows_written = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for spec in EXPORT_TABLES:
+            columns, chunks = iter_export_chunks(conn, spec, start_date, end_date)
+            with archive.open(f"{spec.table}.csv", "w") as raw:
+                # utf-8-sig - чтобы Excel открыл кириллицу без мастера импорта
+                text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+                writer = csv.writer(text)
+                writer.writerow(columns)
+                for chunk in chunks:
+                    writer.writerows(chunk)
+                    rows_written += len(chunk)
+                text.flush()
+                text.detach()
+    return rows_written
+
+def _write_xlsx(conn: sqlite3.Connection, path: Path, start_date: date, end_date: date) -> int:
+    from openpyxl import Workbook
+
+    rows_written = 0
+    # write_only: строки сразу уходят во временный файл, а не копятся в памяти
+    workbook = Workbook(write_only=True)
+    for spec in EXPORT_TABLES:
+        sheet = workbook.create_sheet(spec.table)
+        columns, chunks = iter_export_chunks(conn, spec, start_date, end_date)
+        sheet.append(columns)
+        for chunk in chunks:
+            for row in chunk:
+                sheet.append(row)
+            rows_written += len(chunk)
+    workbook.save(path)
+    return rows_written
+
+def xlsx_available() -> bool:
+    """openpyxl - необязательная зависимость, без нее выгрузка только в CSV"""
+    return importlib.util.find_spec("openpyxl") is not None
+
+def build_export(start_date: date, end_date: date, file_format: str = "csv") -> Tuple[Path, int]:
+    """Собрать файл выгрузки во временной папке. Блокирующая - вызывать вне event loop.
+
+    Возвращает путь к файлу (удаляет вызывающий) и количество строк.
+    """
+    suffix = ".xlsx" if file_format == "xlsx" else ".zip"
+    handle, name = tempfile.mkstemp(prefix=f"export_{start_date}_{end_date}_", suffix=suffix)
+    os.close(handle)
+    path = Path(name)
+    conn = _connect()
+    try:
+        if file_format == "xlsx":
+            rows_written = _write_xlsx(conn, path, start_date, end_date)
+        else:
+            rows_written = _write_csv_zip(conn, path, start_date, end_date)
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        logger.error(f"❌ Ошибка выгрузки {start_date} - {end_date}: {e}")
+        raise
+    finally:
+        conn.close()
+
+    logger.info(f"📤 Выгрузка {start_date} - {end_date} ({file_format}): {rows_written} строк, "
+                f"{path.stat().st_size // 1024} КБ")
+    return path, rows_written
@@ -2,6 +2,7 @@
 from bot.database.models import init_db, SessionLocal, engine, HybridAssignmentTask
 from .checklist_migrations import init_checklist_database, remove_point_from_checklist
 import sqlite3
+import re
 from datetime import time
 import logging
 
@@ -247,43 +248,134 @@ def migrate_schedule_table():
     finally:
         conn.close()
 
-def migrate_secret_santa_table():
-    """Создание таблицы для тайного санты 2026 через прямой SQL"""
+def migrate_secret_santa_to_events():
+    """Переносит участников из старой таблицы secret_santa_2026 в общие таблицы событий (один раз)"""
+    conn = sqlite3.connect('coffee_quality.db')
+    cursor = conn.cursor()
     try:
-        conn = sqlite3.connect('coffee_quality.db')
-        cursor = conn.cursor()
-
-        # Проверяем, существует ли таблица
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='secret_santa_2026'")
-        table_exists = cursor.fetchone()
+        if not cursor.fetchone():
+            return
 
-        if not table_exists:
-            print("🔄 Создаем таблицу secret_santa_2026...")
-            cursor.execute('''
-                CREATE TABLE secret_santa_2026 (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_username TEXT NOT NULL,
-                    wishlist TEXT DEFAULT '',
-                    is_participant BOOLEAN DEFAULT 0,
-                    santa_of TEXT DEFAULT '',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Создаем индексы
-            cursor.execute('CREATE INDEX idx_santa_username ON secret_santa_2026(telegram_username)')
-            cursor.execute('CREATE INDEX idx_santa_participant ON secret_santa_2026(is_participant)')
-            
+        cursor.execute(
+            "INSERT OR IGNORE INTO events (code, kind, title, reveal_date, created_at) "
+            "VALUES ('santa_2026', 'secret_santa', 'Тайный Санта 2026', '2025-12-01', CURRENT_TIMESTAMP)"
+        )
+        cursor.execute("SELECT id FROM events WHERE code = 'santa_2026'")
+        event_id = cursor.fetchone()[0]
+
+        cursor.execute("SELECT COUNT(*) FROM event_participants WHERE event_id = ?", (event_id,))
+        if cursor.fetchone()[0]:
+            print("✅ Тайный санта уже перенесен в таблицы событий")
             conn.commit()
-            print("✅ Таблица secret_santa_2026 создана")
-        else:
-            print("✅ Таблица secret_santa_2026 уже существует")
+            return
 
-        conn.close()
+        print("🔄 Переносим secret_santa_2026 в таблицы событий...")
+        # В старой таблице username не уникален - оставляем последнюю запись
+        cursor.execute('''
+            INSERT OR IGNORE INTO event_participants
+                (event_id, telegram_username, wishlist, is_participant, assigned_to, created_at, updated_at)
+            SELECT ?, telegram_username, COALESCE(wishlist, ''), COALESCE(is_participant, 0),
+                   COALESCE(santa_of, ''), created_at, updated_at
+            FROM secret_santa_2026
+            ORDER BY id DESC
+        ''', (event_id,))
+        conn.commit()
+        # Старую таблицу не удаляем: на случай отката
+        print(f"✅ Перенесено участников: {cursor.rowcount}")
     except Exception as e:
-        print(f"⚠️ Ошибка при создании таблицы secret_santa_2026: {e}")
+        print(f"❌ Ошибка переноса тайного санты: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
         
+def migrate_review_photos_index():
+    """Заполняет review_photos по уже сохраненным оценкам с фото (повторный запуск ничего не делает)"""
+    conn = sqlite3.connect('coffee_quality.db')
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA table_info(drink_reviews)")
+        if 'photo_file_id' not in {column[1] for column in cursor.fetchall()}:
+            return
+
+        backfilled = 0
+        for table in ('drink_reviews', 'drink_reviews_archive'):
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+            if not cursor.fetchone():
+                continue
+            cursor.execute(f'''
+                INSERT INTO review_photos (review_id, file_id, barista_name, point, created_at)
+                SELECT id, photo_file_id, barista_name, point, COALESCE(created_at, CURRENT_TIMESTAMP)
+                FROM {table}
+                WHERE photo_file_id IS NOT NULL AND photo_file_id != ''
+                  AND id NOT IN (SELECT review_id FROM review_photos)
+            ''')
+            backfilled += cursor.rowcount
+        conn.commit()
+        if backfilled:
+            print(f"✅ В индекс фото добавлено {backfilled} фото из старых оценок")
+    except Exception as e:
+        print(f"❌ Ошибка заполнения индекса фото: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def migrate_users_iiko_id_to_text():
+    """Переводит users.iiko_id в TEXT, чтобы связь users ↔ schedule была индексируемым равенством строк"""
+    conn = sqlite3.connect('coffee_quality.db')
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA table_info(users)")
+        columns = {column[1]: column[2] for column in cursor.fetchall()}
+        if 'iiko_id' not in columns:
+            return
+
+        if columns['iiko_id'].upper() == 'INTEGER':
+            print("🔄 Переводим users.iiko_id в TEXT...")
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='users'")
+            create_sql = cursor.fetchone()[0]
+            new_create_sql = re.sub(
+                r'^(\s*CREATE TABLE\s+)"?users"?',
+                r'\1users_new',
+                create_sql,
+                flags=re.IGNORECASE
+            )
+            new_create_sql = re.sub(r'\biiko_id\s+INTEGER\b', 'iiko_id VARCHAR(50)', new_create_sql, flags=re.IGNORECASE)
+
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name='users' AND sql IS NOT NULL")
+            index_sqls = [row[0] for row in cursor.fetchall()]
+
+            column_names = list(columns)
+            select_columns = [
+                "NULLIF(TRIM(CAST(iiko_id AS TEXT)), '')" if name == 'iiko_id' else name
+                for name in column_names
+            ]
+
+            cursor.execute(new_create_sql)
+            cursor.execute(
+                f"INSERT INTO users_new ({', '.join(column_names)}) "
+                f"SELECT {', '.join(select_columns)} FROM users"
+            )
+            cursor.execute("DROP TABLE users")
+            cursor.execute("ALTER TABLE users_new RENAME TO users")
+            for index_sql in index_sqls:
+                cursor.execute(index_sql)
+            print("✅ users.iiko_id переведен в TEXT")
+
+        # Смены из Google Sheets могли сохраниться с пробелами вокруг iiko_id
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schedule'")
+        if cursor.fetchone():
+            cursor.execute("UPDATE schedule SET iiko_id = TRIM(iiko_id) WHERE iiko_id != TRIM(iiko_id)")
+            if cursor.rowcount:
+                print(f"✅ Нормализовано {cursor.rowcount} iiko_id в расписании")
+
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Ошибка миграции users.iiko_id: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
 def init_database():
     """Инициализация БД с миграцией"""
     # Создаем таблицы через SQLAlchemy
@@ -298,8 +390,12 @@ def init_database():
     migrate_hybrid_assignments()
     # Обновляем таблицу schedule на новую структуру
     migrate_schedule_table()
-    # Создаем таблицу для Санты
-    migrate_secret_santa_table()
+    # Приводим users.iiko_id к типу schedule.iiko_id
+    migrate_users_iiko_id_to_text()
+    # Переносим Санту в общие таблицы событий
+    migrate_secret_santa_to_events()
+    # Индекс фото оценок
+    migrate_review_photos_index()
     # Удаляем point из чек-листов
     remove_point_from_checklist()
   
\ No newline at end of file
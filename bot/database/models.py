@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, create_engine, Column, Integer, String, DateTime, Text, Date, Time, Index, ForeignKey
+from sqlalchemy import Boolean, create_engine, Column, Integer, String, DateTime, Text, Date, Time, Index, ForeignKey, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -12,7 +12,7 @@ class User(Base):
     
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
-    iiko_id = Column(Integer, unique=True)  # Внутренний ID из Iiko
+    iiko_id = Column(String(50), unique=True)  # Внутренний ID из Iiko (строка, как в schedule.iiko_id)
     telegram_id = Column(Integer, unique=True)  # ID в Telegram
     telegram_username = Column(String(100), unique=True)
     role = Column(String(50), nullable=False)  # 'barista', 'senior', 'mentor'
@@ -39,6 +39,28 @@ class DrinkReview(Base):
     comment = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class ReviewPhoto(Base):
+    """Индекс фото оценок: выборка по бариста/точке/периоду без чтения drink_reviews"""
+    __tablename__ = 'review_photos'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    review_id = Column(Integer, nullable=False, unique=True)  # drink_reviews.id (строка может уехать в архив)
+    file_id = Column(String(255), nullable=False)  # самый большой размер
+    file_unique_id = Column(String(100))  # постоянный id файла - ключ локального кэша миниатюр
+    thumb_file_id = Column(String(255))  # самый маленький размер - для альбомов
+    barista_name = Column(String(100), nullable=False)
+    point = Column(String(50), nullable=False)
+    file_size = Column(Integer)
+    width = Column(Integer)
+    height = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_review_photos_barista_date', 'barista_name', 'created_at'),
+        Index('idx_review_photos_point_date', 'point', 'created_at'),
+        Index('idx_review_photos_date', 'created_at'),
+    )
+
 class ShiftType(Base):
     """Модель типов смен"""
     __tablename__ = 'shift_types'
@@ -140,6 +162,34 @@ class ChecklistLog(Base):
         Index('idx_checklist_log_task', 'task_id'),
     )
 
+class SeasonalEvent(Base):
+    """Сезонное событие (тайный санта и т.п.): новое событие - новая строка, а не новая таблица"""
+    __tablename__ = 'events'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(50), unique=True, nullable=False)  # 'santa_2026'
+    kind = Column(String(50), nullable=False)  # тип определяет шаг распределения: 'secret_santa'
+    title = Column(String(200), nullable=False)
+    reveal_date = Column(Date)  # с этой даты участники видят результат распределения
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class EventParticipant(Base):
+    """Участник события и результат распределения"""
+    __tablename__ = 'event_participants'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(Integer, ForeignKey('events.id'), nullable=False)
+    telegram_username = Column(String(100), nullable=False)
+    wishlist = Column(Text, default='')
+    is_participant = Column(Boolean, default=False)
+    assigned_to = Column(String(100), default='')  # username подопечного
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('event_id', 'telegram_username', name='uq_event_participant'),
+        Index('idx_event_participants_active', 'event_id', 'is_participant'),
+    )
 
 # Инициализация БД - используем SQLite
 engine = create_engine(BotConfig.database_url, connect_args={"check_same_thread": False} if "sqlite" in BotConfig.database_url else {})
@@ -0,0 +1,82 @@
+"""Операции с индексом фото оценок (review_photos)"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+import logging
+
+from sqlalchemy import func
+
+from .models import SessionLocal, ReviewPhoto
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class PhotoFilter:
+    """Фильтр выборки фото; None - без ограничения"""
+    barista: Optional[str] = None
+    point: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+def _filtered(db, photo_filter: PhotoFilter):
+    query = db.query(ReviewPhoto)
+    if photo_filter.barista:
+        query = query.filter(ReviewPhoto.barista_name == photo_filter.barista)
+    if photo_filter.point:
+        query = query.filter(ReviewPhoto.point == photo_filter.point)
+    # Границы по created_at, а не DATE(created_at) - чтобы работали индексы (..., created_at)
+    if photo_filter.start_date:
+        query = query.filter(ReviewPhoto.created_at >= datetime.combine(photo_filter.start_date, time.min))
+    if photo_filter.end_date:
+        query = query.filter(ReviewPhoto.created_at < datetime.combine(photo_filter.end_date + timedelta(days=1), time.min))
+    return query
+
+def count_review_photos(photo_filter: PhotoFilter) -> int:
+    """Количество фото под фильтром"""
+    db = SessionLocal()
+    try:
+        return _filtered(db, photo_filter).count()
+    finally:
+        db.close()
+
+def get_review_photos(photo_filter: PhotoFilter, offset: int = 0, limit: int = 10) -> List[ReviewPhoto]:
+    """Страница фото под фильтром, от новых к старым"""
+    db = SessionLocal()
+    try:
+        return _filtered(db, photo_filter).order_by(
+            ReviewPhoto.created_at.desc(), ReviewPhoto.id.desc()
+        ).offset(offset).limit(limit).all()
+    finally:
+        db.close()
+
+def get_baristas_with_photos() -> List[Tuple[str, int]]:
+    """Бариста и количество их фото, одним запросом"""
+    db = SessionLocal()
+    try:
+        return db.query(ReviewPhoto.barista_name, func.count(ReviewPhoto.id)).group_by(
+            ReviewPhoto.barista_name
+        ).order_by(ReviewPhoto.barista_name).all()
+    finally:
+        db.close()
+
+def get_photo_points() -> List[str]:
+    """Точки, по которым есть фото (для разбора фильтров галереи)"""
+    db = SessionLocal()
+    try:
+        return [point for (point,) in db.query(ReviewPhoto.point).distinct().all()]
+    finally:
+        db.close()
+
+def delete_all_review_photos() -> int:
+    """Очистить индекс фото (вместе с очисткой оценок)"""
+    db = SessionLocal()
+    try:
+        deleted = db.query(ReviewPhoto).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Ошибка очистки индекса фото: {e}")
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+"""Легкие модели чтения: строки select() без identity map и состояния сессии.
+
+Поля названы как колонки ORM-моделей, поэтому обработчики работают с ними так же, как раньше с
+отсоединенными объектами, но без ленивых загрузок после db.close(). Объекты неизменяемые и
+сохраняются в user_data (см. utils/persistence.py).
+"""
+from dataclasses import dataclass
+from datetime import date, time
+from typing import Optional, Sequence
+
+from .models import User, ShiftType, Schedule, ChecklistTemplate, HybridShiftAssignment
+
+@dataclass(frozen=True, slots=True)
+class UserView:
+    """Сотрудник"""
+    id: int
+    name: str
+    iiko_id: Optional[str]
+    telegram_id: Optional[int]
+    telegram_username: Optional[str]
+    role: str
+    is_active: int
+
+@dataclass(frozen=True, slots=True)
+class ShiftTypeView:
+    """Тип смены"""
+    id: int
+    start_time: time
+    end_time: time
+    point: str
+    name: str
+    shift_type: str
+
+@dataclass(frozen=True, slots=True)
+class ShiftView:
+    """Смена вместе с ее типом (shift_type_obj - как у relationship в Schedule)"""
+    shift_id: int
+    shift_date: date
+    iiko_id: str
+    shift_type_id: int
+    source: Optional[str]
+    is_active: bool
+    shift_type_obj: Optional[ShiftTypeView]
+
+@dataclass(frozen=True, slots=True)
+class TaskView:
+    """Задание чек-листа"""
+    id: int
+    day_of_week: int
+    shift_type: str
+    task_description: str
+    order_index: int
+    is_active: int
+
+@dataclass(frozen=True, slots=True)
+class HybridAssignmentView:
+    """Распределение задач пересмена (сами задачи - get_hybrid_assignment_tasks)"""
+    id: int
+    day_of_week: int
+
+# Колонки для select() в порядке полей моделей
+USER_COLUMNS = (User.id, User.name, User.iiko_id, User.telegram_id, User.telegram_username, User.role, User.is_active)
+SHIFT_TYPE_COLUMNS = (ShiftType.id, ShiftType.start_time, ShiftType.end_time, ShiftType.point,
+                      ShiftType.name, ShiftType.shift_type)
+# Смена выбирается вместе с типом: select(*SHIFT_COLUMNS).join(ShiftType)
+SHIFT_COLUMNS = (Schedule.shift_id, Schedule.shift_date, Schedule.iiko_id, Schedule.shift_type_id,
+                 Schedule.source, Schedule.is_active) + SHIFT_TYPE_COLUMNS
+TASK_COLUMNS = (ChecklistTemplate.id, ChecklistTemplate.day_of_week, ChecklistTemplate.shift_type,
+                ChecklistTemplate.task_description, ChecklistTemplate.order_index, ChecklistTemplate.is_active)
+HYBRID_ASSIGNMENT_COLUMNS = (HybridShiftAssignment.id, HybridShiftAssignment.day_of_week)
+
+_SHIFT_OWN_FIELDS = 6
+
+def shift_view(row: Sequence) -> ShiftView:
+    """ShiftView из строки select(*SHIFT_COLUMNS)"""
+    shift_type = ShiftTypeView(*row[_SHIFT_OWN_FIELDS:]) if row[_SHIFT_OWN_FIELDS] is not None else None
+    return ShiftView(*row[:_SHIFT_OWN_FIELDS], shift_type)
+
+READ_MODELS = {model.__name__: model for model in (UserView, ShiftTypeView, ShiftView, TaskView, HybridAssignmentView)}
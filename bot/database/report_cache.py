@@ -0,0 +1,77 @@
+"""Кэш результатов отчетов статистики чек-листов"""
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Hashable, Iterator, Optional, Tuple
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Отчеты за период, который еще не закончился, живут ограниченное время
+REPORT_CACHE_TTL = timedelta(minutes=10)
+REPORT_CACHE_MAX_ENTRIES = 200
+
+class _CachedReport:
+    """Строки отчета и время, до которого они действительны (None - бессрочно)"""
+
+    def __init__(self, start_date: date, end_date: date, rows: Tuple[Dict, ...]):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rows = rows
+        # Закрытый период больше не меняется сам по себе - только через invalidate
+        self.expires_at = None if end_date < date.today() else datetime.now() + REPORT_CACHE_TTL
+
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and datetime.now() > self.expires_at
+
+_cache: Dict[Hashable, _CachedReport] = {}
+_cache_lock = threading.Lock()
+# Растет при каждой инвалидации: отчет, начатый до нее, в кэш не попадет
+_cache_version = 0
+
+def _get(key: Hashable) -> Optional[Tuple[Dict, ...]]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if entry.is_expired():
+            del _cache[key]
+            return None
+        return entry.rows
+
+def _put(key: Hashable, start_date: date, end_date: date, rows: Tuple[Dict, ...], version: int):
+    with _cache_lock:
+        if version != _cache_version:
+            return
+        if len(_cache) >= REPORT_CACHE_MAX_ENTRIES:
+            # Выбрасываем самую старую запись (dict сохраняет порядок вставки)
+            del _cache[next(iter(_cache))]
+        _cache[key] = _CachedReport(start_date, end_date, rows)
+
+def cached_report(report_type: str, start_date: date, end_date: date, params: Tuple,
+                  produce: Callable[[], Iterator[Dict]]) -> Iterator[Dict]:
+    """Отдать строки отчета из кэша или посчитать их, сохранив результат после полного прохода"""
+    key = (report_type, start_date, end_date, params)
+    rows = _get(key)
+    if rows is not None:
+        logger.debug(f"📦 Отчет {report_type} {start_date} - {end_date} взят из кэша")
+        yield from rows
+        return
+
+    version = _cache_version
+    collected = []
+    for row in produce():
+        collected.append(row)
+        yield row
+    _put(key, start_date, end_date, tuple(collected), version)
+
+def invalidate_report_cache(shift_date: Optional[date] = None):
+    """Сбросить кэш отчетов: целиком или только отчеты, период которых включает shift_date"""
+    global _cache_version
+    with _cache_lock:
+        _cache_version += 1
+        if shift_date is None:
+            _cache.clear()
+            return
+        for key in [key for key, entry in _cache.items()
+                    if entry.start_date <= shift_date <= entry.end_date]:
+            del _cache[key]
@@ -1,14 +1,32 @@
 """Операции для работы с расписанием смен"""
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, cast, String
+from sqlalchemy import and_, or_, select
 from .models import SessionLocal, Schedule, ShiftType, User
+from .read_models import ShiftView, ShiftTypeView, SHIFT_COLUMNS, SHIFT_TYPE_COLUMNS, shift_view
+from .report_cache import invalidate_report_cache
+from .schedule_snapshot import (
+    get_schedule_snapshot, invalidate_schedule_snapshot, build_day_roster,
+    RosterEntry, SnapshotShift, SnapshotUser
+)
 from typing import Optional, List, Dict
 from datetime import date, datetime, timedelta, time
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_shift_type_by_times(start_time: time, end_time: time) -> Optional[ShiftType]:
+def _first_shift_type(db: Session, *criteria) -> Optional[ShiftTypeView]:
+    row = db.execute(select(*SHIFT_TYPE_COLUMNS).where(*criteria).limit(1)).first()
+    return ShiftTypeView(*row) if row else None
+
+def _shifts(db: Session, *criteria) -> List[ShiftView]:
+    """Смены с типами одним запросом, по дате и времени начала"""
+    rows = db.execute(
+        select(*SHIFT_COLUMNS).join(ShiftType, Schedule.shift_type_id == ShiftType.id)
+        .where(*criteria).order_by(Schedule.shift_date, ShiftType.start_time)
+    )
+    return [shift_view(row) for row in rows]
+
+def get_shift_type_by_times(start_time: time, end_time: time) -> Optional[ShiftTypeView]:
     """Получить тип смены по времени начала и окончания"""
     db = SessionLocal()
     try:
@@ -18,12 +36,9 @@ def get_shift_type_by_times(start_time: time, end_time: time) -> Optional[ShiftT
         
         logger.info(f"🔍 Поиск типа смены по времени: {start_time_str} - {end_time_str}")
         
-        shift_type = db.query(ShiftType).filter(
-            and_(
-                ShiftType.start_time == start_time_str,
-                ShiftType.end_time == end_time_str
-            )
-        ).first()
+        shift_type = _first_shift_type(
+            db, ShiftType.start_time == start_time_str, ShiftType.end_time == end_time_str
+        )
         
         if shift_type:
             logger.info(f"✅ Найден тип смены: {shift_type.name} (ID: {shift_type.id})")
@@ -38,20 +53,15 @@ def get_shift_type_by_time_strings(start_time_str: str, end_time_str: str):
     """Получить тип смены по времени начала и окончания в виде строк"""
     db = SessionLocal()
     try:
-        return db.query(ShiftType).filter(
-            and_(
-                ShiftType.start_time == start_time_str,
-                ShiftType.end_time == end_time_str
-            )
-        ).first()
+        return _first_shift_type(db, ShiftType.start_time == start_time_str, ShiftType.end_time == end_time_str)
     finally:
         db.close()
 
-def get_shift_type_by_id(shift_type_id: int) -> Optional[ShiftType]:
+def get_shift_type_by_id(shift_type_id: int) -> Optional[ShiftTypeView]:
     """Получить тип смены по ID"""
     db = SessionLocal()
     try:
-        return db.query(ShiftType).filter(ShiftType.id == shift_type_id).first()
+        return _first_shift_type(db, ShiftType.id == shift_type_id)
     finally:
         db.close()
 
@@ -66,6 +76,8 @@ def create_shift(shift_date: date, iiko_id: str, shift_type_id: int) -> Schedule
         )
         db.add(shift)
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         db.refresh(shift)
         logger.info(f"Создана смена ID {shift.shift_id} для сотрудника {iiko_id} на {shift_date}")
         return shift
@@ -76,33 +88,34 @@ def create_shift(shift_date: date, iiko_id: str, shift_type_id: int) -> Schedule
     finally:
         db.close()
 
-def get_shift_by_id(shift_id: int) -> Optional[Schedule]:
+def get_shift_by_id(shift_id: int) -> Optional[ShiftView]:
     """Получить смену по ID"""
     db = SessionLocal()
     try:
-        return db.query(Schedule).filter(Schedule.shift_id == shift_id).first()
+        row = db.execute(
+            select(*SHIFT_COLUMNS).outerjoin(ShiftType, Schedule.shift_type_id == ShiftType.id)
+            .where(Schedule.shift_id == shift_id)
+        ).first()
+        return shift_view(row) if row else None
     finally:
         db.close()
 
 def get_shifts_by_iiko_id(iiko_id: str, start_date: Optional[date] = None,
-                          end_date: Optional[date] = None) -> List[Schedule]:
+                          end_date: Optional[date] = None) -> List[ShiftView]:
     """Получить смены сотрудника по iiko_id"""
     db = SessionLocal()
     try:
-        query = db.query(Schedule).filter(Schedule.iiko_id == str(iiko_id))
+        criteria = [Schedule.iiko_id == str(iiko_id)]
         
         logger.info(f"🔍 ДИАГНОСТИКА get_shifts_by_iiko_id: iiko_id={iiko_id}, start_date={start_date}, end_date={end_date}")
         
         if start_date:
-            query = query.filter(Schedule.shift_date >= start_date)
+            criteria.append(Schedule.shift_date >= start_date)
         if end_date:
-            query = query.filter(Schedule.shift_date <= end_date)
+            criteria.append(Schedule.shift_date <= end_date)
         
         # Сортируем по дате и времени начала смены
-        shifts = query.order_by(
-            Schedule.shift_date,
-            ShiftType.start_time
-        ).join(ShiftType).all()
+        shifts = _shifts(db, *criteria)
         
         logger.info(f"🔍 ДИАГНОСТИКА get_shifts_by_iiko_id: найдено {len(shifts)} смен")
         for shift in shifts:
@@ -112,61 +125,96 @@ def get_shifts_by_iiko_id(iiko_id: str, start_date: Optional[date] = None,
     finally:
         db.close()
 
-def get_shifts_by_date_range(start_date: date, end_date: date) -> List[Schedule]:
+def get_shifts_by_date_range(start_date: date, end_date: date) -> List[ShiftView]:
     """Получить все смены в диапазоне дат"""
     db = SessionLocal()
     try:
-        return db.query(Schedule).filter(
-            and_(Schedule.shift_date >= start_date, Schedule.shift_date <= end_date)
-        ).order_by(
-            Schedule.shift_date,
-            ShiftType.start_time
-        ).join(ShiftType).all()
+        return _shifts(db, Schedule.shift_date >= start_date, Schedule.shift_date <= end_date)
     finally:
         db.close()
 
-def get_upcoming_shifts_by_iiko_id(iiko_id: str, days: int = 7) -> List[Schedule]:
+def get_upcoming_shifts_by_iiko_id(iiko_id: str, days: int = 7) -> List[ShiftView]:
     """Получить ближайшие смены сотрудника на указанное количество дней"""
     today = date.today()
     end_date = today + timedelta(days=days)
     return get_shifts_by_iiko_id(iiko_id, start_date=today, end_date=end_date)
 
-def _find_partner_by_shift_type(db: Session, shift_date: date, point: str, shift_type: str, exclude_iiko_id: str) -> Optional[User]:
-    """Найти напарника по типу смены на точке и дате."""
-    return (
-        db.query(User)
-        .join(Schedule, cast(User.iiko_id, String) == Schedule.iiko_id)
-        .join(ShiftType, Schedule.shift_type_id == ShiftType.id)
-        .filter(
-            and_(
-                Schedule.shift_date == shift_date,
-                ShiftType.point == point,
-                ShiftType.shift_type == shift_type,
-                Schedule.iiko_id != str(exclude_iiko_id),
-                User.is_active == 1
-            )
-        )
-        .order_by(User.name)
-        .first()
-    )
+def get_day_roster(shift_date: date) -> List[RosterEntry]:
+    """Состав дня: каждый сотрудник со своими сменами (пустой список - выходной).
+
+    В окне снимка расписания отвечает без запросов, иначе - одним запросом users ⟕ schedule.
+    """
+    snapshot = get_schedule_snapshot()
+    if snapshot.covers(shift_date, shift_date):
+        return snapshot.get_day_roster(shift_date)
 
-def get_shift_partner(shift_date: date, point: str, shift_type: str, exclude_iiko_id: str) -> Optional[Dict[str, object]]:
-    """Найти напарника по смене. Возвращает пользователя и фактический тип смены."""
     db = SessionLocal()
     try:
-        partner = _find_partner_by_shift_type(db, shift_date, point, shift_type, exclude_iiko_id)
-        if partner:
-            return {"user": partner, "shift_type": shift_type}
-
-        if shift_type != "hybrid":
-            partner = _find_partner_by_shift_type(db, shift_date, point, "hybrid", exclude_iiko_id)
-            if partner:
-                return {"user": partner, "shift_type": "hybrid"}
-
-        return None
+        rows = db.query(
+            User.id, User.iiko_id, User.name, User.is_active, User.telegram_username,
+            Schedule.shift_id, Schedule.shift_date,
+            ShiftType.point, ShiftType.shift_type, ShiftType.name.label('shift_name'),
+            ShiftType.start_time, ShiftType.end_time, Schedule.is_active.label('shift_is_active')
+        ).outerjoin(
+            Schedule,
+            and_(Schedule.iiko_id == User.iiko_id, Schedule.shift_date == shift_date)
+        ).outerjoin(
+            ShiftType, Schedule.shift_type_id == ShiftType.id
+        ).filter(
+            User.iiko_id.isnot(None)
+        ).all()
     finally:
         db.close()
 
+    users = {}
+    shifts = []
+    for row in rows:
+        users[row.iiko_id] = SnapshotUser(
+            user_id=row.id,
+            iiko_id=row.iiko_id,
+            name=row.name,
+            is_active=bool(row.is_active),
+            telegram_username=row.telegram_username
+        )
+        if row.shift_id is not None and row.point is not None:
+            shifts.append(SnapshotShift(
+                shift_id=row.shift_id,
+                shift_date=row.shift_date,
+                iiko_id=row.iiko_id,
+                point=row.point,
+                shift_type=row.shift_type,
+                name=row.shift_name,
+                start_time=row.start_time,
+                end_time=row.end_time,
+                is_active=bool(row.shift_is_active)
+            ))
+    return build_day_roster(list(users.values()), shifts)
+
+def _find_partner_in_roster(roster: List[RosterEntry], point: str, shift_type: str,
+                            exclude_iiko_id: str) -> Optional[RosterEntry]:
+    """Найти напарника по типу смены на точке (первый по имени)."""
+    for entry in roster:
+        if entry.iiko_id == str(exclude_iiko_id) or not entry.is_active:
+            continue
+        if any(shift.point == point and shift.shift_type == shift_type for shift in entry.shifts):
+            return entry
+    return None
+
+def get_shift_partner(shift_date: date, point: str, shift_type: str, exclude_iiko_id: str) -> Optional[Dict[str, object]]:
+    """Найти напарника по смене. Возвращает имя, iiko_id и фактический тип смены."""
+    roster = get_day_roster(shift_date)
+
+    partner = _find_partner_in_roster(roster, point, shift_type, exclude_iiko_id)
+    if partner:
+        return {"name": partner.name, "iiko_id": partner.iiko_id, "shift_type": shift_type}
+
+    if shift_type != "hybrid":
+        partner = _find_partner_in_roster(roster, point, "hybrid", exclude_iiko_id)
+        if partner:
+            return {"name": partner.name, "iiko_id": partner.iiko_id, "shift_type": "hybrid"}
+
+    return None
+
 def update_shift_iiko_id(shift_id: int, new_iiko_id: str) -> Optional[Schedule]:
     """Изменить iiko_id смены (для замен)"""
     db = SessionLocal()
@@ -178,6 +226,8 @@ def update_shift_iiko_id(shift_id: int, new_iiko_id: str) -> Optional[Schedule]:
         shift.iiko_id = str(new_iiko_id)
         shift.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         db.refresh(shift)
         logger.info(f"Смена ID {shift_id} переназначена на сотрудника {new_iiko_id}")
         return shift
@@ -202,6 +252,8 @@ def update_shift(shift_id: int, **kwargs) -> Optional[Schedule]:
         
         shift.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         db.refresh(shift)
         logger.info(f"Смена ID {shift_id} обновлена")
         return shift
@@ -222,6 +274,8 @@ def delete_shift(shift_id: int) -> bool:
         
         db.delete(shift)
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         logger.info(f"Смена ID {shift_id} удалена")
         return True
     except Exception as e:
@@ -256,6 +310,8 @@ def bulk_create_shifts(shifts: List[Dict]) -> int:
             created_count += 1
         
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         logger.info(f"Создано/обновлено {created_count} смен")
         return created_count
     except Exception as e:
@@ -284,6 +340,8 @@ def delete_shifts_by_date_range(start_date: date, end_date: date) -> int:
             )
         ).delete()
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         logger.info(f"Удалено {deleted_count} будущих смен в диапазоне {actual_start_date} - {end_date}")
         return deleted_count
     except Exception as e:
@@ -319,6 +377,8 @@ def remove_stale_shifts(new_shifts: List[Dict], start_date: date, end_date: date
             deleted_count += 1
         
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         logger.info(f"Удалено {deleted_count} устаревших смен в диапазоне {start_date} - {end_date}")
         return deleted_count
     except Exception as e:
@@ -328,7 +388,7 @@ def remove_stale_shifts(new_shifts: List[Dict], start_date: date, end_date: date
     finally:
         db.close()
 
-def get_all_shifts_for_user_in_range(iiko_id: str, start_date: date, end_date: date) -> List[Schedule]:
+def get_all_shifts_for_user_in_range(iiko_id: str, start_date: date, end_date: date) -> List[ShiftView]:
     """Получить все смены пользователя в диапазоне дат"""
     return get_shifts_by_iiko_id(iiko_id, start_date=start_date, end_date=end_date)
 
@@ -347,6 +407,8 @@ def create_shift_type(shift_type_data):
         db.flush()
         shift_type_id = shift_type.id
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         return shift_type_id
     except Exception as e:
         db.rollback()
@@ -354,19 +416,20 @@ def create_shift_type(shift_type_data):
     finally:
         db.close()
 
-def get_shift_types():
+def get_shift_types() -> List[ShiftTypeView]:
     """Получить все типы смен"""
     db = SessionLocal()
     try:
-        return db.query(ShiftType).order_by(ShiftType.point, ShiftType.start_time).all()
+        rows = db.execute(select(*SHIFT_TYPE_COLUMNS).order_by(ShiftType.point, ShiftType.start_time))
+        return [ShiftTypeView(*row) for row in rows]
     finally:
         db.close()
 
-def get_shift_type_by_id(shift_type_id):
+def get_shift_type_by_id(shift_type_id) -> Optional[ShiftTypeView]:
     """Получить тип смены по ID"""
     db = SessionLocal()
     try:
-        return db.query(ShiftType).filter(ShiftType.id == shift_type_id).first()
+        return _first_shift_type(db, ShiftType.id == shift_type_id)
     finally:
         db.close()
 
@@ -379,6 +442,8 @@ def update_shift_type(shift_type_id, update_data):
             for key, value in update_data.items():
                 setattr(shift_type, key, value)
             db.commit()
+            invalidate_schedule_snapshot()
+            invalidate_report_cache()
             return True
         return False
     except Exception as e:
@@ -395,6 +460,8 @@ def delete_shift_type(shift_type_id):
         if shift_type:
             db.delete(shift_type)
             db.commit()
+            invalidate_schedule_snapshot()
+            invalidate_report_cache()
             return True
         return False
     except Exception as e:
@@ -417,6 +484,8 @@ def update_shift_iiko_id(shift_id: int, new_iiko_id: str) -> Optional[Schedule]:
         shift.iiko_id = str(new_iiko_id)
         shift.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         db.refresh(shift)
         logger.info(f"Смена ID {shift_id} переназначена на сотрудника {new_iiko_id}")
         return shift
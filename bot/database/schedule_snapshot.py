@@ -0,0 +1,206 @@
+"""Снимок расписания в памяти для ответов без запросов к БД"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+import threading
+import logging
+
+from sqlalchemy.orm import Session
+
+from .models import SessionLocal, Schedule, ShiftType, User
+
+logger = logging.getLogger(__name__)
+
+# Окно снимка: вчера (для ночных смен) + месяц вперед
+SNAPSHOT_DAYS_BACK = 1
+SNAPSHOT_DAYS_AHEAD = 31
+# Страховка на случай правок БД в обход бота
+SNAPSHOT_MAX_AGE = timedelta(minutes=30)
+
+@dataclass(frozen=True)
+class SnapshotShift:
+    """Смена в снимке расписания"""
+    shift_id: int
+    shift_date: date
+    iiko_id: str
+    point: str
+    shift_type: str
+    name: str
+    start_time: time
+    end_time: time
+    is_active: bool = True  # False - смена отменена или заменена (schedule.is_active)
+
+@dataclass(frozen=True)
+class SnapshotUser:
+    """Сотрудник в снимке расписания"""
+    user_id: int
+    iiko_id: str
+    name: str
+    is_active: bool
+    telegram_username: Optional[str]
+    telegram_id: Optional[int] = None  # заполняется при /start, нужен для уведомлений
+
+@dataclass(frozen=True)
+class RosterEntry:
+    """Сотрудник и его смены за один день"""
+    user_id: int
+    iiko_id: str
+    name: str
+    is_active: bool
+    shifts: Tuple[SnapshotShift, ...]
+
+    @property
+    def has_shift(self) -> bool:
+        return bool(self.shifts)
+
+def build_day_roster(users: List[SnapshotUser], shifts: List[SnapshotShift]) -> List[RosterEntry]:
+    """Собрать состав дня: все активные сотрудники и все, у кого в этот день есть смена"""
+    shifts_by_iiko_id: Dict[str, List[SnapshotShift]] = {}
+    for shift in shifts:
+        shifts_by_iiko_id.setdefault(shift.iiko_id, []).append(shift)
+
+    roster = [
+        RosterEntry(
+            user_id=user.user_id,
+            iiko_id=user.iiko_id,
+            name=user.name,
+            is_active=user.is_active,
+            shifts=tuple(sorted(shifts_by_iiko_id.get(user.iiko_id, ()), key=lambda shift: (shift.start_time, shift.shift_id)))
+        )
+        for user in users
+        if user.is_active or user.iiko_id in shifts_by_iiko_id
+    ]
+    roster.sort(key=lambda entry: entry.name)
+    return roster
+
+class ScheduleSnapshot:
+    """Индекс смен по дате и (точка, тип смены), а также по сотруднику"""
+
+    def __init__(self, start_date: date, end_date: date,
+                 shifts: List[SnapshotShift], users: List[SnapshotUser]):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.built_at = datetime.now()
+        self.by_date: Dict[date, Dict[Tuple[str, str], List[SnapshotShift]]] = {}
+        self.by_iiko_id: Dict[str, List[SnapshotShift]] = {}
+        self.users: Dict[str, SnapshotUser] = {user.iiko_id: user for user in users}
+        self.iiko_id_by_username: Dict[str, str] = {
+            user.telegram_username: user.iiko_id for user in users if user.telegram_username
+        }
+
+        for shift in shifts:
+            slots = self.by_date.setdefault(shift.shift_date, {})
+            slots.setdefault((shift.point, shift.shift_type), []).append(shift)
+            self.by_iiko_id.setdefault(shift.iiko_id, []).append(shift)
+
+    def covers(self, start_date: date, end_date: date) -> bool:
+        """Покрывает ли снимок указанный диапазон дат"""
+        return self.start_date <= start_date and end_date <= self.end_date
+
+    def is_stale(self) -> bool:
+        """Снимок построен в другой день или слишком давно"""
+        return (self.start_date != date.today() - timedelta(days=SNAPSHOT_DAYS_BACK)
+                or datetime.now() - self.built_at > SNAPSHOT_MAX_AGE)
+
+    def get_iiko_id_by_username(self, telegram_username: str) -> Optional[str]:
+        """Найти iiko_id сотрудника по Telegram username"""
+        return self.iiko_id_by_username.get(telegram_username)
+
+    def get_shifts(self, iiko_id: str, start_date: date, end_date: date) -> List[SnapshotShift]:
+        """Смены сотрудника в диапазоне дат (отсортированы по дате и времени начала)"""
+        return [
+            shift for shift in self.by_iiko_id.get(str(iiko_id), [])
+            if start_date <= shift.shift_date <= end_date
+        ]
+
+    def get_upcoming_shifts(self, iiko_id: str, days: int = 7) -> List[SnapshotShift]:
+        """Ближайшие смены сотрудника на указанное количество дней"""
+        today = date.today()
+        return self.get_shifts(iiko_id, today, today + timedelta(days=days))
+
+    def get_day_roster(self, shift_date: date) -> List[RosterEntry]:
+        """Состав дня по снимку"""
+        day_shifts = [
+            shift for slot in self.by_date.get(shift_date, {}).values() for shift in slot
+        ]
+        return build_day_roster(list(self.users.values()), day_shifts)
+
+_snapshot: Optional[ScheduleSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+def load_window_shifts(db: Session, start_date: date, end_date: date) -> List[SnapshotShift]:
+    """Все смены диапазона дат одним запросом (с данными типа смены)"""
+    rows = db.query(
+        Schedule.shift_id, Schedule.shift_date, Schedule.iiko_id,
+        ShiftType.point, ShiftType.shift_type, ShiftType.name,
+        ShiftType.start_time, ShiftType.end_time, Schedule.is_active
+    ).join(
+        ShiftType, Schedule.shift_type_id == ShiftType.id
+    ).filter(
+        Schedule.shift_date >= start_date,
+        Schedule.shift_date <= end_date
+    ).order_by(
+        Schedule.shift_date,
+        ShiftType.start_time
+    ).all()
+    return [
+        SnapshotShift(
+            shift_id=row.shift_id,
+            shift_date=row.shift_date,
+            iiko_id=row.iiko_id,
+            point=row.point,
+            shift_type=row.shift_type,
+            name=row.name,
+            start_time=row.start_time,
+            end_time=row.end_time,
+            is_active=bool(row.is_active)
+        )
+        for row in rows
+    ]
+
+def load_snapshot_users(db: Session) -> List[SnapshotUser]:
+    """Все сотрудники с iiko_id одним запросом"""
+    rows = db.query(
+        User.id, User.iiko_id, User.name, User.is_active, User.telegram_username, User.telegram_id
+    ).filter(User.iiko_id.isnot(None)).all()
+    return [
+        SnapshotUser(
+            user_id=row.id,
+            iiko_id=row.iiko_id,
+            name=row.name,
+            is_active=bool(row.is_active),
+            telegram_username=row.telegram_username,
+            telegram_id=row.telegram_id
+        )
+        for row in rows
+    ]
+
+def build_schedule_snapshot() -> ScheduleSnapshot:
+    """Построить снимок расписания двумя запросами (смены окна + пользователи)"""
+    today = date.today()
+    start_date = today - timedelta(days=SNAPSHOT_DAYS_BACK)
+    end_date = today + timedelta(days=SNAPSHOT_DAYS_AHEAD)
+
+    db = SessionLocal()
+    try:
+        shifts = load_window_shifts(db, start_date, end_date)
+        users = load_snapshot_users(db)
+    finally:
+        db.close()
+
+    logger.info(f"📸 Снимок расписания построен: {len(shifts)} смен, {start_date} - {end_date}")
+    return ScheduleSnapshot(start_date, end_date, shifts, users)
+
+def get_schedule_snapshot() -> ScheduleSnapshot:
+    """Получить актуальный снимок расписания (перестраивается лениво)"""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.is_stale():
+            _snapshot = build_schedule_snapshot()
+        return _snapshot
+
+def invalidate_schedule_snapshot():
+    """Сбросить снимок после изменения расписания, типов смен или пользователей"""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
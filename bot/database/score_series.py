@@ -0,0 +1,241 @@
+"""Динамика оценок бариста: дневные суммы по критериям в массивах, дочитываются из новых оценок по id"""
+from array import array
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import sqlite3
+import threading
+import logging
+
+from .archive import DRINK_REVIEWS, get_archive_boundary, source_sql
+from .models import engine
+
+logger = logging.getLogger(__name__)
+
+CRITERIA = ('balance', 'bouquet', 'body', 'aftertaste', 'foam', 'latte_art')
+TOTAL = 'total'
+SERIES = CRITERIA + (TOTAL,)
+
+SERIES_NAMES = {
+    'balance': 'Баланс',
+    'bouquet': 'Букет',
+    'body': 'Тело',
+    'aftertaste': 'Послевкусие',
+    'foam': 'Пена',
+    'latte_art': 'Латте-арт',
+    TOTAL: 'Общая',
+}
+
+# Критерии общей оценки - как в stats_queries
+TOTAL_CRITERIA = {
+    'Эспрессо/Фильтр': ('balance', 'bouquet', 'body', 'aftertaste'),
+    'Молочный напиток': ('balance', 'bouquet', 'foam', 'latte_art'),
+}
+
+_REVIEW_COLUMNS = ('id', 'barista_name', 'category', 'created_at') + CRITERIA
+
+@dataclass(frozen=True)
+class CriterionTrend:
+    """Средние по неделям (от старых к новым) и наклон - изменение оценки за неделю"""
+    series: str
+    weekly: Tuple[Optional[float], ...]
+    slope: Optional[float]
+
+@dataclass(frozen=True)
+class WeekDelta:
+    """Средняя общая оценка за последние 7 дней против предыдущих 7"""
+    barista: str
+    this_week: Optional[float]
+    last_week: Optional[float]
+    reviews: int
+
+    @property
+    def delta(self) -> Optional[float]:
+        if self.this_week is None or self.last_week is None:
+            return None
+        return round(self.this_week - self.last_week, 2)
+
+class _BaristaSeries:
+    """Суммы и количества оценок по дням: индекс массива - номер дня от origin хранилища"""
+    __slots__ = ('sums', 'counts')
+
+    def __init__(self, days: int = 0):
+        self.sums = {name: array('d', bytes(8 * days)) for name in SERIES}
+        self.counts = {name: array('I', bytes(4 * days)) for name in SERIES}
+
+    def add(self, day_index: int, name: str, value: float):
+        sums, counts = self.sums[name], self.counts[name]
+        if day_index >= len(sums):
+            missing = day_index + 1 - len(sums)
+            sums.extend(array('d', bytes(8 * missing)))
+            counts.extend(array('I', bytes(4 * missing)))
+        sums[day_index] += value
+        counts[day_index] += 1
+
+    def prepend_days(self, days: int):
+        for name in SERIES:
+            self.sums[name][0:0] = array('d', bytes(8 * days))
+            self.counts[name][0:0] = array('I', bytes(4 * days))
+
+    def window(self, name: str, start_index: int, end_index: int) -> Tuple[float, int]:
+        """Сумма и количество за дни [start_index, end_index)"""
+        sums, counts = self.sums[name], self.counts[name]
+        start_index, end_index = max(start_index, 0), min(end_index, len(sums))
+        if start_index >= end_index:
+            return 0.0, 0
+        return sum(sums[start_index:end_index]), sum(counts[start_index:end_index])
+
+def _average(total: float, count: int) -> Optional[float]:
+    return round(total / count, 2) if count else None
+
+class ScoreSeriesStore:
+    """Ряды оценок по бариста. Сырые оценки читаются один раз, дальше - только новые (id > последнего)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._origin: Optional[date] = None
+        self._baristas: Dict[str, _BaristaSeries] = {}
+        self._last_id = 0
+        # Граница архива на момент последнего чтения: сдвинулась - архив мог забрать непрочитанные строки
+        self._archive_boundary: Optional[date] = None
+
+    def reset(self):
+        """Забыть все ряды (после очистки оценок, clear_with_archive) - пересчитаются при следующем обращении.
+
+        Это единственный путь к пересборке: архивация переносит строки с теми же id, и ряды остаются верны.
+        """
+        with self._lock:
+            self._reset()
+
+    def _day_index(self, day: date) -> int:
+        if self._origin is None:
+            self._origin = day
+        elif day < self._origin:
+            # Оценка раньше первого известного дня (например, дата из архива) - сдвигаем начало
+            shift = (self._origin - day).days
+            for series in self._baristas.values():
+                series.prepend_days(shift)
+            self._origin = day
+        return (day - self._origin).days
+
+    def _add_review(self, barista: str, category: str, created_at: str, scores: Dict[str, Optional[int]]):
+        day_index = self._day_index(date.fromisoformat(created_at[:10]))
+        series = self._baristas.get(barista)
+        if series is None:
+            series = self._baristas[barista] = _BaristaSeries()
+        for name, value in scores.items():
+            if value is not None:
+                series.add(day_index, name, value)
+        total_criteria = TOTAL_CRITERIA.get(category)
+        if total_criteria and all(scores[name] is not None for name in total_criteria):
+            series.add(day_index, TOTAL, sum(scores[name] for name in total_criteria) / 4.0)
+
+    def refresh(self) -> int:
+        """Дочитать новые оценки. Возвращает количество добавленных."""
+        with self._lock:
+            conn = sqlite3.connect(engine.url.database, timeout=30)
+            try:
+                cursor = conn.cursor()
+                # Первый проход и проход после архивации - по горячей таблице вместе с архивом
+                # (id > последнего прочитанного в обеих), иначе новые строки есть только в горячей
+                boundary = get_archive_boundary(DRINK_REVIEWS)
+                with_archive = self._last_id == 0 or boundary != self._archive_boundary
+                source = source_sql(DRINK_REVIEWS, _REVIEW_COLUMNS, None) if with_archive else DRINK_REVIEWS.table
+                cursor.execute(
+                    f"SELECT {', '.join(_REVIEW_COLUMNS)} FROM {source} "
+                    f"WHERE id > ? AND created_at IS NOT NULL ORDER BY id",
+                    (self._last_id,)
+                )
+                added = 0
+                for review_id, barista, category, created_at, *scores in cursor:
+                    self._add_review(barista, category, str(created_at), dict(zip(CRITERIA, scores)))
+                    self._last_id = max(self._last_id, review_id)
+                    added += 1
+                self._archive_boundary = boundary
+            finally:
+                conn.close()
+
+        if added:
+            logger.debug(f"📉 Ряды динамики: +{added} оценок")
+        return added
+
+    def baristas(self) -> List[str]:
+        with self._lock:
+            return sorted(self._baristas)
+
+    def _index(self, day: date) -> int:
+        return (day - self._origin).days if self._origin else 0
+
+    def rolling_average(self, barista: str, name: str = TOTAL, window_days: int = 7,
+                        start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[Tuple[date, Optional[float]]]:
+        """Скользящее среднее за window_days дней (взвешенное по числу оценок) на каждый день периода"""
+        end_date = end_date or date.today()
+        start_date = start_date or end_date - timedelta(days=89)
+        with self._lock:
+            series = self._baristas.get(barista)
+            if series is None:
+                return []
+            sums, counts = series.sums[name], series.counts[name]
+            first = self._index(start_date) - window_days + 1
+            days = (end_date - start_date).days + 1
+
+            # Окно двигается на день: прибавляем новый день, вычитаем выпавший
+            window_sum, window_count = series.window(name, first, first + window_days - 1)
+            points = []
+            for offset in range(days):
+                entering = first + window_days - 1 + offset
+                if 0 <= entering < len(sums):
+                    window_sum += sums[entering]
+                    window_count += counts[entering]
+                points.append((start_date + timedelta(days=offset), _average(window_sum, window_count)))
+                leaving = first + offset
+                if 0 <= leaving < len(sums):
+                    window_sum -= sums[leaving]
+                    window_count -= counts[leaving]
+            return points
+
+    def criterion_trends(self, barista: str, weeks: int = 8, today: Optional[date] = None) -> List[CriterionTrend]:
+        """Средние по неделям за последние weeks недель и тренд по каждому ряду"""
+        today = today or date.today()
+        with self._lock:
+            series = self._baristas.get(barista)
+            if series is None:
+                return []
+            end_index = self._index(today) + 1
+            trends = []
+            for name in SERIES:
+                weekly = tuple(
+                    _average(*series.window(name, end_index - 7 * (week + 1), end_index - 7 * week))
+                    for week in reversed(range(weeks))
+                )
+                trends.append(CriterionTrend(name, weekly, _slope(weekly)))
+            return trends
+
+    def week_over_week(self, today: Optional[date] = None) -> List[WeekDelta]:
+        """Общая оценка за последние 7 дней и предыдущие 7 по всем бариста с оценками за 14 дней"""
+        today = today or date.today()
+        with self._lock:
+            end_index = self._index(today) + 1
+            deltas = []
+            for barista, series in self._baristas.items():
+                this_sum, this_count = series.window(TOTAL, end_index - 7, end_index)
+                last_sum, last_count = series.window(TOTAL, end_index - 14, end_index - 7)
+                if this_count or last_count:
+                    deltas.append(WeekDelta(barista, _average(this_sum, this_count),
+                                            _average(last_sum, last_count), this_count))
+        return sorted(deltas, key=lambda item: (item.this_week is None, -(item.this_week or 0), item.barista))
+
+def _slope(values: Tuple[Optional[float], ...]) -> Optional[float]:
+    """Наклон прямой МНК по непустым точкам (изменение за один шаг)"""
+    points = [(x, y) for x, y in enumerate(values) if y is not None]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator, 3)
+
+score_series = ScoreSeriesStore()
@@ -38,6 +38,24 @@ def save_review(review_data):
         review_data.get('photo_file_id'),  # 🆕 Сохраняем file_id
         review_data.get('comment', '-')
     ))
+    review_id = cursor.lastrowid
+    
+    # Индекс фото - в той же транзакции, что и оценка
+    if review_data.get('photo_file_id'):
+        cursor.execute('''
+            INSERT INTO review_photos
+            (review_id, file_id, file_unique_id, thumb_file_id, barista_name, point, file_size, width, height, created_at)
+            SELECT id, ?, ?, ?, barista_name, point, ?, ?, ?, COALESCE(created_at, CURRENT_TIMESTAMP) FROM drink_reviews WHERE id = ?
+        ''', (
+            review_data['photo_file_id'],
+            review_data.get('photo_unique_id'),
+            review_data.get('photo_thumb_file_id'),
+            review_data.get('photo_size'),
+            review_data.get('photo_width'),
+            review_data.get('photo_height'),
+            review_id
+        ))
     
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+    return review_id
\ No newline at end of file
@@ -1,7 +1,15 @@
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Tuple
 
+from .archive import DRINK_REVIEWS, source_sql
+
+# Колонки оценок, нужные статистике (архив подмешивается только с ними)
+REVIEW_STATS_COLUMNS = (
+    'barista_name', 'category', 'drink_type', 'balance', 'bouquet', 'body',
+    'aftertaste', 'foam', 'latte_art', 'created_at'
+)
+
 def get_barista_stats_period(start_date: str = None, end_date: str = None) -> List[Tuple]:
     """
     Получает статистику по бариста за указанный период
@@ -11,8 +19,12 @@ def get_barista_stats_period(start_date: str = None, end_date: str = None) -> Li
     conn = sqlite3.connect('coffee_quality.db')
     cursor = conn.cursor()
     
+    # Архив нужен, только если период уходит за границу архивации
+    period_start = date.fromisoformat(start_date[:10]) if start_date else None
+    reviews = source_sql(DRINK_REVIEWS, REVIEW_STATS_COLUMNS, period_start)
+    
     # Базовый запрос
-    query = """
+    query = f"""
     SELECT 
         barista_name,
         -- Эспрессо
@@ -37,7 +49,7 @@ def get_barista_stats_period(start_date: str = None, end_date: str = None) -> Li
                   WHEN category = 'Молочный напиток' THEN (balance + bouquet + foam + latte_art)/4.0
                   END), 2) as total_avg
         
-    FROM drink_reviews
+    FROM {reviews}
     WHERE 1=1
     """
     
@@ -0,0 +1,165 @@
+"""Подбор вариантов замены смены: кто может взять смену и какие обмены не создают конфликтов"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .models import SessionLocal
+from .schedule_snapshot import SnapshotShift, SnapshotUser, load_window_shifts, load_snapshot_users
+
+logger = logging.getLogger(__name__)
+
+# Сколько дней вперед ищем смены коллеги для обмена
+SWAP_WINDOW_DAYS = 60
+# Минимальный отдых между сменами одного сотрудника (вечер до 23:30 -> утро с 07:00 допустим)
+MIN_REST_HOURS = 7
+
+@dataclass(frozen=True)
+class SwapOption:
+    """Смена коллеги, которую инициатор получает взамен своей"""
+    shift: SnapshotShift
+    same_point: bool
+    same_type: bool
+
+    @property
+    def rank(self) -> int:
+        """0 - та же точка и тип, 1 - та же точка, 2 - тот же тип, 3 - остальное"""
+        if self.same_point and self.same_type:
+            return 0
+        if self.same_point:
+            return 1
+        if self.same_type:
+            return 2
+        return 3
+
+@dataclass(frozen=True)
+class SwapCandidate:
+    """Коллега и допустимые варианты замены с ним"""
+    iiko_id: str
+    name: str
+    is_free: bool  # нет своих смен в день замены
+    can_take: bool  # может взять смену без обмена, не нарушая свое расписание
+    exchanges: Tuple[SwapOption, ...]
+
+    @property
+    def has_options(self) -> bool:
+        return self.can_take or bool(self.exchanges)
+
+def _shift_interval(shift: SnapshotShift) -> Tuple[datetime, datetime]:
+    """Начало и конец смены (смена через полночь заканчивается на следующий день)"""
+    start = datetime.combine(shift.shift_date, shift.start_time)
+    end = datetime.combine(shift.shift_date, shift.end_time)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+def _conflicts(first: SnapshotShift, second: SnapshotShift) -> bool:
+    """Смены пересекаются или между ними меньше MIN_REST_HOURS отдыха"""
+    first_start, first_end = _shift_interval(first)
+    second_start, second_end = _shift_interval(second)
+    rest = timedelta(hours=MIN_REST_HOURS)
+    return first_start < second_end + rest and second_start < first_end + rest
+
+class SwapPlanner:
+    """Проверка замен в памяти по одному чтению окна расписания"""
+
+    def __init__(self, original: SnapshotShift, requester_iiko_id: str,
+                 shifts: List[SnapshotShift], users: List[SnapshotUser]):
+        self.original = original
+        self.requester_iiko_id = str(requester_iiko_id)
+        self.users = {user.iiko_id: user for user in users}
+        # iiko_id -> дата -> смены: соседние смены ищутся только в пределах ±1 дня
+        self.shifts_by_person: Dict[str, Dict[date, List[SnapshotShift]]] = {}
+        for shift in shifts:
+            self.shifts_by_person.setdefault(shift.iiko_id, {}).setdefault(shift.shift_date, []).append(shift)
+
+    def _fits(self, iiko_id: str, new_shift: SnapshotShift, given_away: Optional[SnapshotShift] = None) -> bool:
+        """Можно ли добавить смену сотруднику (с учетом смены, которую он отдает)"""
+        days = self.shifts_by_person.get(iiko_id, {})
+        for offset in (-1, 0, 1):
+            for shift in days.get(new_shift.shift_date + timedelta(days=offset), ()):
+                if given_away is not None and shift.shift_id == given_away.shift_id:
+                    continue
+                if _conflicts(shift, new_shift):
+                    return False
+        return True
+
+    def _exchanges(self, iiko_id: str) -> List[SwapOption]:
+        """Смены коллеги, обмен на которые не создает конфликтов ни у одного из двоих"""
+        today = date.today()
+        original = self.original
+        options = []
+        for shift_date, day_shifts in self.shifts_by_person.get(iiko_id, {}).items():
+            if shift_date < today:
+                continue
+            for shift in day_shifts:
+                # Обмен на точно такую же смену ничего не меняет
+                if (shift.shift_date, shift.point, shift.start_time, shift.end_time) == \
+                        (original.shift_date, original.point, original.start_time, original.end_time):
+                    continue
+                if not self._fits(self.requester_iiko_id, shift, given_away=original):
+                    continue
+                if not self._fits(iiko_id, original, given_away=shift):
+                    continue
+                options.append(SwapOption(
+                    shift=shift,
+                    same_point=shift.point == original.point,
+                    same_type=shift.shift_type == original.shift_type
+                ))
+        options.sort(key=lambda option: (
+            option.rank,
+            abs((option.shift.shift_date - original.shift_date).days),
+            option.shift.shift_date,
+            option.shift.start_time
+        ))
+        return options
+
+    def candidate(self, iiko_id: str) -> Optional[SwapCandidate]:
+        """Варианты замены с конкретным коллегой"""
+        user = self.users.get(str(iiko_id))
+        if not user or user.iiko_id == self.requester_iiko_id:
+            return None
+        original = self.original
+        return SwapCandidate(
+            iiko_id=user.iiko_id,
+            name=user.name,
+            is_free=not self.shifts_by_person.get(user.iiko_id, {}).get(original.shift_date),
+            can_take=self._fits(user.iiko_id, original),
+            exchanges=tuple(self._exchanges(user.iiko_id))
+        )
+
+    def candidates(self) -> List[SwapCandidate]:
+        """Активные коллеги, ранжированные: сначала свободные и с обменами на той же точке и типе"""
+        result = [
+            self.candidate(user.iiko_id)
+            for user in self.users.values()
+            if user.is_active and user.iiko_id != self.requester_iiko_id
+        ]
+        result.sort(key=lambda candidate: (
+            not candidate.has_options,
+            not candidate.can_take,
+            not candidate.is_free,
+            candidate.exchanges[0].rank if candidate.exchanges else 4,
+            candidate.name
+        ))
+        return result
+
+def build_swap_planner(shift_id: int, requester_iiko_id: str,
+                       days: int = SWAP_WINDOW_DAYS) -> Optional[SwapPlanner]:
+    """Прочитать окно расписания и сотрудников одним проходом и подготовить планировщик замен"""
+    today = date.today()
+    db = SessionLocal()
+    try:
+        # +-1 день по краям нужен для проверки отдыха между сменами
+        shifts = load_window_shifts(db, today - timedelta(days=1), today + timedelta(days=days + 1))
+        users = load_snapshot_users(db)
+    finally:
+        db.close()
+
+    original = next((shift for shift in shifts if shift.shift_id == shift_id), None)
+    if original is None:
+        logger.warning(f"⚠️ Смена {shift_id} не найдена в окне замен")
+        return None
+
+    logger.info(f"🔄 Подбор замен для смены {shift_id}: {len(shifts)} смен в окне")
+    return SwapPlanner(original, requester_iiko_id, shifts, users)
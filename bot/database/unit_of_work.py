@@ -0,0 +1,36 @@
+"""Единица работы: одна сессия БД на обработку обновления вместо своей сессии в каждой функции"""
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from .models import SessionLocal
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[Session]:
+    """Сессия на время обработчика: одно соединение из пула и общая identity map для всех чтений.
+
+    Передается вниз по цепочке в функции с параметром db. При выходе без ошибок изменения фиксируются,
+    при ошибке откатываются.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@contextmanager
+def use_session(db: Optional[Session] = None) -> Iterator[Session]:
+    """Сессия вызывающего (закрывает ее владелец) или своя на время одного вызова"""
+    if db is not None:
+        yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
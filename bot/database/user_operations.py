@@ -1,41 +1,55 @@
 """Операции для работы с пользователями"""
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from .models import SessionLocal, User
-from typing import Optional, List
+from .read_models import UserView, USER_COLUMNS
+from .unit_of_work import use_session
+from .report_cache import invalidate_report_cache
+from .schedule_snapshot import invalidate_schedule_snapshot
+from typing import Optional, List, Union
 
-def get_user_by_iiko_id(iiko_id: int) -> Optional[User]:
+# Поля пользователя, от которых зависят отчеты (имена и связь со сменами) и снимок расписания
+REPORT_USER_FIELDS = frozenset({'name', 'iiko_id', 'is_active'})
+SNAPSHOT_USER_FIELDS = frozenset({'name', 'iiko_id', 'is_active', 'telegram_username', 'telegram_id'})
+
+def normalize_iiko_id(iiko_id: Optional[Union[int, str]]) -> Optional[str]:
+    """Привести iiko_id к строке, как он хранится в users и schedule"""
+    if iiko_id is None:
+        return None
+    iiko_id = str(iiko_id).strip()
+    return iiko_id or None
+
+def _first_user(db: Session, *criteria) -> Optional[UserView]:
+    row = db.execute(select(*USER_COLUMNS).where(*criteria).limit(1)).first()
+    return UserView(*row) if row else None
+
+def _users(db: Session, *criteria) -> List[UserView]:
+    return [UserView(*row) for row in db.execute(select(*USER_COLUMNS).where(*criteria).order_by(User.id))]
+
+def get_user_by_iiko_id(iiko_id: Union[int, str], db: Optional[Session] = None) -> Optional[UserView]:
     """Получить пользователя по Iiko ID"""
-    db = SessionLocal()
-    try:
-        return db.query(User).filter(User.iiko_id == iiko_id).first()
-    finally:
-        db.close()
+    iiko_id = normalize_iiko_id(iiko_id)
+    if iiko_id is None:
+        return None
+    with use_session(db) as db:
+        return _first_user(db, User.iiko_id == iiko_id)
 
-def get_user_by_telegram_id(telegram_id: int) -> Optional[User]:
+def get_user_by_telegram_id(telegram_id: int, db: Optional[Session] = None) -> Optional[UserView]:
     """Получить пользователя по Telegram ID"""
-    db = SessionLocal()
-    try:
-        return db.query(User).filter(User.telegram_id == telegram_id).first()
-    finally:
-        db.close()
+    with use_session(db) as db:
+        return _first_user(db, User.telegram_id == telegram_id)
 
-def get_user_by_username(telegram_username: str) -> Optional[User]:
+def get_user_by_username(telegram_username: str, db: Optional[Session] = None) -> Optional[UserView]:
     """Получить пользователя по Telegram username"""
-    db = SessionLocal()
-    try:
-        return db.query(User).filter(User.telegram_username == telegram_username).first()
-    finally:
-        db.close()
+    with use_session(db) as db:
+        return _first_user(db, User.telegram_username == telegram_username)
 
-def get_user_by_id(user_id: int) -> Optional[User]:
+def get_user_by_id(user_id: int, db: Optional[Session] = None) -> Optional[UserView]:
     """Получить пользователя по внутреннему ID"""
-    db = SessionLocal()
-    try:
-        return db.query(User).filter(User.id == user_id).first()
-    finally:
-        db.close()
+    with use_session(db) as db:
+        return _first_user(db, User.id == user_id)
 
-def create_user(name: str, iiko_id: Optional[int] = None,
+def create_user(name: str, iiko_id: Optional[Union[int, str]] = None,
                 telegram_username: Optional[str] = None, 
                 role: str = 'barista') -> User:
     """Создать нового пользователя"""
@@ -43,31 +57,44 @@ def create_user(name: str, iiko_id: Optional[int] = None,
     try:
         user = User(
             name=name,
-            iiko_id=iiko_id,
+            iiko_id=normalize_iiko_id(iiko_id),
             telegram_username=telegram_username,
             role=role,
             is_active=1
         )
         db.add(user)
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         db.refresh(user)
         return user
     finally:
         db.close()
 
 def update_user(user_id: int, **kwargs) -> Optional[User]:
-    """Обновить данные пользователя"""
+    """Обновить данные пользователя (кэши сбрасываются, только если поле действительно изменилось)"""
     db = SessionLocal()
     try:
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             return None
         
+        if 'iiko_id' in kwargs:
+            kwargs['iiko_id'] = normalize_iiko_id(kwargs['iiko_id'])
+
+        changed = set()
         for key, value in kwargs.items():
-            if hasattr(user, key):
+            if hasattr(user, key) and getattr(user, key) != value:
                 setattr(user, key, value)
+                changed.add(key)
+        if not changed:
+            return user
         
         db.commit()
+        if changed & SNAPSHOT_USER_FIELDS:
+            invalidate_schedule_snapshot()
+        if changed & REPORT_USER_FIELDS:
+            invalidate_report_cache()
         db.refresh(user)
         return user
     finally:
@@ -83,29 +110,25 @@ def delete_user(user_id: int) -> bool:
         
         user.is_active = 0
         db.commit()
+        invalidate_schedule_snapshot()
+        invalidate_report_cache()
         return True
     finally:
         db.close()
 
-def get_all_users(active_only: bool = True) -> List[User]:
+def get_all_users(active_only: bool = True) -> List[UserView]:
     """Получить всех пользователей"""
     db = SessionLocal()
     try:
-        query = db.query(User)
-        if active_only:
-            query = query.filter(User.is_active == 1)
-        return query.all()
+        return _users(db, *([User.is_active == 1] if active_only else []))
     finally:
         db.close()
 
-def get_users_by_role(role: str, active_only: bool = True) -> List[User]:
+def get_users_by_role(role: str, active_only: bool = True) -> List[UserView]:
     """Получить пользователей по роли"""
     db = SessionLocal()
     try:
-        query = db.query(User).filter(User.role == role)
-        if active_only:
-            query = query.filter(User.is_active == 1)
-        return query.all()
+        return _users(db, User.role == role, *([User.is_active == 1] if active_only else []))
     finally:
         db.close()
 
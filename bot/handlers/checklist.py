@@ -1,15 +1,21 @@
 """Обработчики для системы чек-листов"""
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
 from bot.utils.auth import require_roles, ROLE_MENTOR, ROLE_SENIOR
 from bot.utils.common_handlers import cancel_conversation, start_cancel_conversation
-from bot.database.user_operations import get_user_by_username, get_user_by_iiko_id
+from bot.database.user_operations import get_user_by_username
+from bot.database.unit_of_work import unit_of_work
+from bot.database.schedule_snapshot import SnapshotUser, get_schedule_snapshot
+from bot.database.read_models import TaskView
+from bot.database.active_shifts import ActiveShift
 from bot.database.checklist_operations import (
-    get_current_shift_for_user, get_tasks_for_shift, get_completed_tasks_for_shift,
-    toggle_task_completion
+    get_current_shift_for_iiko_id, get_tasks_for_shift, get_completed_tasks_for_shift,
+    set_task_completion
 )
 from bot.utils.emulation import is_emulation_mode, get_emulated_user
 from bot.keyboards.menus import get_main_menu
+from sqlalchemy.orm import Session
+from typing import List, Optional, Set, Tuple
 from datetime import datetime, date
 import logging
 
@@ -18,7 +24,8 @@ logger = logging.getLogger(__name__)
 # Состояния для чек-листов
 (CHECKLIST_MENU, CHECKLIST_VIEW, CHECKLIST_TASK_ACTION) = range(3)
 
-BUTTON_TASK_PREFIX_LENGTH = 15
+# Задача ищется по id в callback_data, текст кнопки только для чтения
+BUTTON_TASK_PREFIX_LENGTH = 40
 
 def format_task_button(task_description: str, completed: bool) -> str:
     """Сформировать текст кнопки для задачи с укороченным описанием."""
@@ -28,70 +35,115 @@ def format_task_button(task_description: str, completed: bool) -> str:
     status = "✅" if completed else "☐"
     return f"{status} {prefix}"
 
-def get_task_prefix(task_description: str) -> str:
-    """Получить префикс задачи для сопоставления."""
-    return task_description[:BUTTON_TASK_PREFIX_LENGTH]
-
-async def _resolve_checklist_user(update: Update, context: ContextTypes.DEFAULT_TYPE, use_emulation: bool):
-    """Получить пользователя для чек-листа с учетом режима эмуляции."""
+def _resolve_checklist_user(update: Update, context: ContextTypes.DEFAULT_TYPE, use_emulation: bool,
+                            db: Optional[Session] = None) -> Tuple[Optional[SnapshotUser], Optional[str]]:
+    """Получить пользователя для чек-листа с учетом режима эмуляции. Вместо пользователя - текст ошибки."""
     if use_emulation:
         if not is_emulation_mode(context):
-            await update.message.reply_text("❌ Сначала запустите эмуляцию сотрудника")
             return None, "❌ Сначала запустите эмуляцию сотрудника"
 
         emulated = get_emulated_user(context)
         emulated_iiko_id = emulated.get("iiko_id")
-        try:
-            emulated_iiko_id_int = int(emulated_iiko_id)
-        except (TypeError, ValueError):
-            await update.message.reply_text("❌ Некорректный Iiko ID для эмуляции.")
-            return None, "❌ Некорректный Iiko ID"
+        if not str(emulated_iiko_id).strip().isdigit():
+            return None, "❌ Некорректный Iiko ID для эмуляции."
 
-        db_user = get_user_by_iiko_id(emulated_iiko_id_int)
-        if not db_user:
-            await update.message.reply_text(
-                f"❌ Сотрудник с iiko_id {emulated_iiko_id} не найден в системе."
-            )
-            return None, "❌ Сотрудник не найден"
-        return db_user, None
+        # Сотрудник берется из снимка расписания - без запроса к БД
+        snapshot_user = get_schedule_snapshot().users.get(emulated_iiko_id)
+        if not snapshot_user:
+            return None, f"❌ Сотрудник с iiko_id {emulated_iiko_id} не найден в системе."
+        return snapshot_user, None
 
     user = update.effective_user
 
     if not user.username:
-        await update.message.reply_text(
+        return None, (
             "❌ У вас не установлен username в Telegram.\n\n"
             "Для работы с ботом необходимо:\n"
             "1. Установить username в настройках Telegram\n"
             "2. Сообщить администратору для привязки к вашей учетной записи"
         )
-        return None, "❌ Нет username"
 
-    db_user = get_user_by_username(user.username)
+    db_user = get_user_by_username(user.username, db)
     if not db_user:
-        await update.message.reply_text(
+        return None, (
             f"❌ Пользователь @{user.username} не найден в системе.\n\n"
             "Возможные причины:\n"
             "• Ваш username не привязан к учетной записи\n"
             "• Обратитесь к администратору для добавления"
         )
-        return None, "❌ Пользователь не найден"
 
-    return db_user, None
+    return SnapshotUser(
+        user_id=db_user.id,
+        iiko_id=db_user.iiko_id,
+        name=db_user.name,
+        is_active=db_user.is_active,
+        telegram_username=db_user.telegram_username,
+        telegram_id=db_user.telegram_id
+    ), None
+
+SHIFT_TYPE_NAMES = {
+    'morning': '🌅 Утро',
+    'hybrid': '🌤️ Пересмен', 
+    'evening': '🌆 Вечер'
+}
+
+def _checklist_text(session: dict) -> str:
+    """Текст чек-листа по состоянию сессии"""
+    tasks = session['tasks']
+    completion_count = sum(1 for task in tasks.values() if task['done'])
+    completion_percent = (completion_count / len(tasks)) * 100 if tasks else 0
+    tasks_text = "\n".join(
+        f"{'✅' if task['done'] else '☐'} {task['description']}"
+        for task in tasks.values()
+    )
+    return (
+        f"{session['header_prefix']}📝 Чек-лист смены\n\n"
+        f"📍 Точка: {session['point']}\n"
+        f"🕒 Смена: {SHIFT_TYPE_NAMES.get(session['shift_type'], session['shift_type'])}\n"
+        f"📅 Дата: {session['shift_date'].strftime('%d.%m.%Y')}\n"
+        f"📊 Прогресс: {completion_count}/{len(tasks)} ({completion_percent:.0f}%)\n\n"
+        f"Задания:\n{tasks_text}\n\n"
+        "Нажмите на задачу чтобы отметить выполнение:"
+    )
+
+def _checklist_keyboard(session: dict) -> InlineKeyboardMarkup:
+    """Кнопки задач: в callback_data только id задачи"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            format_task_button(task['description'], task['done']),
+            callback_data=f"checklist_task_{task_id}"
+        )]
+        for task_id, task in session['tasks'].items()
+    ])
+
+def _load_checklist(checklist_user: SnapshotUser,
+                    db: Optional[Session] = None) -> Tuple[Optional[ActiveShift], List[TaskView], Set[int]]:
+    """Текущая смена сотрудника, ее задачи и выполненные задачи (только чтение)"""
+    if not checklist_user.iiko_id:
+        return None, [], set()
+    active_shift = get_current_shift_for_iiko_id(checklist_user.iiko_id)
+    if not active_shift:
+        return None, [], set()
+
+    shift = active_shift.shift
+    tasks = get_tasks_for_shift(checklist_user.user_id, shift.shift_date, shift.shift_type, shift.point, db)
+    if not tasks:
+        return active_shift, [], set()
+    return active_shift, tasks, set(get_completed_tasks_for_shift(shift.shift_date, shift.point, db))
 
-async def _render_checklist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, db_user, header_prefix: str = ""):
-    """Показ чек-листа для указанного пользователя."""
+async def _render_checklist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, checklist_user: SnapshotUser,
+                                 active_shift: Optional[ActiveShift], tasks: List[TaskView], completed_tasks: Set[int],
+                                 header_prefix: str = ""):
+    """Показ чек-листа для указанного пользователя (данные уже загружены _load_checklist)."""
     
-    if not db_user.iiko_id:
+    if not checklist_user.iiko_id:
         await update.message.reply_text(
             "❌ У вашей учетной записи не указан Iiko ID.\n\n"
             "Обратитесь к администратору для настройки."
         )
         return ConversationHandler.END
     
-    # Проверяем текущую смену пользователя
-    shift_info = get_current_shift_for_user(db_user.id)
-    
-    if not shift_info:
+    if not active_shift:
         await update.message.reply_text(
             "❌ Сейчас у вас нет активной смены.\n\n"
             "Чек-лист доступен только во время смены:\n"
@@ -102,171 +154,103 @@ async def _render_checklist_menu(update: Update, context: ContextTypes.DEFAULT_T
         )
         return ConversationHandler.END
     
-    # Получаем задачи для смены
-    tasks = get_tasks_for_shift(
-        db_user.id, 
-        shift_info['shift'].shift_date, 
-        shift_info['shift_type'].shift_type, 
-        shift_info['point']
-    )
-    
+    shift = active_shift.shift
     if not tasks:
         await update.message.reply_text(
-            f"📝 Чек-лист для {shift_info['shift_type'].name}\n\n"
+            f"📝 Чек-лист для {shift.name}\n\n"
             "На эту смену не назначено задач."
         )
         return ConversationHandler.END
     
-    # Получаем выполненные задачи
-    completed_tasks = get_completed_tasks_for_shift(
-        shift_info['shift'].shift_date, 
-        shift_info['point']
-    )
-    
-    # Создаем клавиатуру с задачами
-    keyboard = []
-    for task in tasks:
-        button_text = format_task_button(task.task_description, task.id in completed_tasks)
-        keyboard.append([KeyboardButton(button_text)])
-    
-    keyboard.append([KeyboardButton("🔄 Обновить статус")])
-    keyboard.append([KeyboardButton("⬅️ Назад")])
-    
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    
-    shift_type_names = {
-        'morning': '🌅 Утро',
-        'hybrid': '🌤️ Пересмен', 
-        'evening': '🌆 Вечер'
+    # Сессия чек-листа: только идентификаторы и состояние задач (task_id -> описание и отметка)
+    session = {
+        'user_id': checklist_user.user_id,
+        'shift_date': shift.shift_date,
+        'shift_type': shift.shift_type,
+        'point': shift.point,
+        'header_prefix': header_prefix,
+        'tasks': {
+            task.id: {'description': task.task_description, 'done': task.id in completed_tasks}
+            for task in tasks
+        },
     }
+    context.user_data['checklist'] = session
     
-    completion_count = len([t for t in tasks if t.id in completed_tasks])
-    completion_percent = (completion_count / len(tasks)) * 100 if tasks else 0
-    
-    tasks_text = "\n".join(
-        f"{'✅' if task.id in completed_tasks else '☐'} {task.task_description}"
-        for task in tasks
+    reply_markup = ReplyKeyboardMarkup(
+        [[KeyboardButton("🔄 Обновить статус")], [KeyboardButton("⬅️ Назад")]],
+        resize_keyboard=True
     )
-    
     await update.message.reply_text(
-        f"{header_prefix}📝 Чек-лист смены\n\n"
-        f"📍 Точка: {shift_info['point']}\n"
-        f"🕒 Смена: {shift_type_names.get(shift_info['shift_type'].shift_type, shift_info['shift_type'].shift_type)}\n"
-        f"📅 Дата: {shift_info['shift'].shift_date.strftime('%d.%m.%Y')}\n"
-        f"📊 Прогресс: {completion_count}/{len(tasks)} ({completion_percent:.0f}%)\n\n"
-        f"Задания:\n{tasks_text}\n\n"
-        "Нажмите на задачу чтобы отметить выполнение:",
+        f"📝 Чек-лист: {shift.point}, {shift.shift_date.strftime('%d.%m.%Y')}",
         reply_markup=reply_markup
     )
-    
-    # Сохраняем информацию о смене в контексте
-    context.user_data['current_shift'] = shift_info
-    context.user_data['tasks'] = tasks
-    context.user_data['user_id'] = db_user.id
+    await update.message.reply_text(
+        _checklist_text(session),
+        reply_markup=_checklist_keyboard(session)
+    )
     
     return CHECKLIST_VIEW
 
-async def checklist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Главное меню чек-листа"""
-    db_user, _ = await _resolve_checklist_user(update, context, use_emulation=False)
-    if not db_user:
+async def _show_checklist(update: Update, context: ContextTypes.DEFAULT_TYPE, use_emulation: bool):
+    # Все чтения обновления - в одной сессии; ответы уходят после ее закрытия, без соединения с БД
+    async with unit_of_work() as db:
+        checklist_user, error = _resolve_checklist_user(update, context, use_emulation, db)
+        if checklist_user:
+            active_shift, tasks, completed_tasks = _load_checklist(checklist_user, db)
+
+    if not checklist_user:
+        await update.message.reply_text(error)
         return ConversationHandler.END
 
-    return await _render_checklist_menu(update, context, db_user)
+    header_prefix = f"🔁 Эмуляция: {checklist_user.name}\n\n" if use_emulation else ""
+    return await _render_checklist_menu(update, context, checklist_user, active_shift, tasks, completed_tasks,
+                                        header_prefix=header_prefix)
+
+async def checklist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Главное меню чек-листа"""
+    return await _show_checklist(update, context, use_emulation=False)
 
 async def checklist_menu_emulated(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Чек-лист от лица эмулированного сотрудника"""
-    db_user, _ = await _resolve_checklist_user(update, context, use_emulation=True)
-    if not db_user:
-        return ConversationHandler.END
-
-    header_prefix = f"🔁 Эмуляция: {db_user.name}\n\n"
-    return await _render_checklist_menu(update, context, db_user, header_prefix=header_prefix)
+    return await _show_checklist(update, context, use_emulation=True)
 
 async def handle_task_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка отметки выполнения задачи"""
-    user = update.effective_user
-    button_text = update.message.text
+    query = update.callback_query
     
-    # Получаем user_id из контекста
-    user_id = context.user_data.get('user_id')
-    if not user_id:
-        await update.message.reply_text("❌ Сессия устарела, начните заново")
-        return await checklist_menu(update, context)
-    
-    # Извлекаем ID задачи из текста кнопки (ищем задачу по описанию)
-    if not button_text.startswith(("✅", "☐")):
-        await update.message.reply_text("❌ Неизвестное действие")
+    session = context.user_data.get('checklist')
+    task_id = int(query.data.replace("checklist_task_", ""))
+    task = session['tasks'].get(task_id) if session else None
+    if not task:
+        await query.answer("❌ Сессия устарела, нажмите «🔄 Обновить статус»", show_alert=True)
         return CHECKLIST_VIEW
     
-    # Убираем эмодзи и пробел из начала
-    task_description = button_text[2:]  # Убираем "☐ " или "✅ "
-    task_prefix = task_description[:BUTTON_TASK_PREFIX_LENGTH]
-    
-    # Ищем задачу в сохраненном списке
-    tasks = context.user_data.get('tasks', [])
-    task_to_mark = None
-    for task in tasks:
-        if get_task_prefix(task.task_description) == task_prefix:
-            task_to_mark = task
-            break
+    # Одна запись в БД, состояние остальных задач не перечитываем
+    completion_state = set_task_completion(
+        session['user_id'],
+        task_id,
+        session['shift_date'],
+        session['shift_type'],
+        session['point'],
+        completed=not task['done']
+    )
     
-    if not task_to_mark:
-        await update.message.reply_text("❌ Задача не найдена")
+    if completion_state is None:
+        await query.answer("❌ Ошибка при отметке задачи", show_alert=True)
         return CHECKLIST_VIEW
     
-    shift_info = context.user_data.get('current_shift')
-    if not shift_info:
-        await update.message.reply_text("❌ Информация о смене устарела")
-        return await checklist_menu(update, context)
-    
-    # Переключаем задачу
-    completion_state = toggle_task_completion(
-        user_id,
-        task_to_mark.id,
-        shift_info['shift'].shift_date,
-        shift_info['shift_type'].shift_type,
-        shift_info['point']
+    task['done'] = completion_state
+    await query.answer("✅ Задача отмечена как выполненная" if completion_state else "↩️ Отметка снята")
+    await query.edit_message_text(
+        _checklist_text(session),
+        reply_markup=_checklist_keyboard(session)
     )
     
-    if completion_state is not None:
-        action_text = "✅ Задача отмечена как выполненная" if completion_state else "↩️ Отметка снята"
-        await update.message.reply_text(
-            f"{action_text}: {task_to_mark.task_description}"
-        )
-        
-        # Обновляем клавиатуру
-        tasks = get_tasks_for_shift(
-            user_id, 
-            shift_info['shift'].shift_date, 
-            shift_info['shift_type'].shift_type, 
-            shift_info['point']
-        )
-        completed_tasks = get_completed_tasks_for_shift(shift_info['shift'].shift_date, shift_info['point'])
-        
-        keyboard = []
-        for task in tasks:
-            button_text = format_task_button(task.task_description, task.id in completed_tasks)
-            keyboard.append([KeyboardButton(button_text)])
-        
-        keyboard.append([KeyboardButton("🔄 Обновить статус")])
-        keyboard.append([KeyboardButton("⬅️ Назад")])
-        
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        
-        completion_count = len([t for t in tasks if t.id in completed_tasks])
-        completion_percent = (completion_count / len(tasks)) * 100 if tasks else 0
-        
-        await update.message.reply_text(
-            f"📊 Прогресс обновлен: {completion_count}/{len(tasks)} ({completion_percent:.0f}%)",
-            reply_markup=reply_markup
-        )
-        
-        # Обновляем задачи в контексте
-        context.user_data['tasks'] = tasks
-    else:
-        await update.message.reply_text("❌ Ошибка при отметке задачи")
-    
+    return CHECKLIST_VIEW
+
+async def handle_unknown_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Текст вместо нажатия на кнопку задачи"""
+    await update.message.reply_text("❌ Неизвестное действие. Нажмите на задачу в списке чек-листа.")
     return CHECKLIST_VIEW
 
 async def refresh_checklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -284,7 +268,8 @@ def get_checklist_conversation_handler():
             CHECKLIST_VIEW: [
                 MessageHandler(filters.Regex("^🔄 Обновить статус$"), refresh_checklist),
                 MessageHandler(filters.Regex("^⬅️ Назад$"), cancel_conversation),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_task_action),
+                CallbackQueryHandler(handle_task_action, pattern="^checklist_task_"),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_unknown_action),
             ],
         },
         fallbacks=[
@@ -292,5 +277,7 @@ def get_checklist_conversation_handler():
             CommandHandler("start", start_cancel_conversation),
             MessageHandler(filters.Regex("^❌ Отмена$"), cancel_conversation),
         ],
-        allow_reentry=True
+        allow_reentry=True,
+        name="checklist_conversation",
+        persistent=True
     )
@@ -9,11 +9,16 @@ from bot.database.checklist_operations import (
 )
 from bot.database.checklist_stats_operations import (
     get_individual_stats, get_point_stats, get_task_stats, get_detailed_log,
-    get_weekday_name, format_stats_period
+    render_individual_stats, render_point_stats, render_task_stats, render_detailed_log,
+    format_stats_period
 )
+from bot.utils.report_sender import send_report
+from bot.utils.charts import render_chart, render_completion_heatmap
 from bot.keyboards.menus import get_main_menu
 from .checklist_management import checklist_management_start
 from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -228,29 +233,36 @@ async def select_stats_point(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return await checklist_stats_menu(update, context)
     
-    response = f"📋 Детальный лог выполнения\n\n"
-    response += f"📍 Точка: {point}\n"
-    response += f"📅 Дата: {target_date.strftime('%d.%m.%Y')}\n\n"
-    
-    for task_log in detailed_log:
-        status = "✅" if task_log['completed'] else "❌"
-        response += f"{status} {task_log['task_description']}\n"
-        
-        if task_log['completed']:
-            for completion in task_log['completions']:
-                response += f"   👤 {completion['completed_by']} в {completion['completed_at']}\n"
-        response += "\n"
-    
-    # Разбиваем сообщение если оно слишком длинное
-    if len(response) > 4000:
-        parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-        for part in parts:
-            await update.message.reply_text(part)
-    else:
-        await update.message.reply_text(response)
+    # Отчет уходит частями по границам строк
+    await send_report(update.message, render_detailed_log(detailed_log, target_date, point))
     
     return await checklist_stats_menu(update, context)
 
+def _completion_cells(stats: List[Dict]) -> Dict[Tuple[str, int], float]:
+    """Средний % выполнения (точка, день недели) по всем типам смен, взвешенный по числу смен"""
+    cells = {}
+    for stat in stats:
+        weighted = sum(stat[f'{shift_type}_avg_completion'] * stat[f'{shift_type}_shift_count']
+                       for shift_type in ('morning', 'evening', 'hybrid'))
+        count = sum(stat[f'{shift_type}_shift_count'] for shift_type in ('morning', 'evening', 'hybrid'))
+        if count:
+            cells[(stat['point'], stat['weekday'])] = round(weighted / count, 1)
+    return cells
+
+async def send_point_heatmap(update: Update, stats: List[Dict], start_date: date, end_date: date, period_text: str):
+    """Тепловая карта выполнения: день недели × точка (stats - уже загруженная get_point_stats)"""
+    cells = _completion_cells(stats)
+    if not cells:
+        return
+    points = sorted({point for point, _ in cells})
+    try:
+        png = await render_chart(('point_heatmap', start_date, end_date), render_completion_heatmap,
+                                 f"Выполнение чек-листов, {period_text}", points, cells)
+    except Exception as e:
+        logger.error(f"❌ Не удалось нарисовать тепловую карту: {e}")
+        return
+    await update.message.reply_photo(png, caption=f"📍 Выполнение чек-листов по дням недели, {period_text}")
+
 async def generate_stats_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Генерация отчета статистики"""
     stats_type = context.user_data.get('stats_type')
@@ -264,66 +276,21 @@ async def generate_stats_report(update: Update, context: ContextTypes.DEFAULT_TY
     period_text = format_stats_period(start_date, end_date)
     
     if stats_type == 'individual':
-        stats_data = get_individual_stats(start_date, end_date)
-        response = f"👤 Индивидуальная статистика\n\nПериод: {period_text}\n\n"
-        
-        # Группируем по пользователям
-        user_stats = {}
-        for stat in stats_data:
-            if stat['user_name'] not in user_stats:
-                user_stats[stat['user_name']] = []
-            user_stats[stat['user_name']].append(stat)
-        
-        for user_name, user_data in user_stats.items():
-            response += f"👤 {user_name}:\n"
-            for stat in user_data:
-                weekday_name = get_weekday_name(stat['weekday'])
-                response += f"   {weekday_name}: {stat['completed_tasks']}/{stat['total_tasks']} ({stat['completion_percent']}%)\n"
-            response += "\n"
-    
+        stats = await asyncio.to_thread(get_individual_stats, start_date, end_date)
+        lines = render_individual_stats(stats, period_text)
     elif stats_type == 'point':
-        stats_data = get_point_stats(start_date, end_date)
-        response = f"📍 Статистика по точкам\n\nПериод: {period_text}\n\n"
-        
-        # Группируем по точкам
-        point_stats = {}
-        for stat in stats_data:
-            if stat['point'] not in point_stats:
-                point_stats[stat['point']] = []
-            point_stats[stat['point']].append(stat)
-        
-        for point_name, point_data in point_stats.items():
-            response += f"📍 {point_name}:\n"
-            for stat in point_data:
-                weekday_name = get_weekday_name(stat['weekday'])
-                response += f"   {weekday_name}:\n"
-                response += f"     🌅 Утро: {stat['morning_avg_completion']}% ({stat['morning_shift_count']} смен)\n"
-                response += f"     🌆 Вечер: {stat['evening_avg_completion']}% ({stat['evening_shift_count']} смен)\n"
-                if stat['hybrid_shift_count'] > 0:
-                    response += f"     🔄 Пересмен: {stat['hybrid_avg_completion']}% ({stat['hybrid_shift_count']} смен)\n"
-            response += "\n"
-    
+        stats = await asyncio.to_thread(get_point_stats, start_date, end_date)
+        await send_point_heatmap(update, stats, start_date, end_date, period_text)
+        lines = render_point_stats(stats, period_text)
     elif stats_type == 'task':
-        stats_data = get_task_stats(start_date, end_date)
-        response = f"📝 Статистика по заданиям\n\nПериод: {period_text}\n\n"
-        
-        for stat in stats_data:
-            weekday_name = get_weekday_name(stat['day_of_week'])
-            response += f"📍 {stat['point']} | {weekday_name} | {stat['shift_type']}\n"
-            response += f"   {stat['task_description']}\n"
-            response += f"   Выполнено: {stat['completed_shifts']}/{stat['total_shifts']} ({stat['completion_percent']}%)\n\n"
-    
+        stats = await asyncio.to_thread(get_task_stats, start_date, end_date)
+        lines = render_task_stats(stats, period_text)
     else:
         await update.message.reply_text("❌ Неизвестный тип статистики")
         return await checklist_stats_menu(update, context)
     
-    # Разбиваем сообщение если оно слишком длинное
-    if len(response) > 4000:
-        parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-        for part in parts:
-            await update.message.reply_text(part)
-    else:
-        await update.message.reply_text(response)
+    # Строки уже посчитаны в потоке, сессия БД закрыта до отправки
+    await send_report(update.message, lines)
     
     return await checklist_stats_menu(update, context)
 
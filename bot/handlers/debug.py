@@ -2,6 +2,7 @@ import sqlite3
 import os
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
+from bot.utils.report_sender import send_report
 
 def get_recent_reviews(limit=10):
     """Получение последних записей из базы данных"""
@@ -29,6 +30,52 @@ def get_reviews_count():
     conn.close()
     return count
 
+def _render_reviews(reviews, total_count):
+    """Строки отчета /show_db по последним записям"""
+    yield f"📊 Всего записей в базе: {total_count}"
+    yield ""
+    yield "Последние 5 записей:"
+    yield ""
+    
+    for review in reviews:
+        (id, respondent, barista, point, category, drink_type, 
+         balance, bouquet, body, aftertaste, foam, latte_art, 
+         photo_file_id, comment, created_at) = review
+        
+        yield f"🆔 ID: {id}"
+        yield f"👤 Наставник: {respondent}"
+        yield f"☕ Бариста: {barista}"
+        yield f"🏪 Точка: {point}"
+        yield f"📋 Категория: {category}"
+        
+        if drink_type:
+            yield f"🍵 Напиток: {drink_type}"
+        
+        # Показываем оценки в зависимости от категории
+        if category == "Эспрессо/Фильтр":
+            if balance: yield f"⚖️ Баланс: {balance}/5"
+            if bouquet: yield f"🌿 Букет: {bouquet}/5"
+            if body: yield f"🏋️ Тело: {body}/5"
+            if aftertaste: yield f"🎭 Послевкусие: {aftertaste}/5"
+        else:  # Молочный напиток
+            if balance: yield f"⚖️ Баланс: {balance}/5"
+            if bouquet: yield f"🌿 Букет: {bouquet}/5"
+            if foam: yield f"🥛 Пена: {foam}/5"
+            if latte_art: yield f"🎨 Латте-арт: {latte_art}/5"
+        
+        # Информация о фото
+        if photo_file_id:
+            yield f"📷 Фото: есть (file_id: {photo_file_id[:20]}...)"
+        else:
+            yield "📷 Фото: нет"
+        
+        if comment and comment != '-':
+            yield f"💬 Комментарий: {comment}"
+        
+        yield f"🕐 Дата: {created_at}"
+        yield "─" * 30
+        yield ""
+
 async def show_db_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /show_db для отладки - показывает последние записи"""
     try:
@@ -40,54 +87,8 @@ async def show_db_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("📭 База данных пуста")
             return
         
-        response = f"📊 Всего записей в базе: {total_count}\n\n"
-        response += "Последние 5 записей:\n\n"
-        
-        for review in reviews:
-            (id, respondent, barista, point, category, drink_type, 
-             balance, bouquet, body, aftertaste, foam, latte_art, 
-             photo_file_id, comment, created_at) = review
-            
-            response += f"🆔 ID: {id}\n"
-            response += f"👤 Наставник: {respondent}\n"
-            response += f"☕ Бариста: {barista}\n"
-            response += f"🏪 Точка: {point}\n"
-            response += f"📋 Категория: {category}\n"
-            
-            if drink_type:
-                response += f"🍵 Напиток: {drink_type}\n"
-            
-            # Показываем оценки в зависимости от категории
-            if category == "Эспрессо/Фильтр":
-                if balance: response += f"⚖️ Баланс: {balance}/5\n"
-                if bouquet: response += f"🌿 Букет: {bouquet}/5\n"
-                if body: response += f"🏋️ Тело: {body}/5\n"
-                if aftertaste: response += f"🎭 Послевкусие: {aftertaste}/5\n"
-            else:  # Молочный напиток
-                if balance: response += f"⚖️ Баланс: {balance}/5\n"
-                if bouquet: response += f"🌿 Букет: {bouquet}/5\n"
-                if foam: response += f"🥛 Пена: {foam}/5\n"
-                if latte_art: response += f"🎨 Латте-арт: {latte_art}/5\n"
-            
-            # Информация о фото
-            if photo_file_id:
-                response += f"📷 Фото: есть (file_id: {photo_file_id[:20]}...)\n"
-            else:
-                response += "📷 Фото: нет\n"
-            
-            if comment and comment != '-':
-                response += f"💬 Комментарий: {comment}\n"
-            
-            response += f"🕐 Дата: {created_at}\n"
-            response += "─" * 30 + "\n\n"
-        
-        # Если сообщение слишком длинное, разбиваем на части
-        if len(response) > 4000:
-            parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-            for part in parts:
-                await update.message.reply_text(part)
-        else:
-            await update.message.reply_text(response)
+        # Отчет уходит частями по границам строк
+        await send_report(update.message, _render_reviews(reviews, total_count))
             
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка при чтении базы данных: {str(e)}")
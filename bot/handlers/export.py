@@ -0,0 +1,79 @@
+"""Команда /export - выгрузка сырых данных за период файлом (для старших и наставников)"""
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from bot.utils.auth import require_roles, ROLE_MENTOR, ROLE_SENIOR
+from bot.database.export import build_export, xlsx_available
+from datetime import date, datetime, timedelta
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Период по умолчанию - последние 30 дней
+DEFAULT_EXPORT_DAYS = 30
+# Лимит Telegram на файл, отправляемый ботом
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+
+USAGE_TEXT = (
+    "📤 Выгрузка оценок, чек-листов и расписания\n\n"
+    "/export - за последние 30 дней (CSV в zip)\n"
+    "/export 2024-01-01 2024-01-31 - за период\n"
+    "/export 2024-01-01 2024-01-31 xlsx - в Excel"
+)
+
+@require_roles([ROLE_SENIOR, ROLE_MENTOR])
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /export [начало конец] [csv|xlsx]"""
+    args = list(context.args or [])
+    file_format = "csv"
+    if args and args[-1].lower() in ("csv", "xlsx"):
+        file_format = args.pop().lower()
+
+    try:
+        if len(args) == 2:
+            start_date = datetime.strptime(args[0], '%Y-%m-%d').date()
+            end_date = datetime.strptime(args[1], '%Y-%m-%d').date()
+        elif not args:
+            end_date = date.today()
+            start_date = end_date - timedelta(days=DEFAULT_EXPORT_DAYS)
+        else:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(USAGE_TEXT)
+        return
+
+    if start_date > end_date:
+        await update.message.reply_text("❌ Дата начала позже даты окончания.")
+        return
+
+    if file_format == "xlsx" and not xlsx_available():
+        await update.message.reply_text("⚠️ Excel недоступен на сервере (нет openpyxl), выгружаю CSV.")
+        file_format = "csv"
+
+    await update.message.reply_text(f"⏳ Готовлю выгрузку за {start_date} - {end_date}...")
+
+    try:
+        path, rows_written = await asyncio.to_thread(build_export, start_date, end_date, file_format)
+    except Exception as e:
+        logger.error(f"❌ Ошибка выгрузки: {e}")
+        await update.message.reply_text("❌ Не удалось подготовить выгрузку.")
+        return
+
+    try:
+        if path.stat().st_size > MAX_DOCUMENT_BYTES:
+            await update.message.reply_text("❌ Файл больше 50 МБ. Выберите период поменьше.")
+            return
+
+        suffix = "xlsx" if file_format == "xlsx" else "zip"
+        with path.open("rb") as document:
+            await update.message.reply_document(
+                document=document,
+                filename=f"coffee_export_{start_date}_{end_date}.{suffix}",
+                caption=f"📤 Выгрузка за {start_date} - {end_date}: {rows_written} строк"
+            )
+    finally:
+        path.unlink(missing_ok=True)
+
+def get_export_handlers():
+    """Обработчики выгрузки"""
+    return [CommandHandler("export", export_command)]
@@ -0,0 +1,215 @@
+"""Фото оценок (латте-арт): альбом по страницам и галерея по фильтрам, по 10 фото одной медиагруппой"""
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, Bot
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+from bot.utils.auth import require_roles, is_senior_or_mentor, ROLE_MENTOR, ROLE_SENIOR
+from bot.utils.photo_cache import thumbnail_cache
+from bot.utils.rate_limiter import PRIORITY_BULK
+from bot.database.photo_operations import (
+    PhotoFilter, count_review_photos, get_review_photos, get_baristas_with_photos, get_photo_points
+)
+from datetime import date, datetime, timedelta
+from typing import List, Sequence
+import asyncio
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Telegram: в медиагруппе от 2 до 10 фото
+ALBUM_PAGE_SIZE = 10
+# Галерея за раз: больше - листать через /album или сузить фильтр
+GALLERY_MAX_PHOTOS = 100
+GALLERY_DEFAULT_DAYS = 30
+
+DATE_ARG = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+GALLERY_USAGE_TEXT = (
+    "🖼 Галерея фото оценок\n\n"
+    "/gallery [бариста] [точка] [ГГГГ-ММ-ДД ГГГГ-ММ-ДД]\n"
+    "Без дат - за последние 30 дней.\n\n"
+    "Например: /gallery Анна ДЕ 2024-01-01 2024-01-31"
+)
+
+def _photo_caption(photo) -> str:
+    created = photo.created_at.strftime('%d.%m.%Y') if photo.created_at else ''
+    return f"#{photo.review_id} {photo.barista_name}, {photo.point} {created}".strip()
+
+def _filter_to_data(photo_filter: PhotoFilter) -> dict:
+    """Фильтр в user_data: только строки, чтобы пережить сохранение состояния"""
+    return {
+        'barista': photo_filter.barista,
+        'point': photo_filter.point,
+        'start_date': photo_filter.start_date.isoformat() if photo_filter.start_date else None,
+        'end_date': photo_filter.end_date.isoformat() if photo_filter.end_date else None,
+    }
+
+def _filter_from_data(data: dict) -> PhotoFilter:
+    return PhotoFilter(
+        barista=data.get('barista'),
+        point=data.get('point'),
+        start_date=date.fromisoformat(data['start_date']) if data.get('start_date') else None,
+        end_date=date.fromisoformat(data['end_date']) if data.get('end_date') else None,
+    )
+
+async def send_photo_group(bot: Bot, chat_id: int, photos: List, **kwargs) -> None:
+    """Отправить до 10 фото одним сообщением-медиагруппой (одно фото - обычным сообщением).
+
+    Если file_id не принимаются (например, сменился токен бота), отправляются локальные миниатюры из кэша.
+    """
+    try:
+        if len(photos) == 1:
+            await bot.send_photo(chat_id, photos[0].thumb_file_id or photos[0].file_id,
+                                 caption=_photo_caption(photos[0]), **kwargs)
+        else:
+            await bot.send_media_group(chat_id, [
+                InputMediaPhoto(photo.thumb_file_id or photo.file_id, caption=_photo_caption(photo))
+                for photo in photos
+            ], **kwargs)
+    except BadRequest as e:
+        cached = [(photo, thumbnail_cache.get(photo.file_unique_id)) for photo in photos if photo.file_unique_id]
+        cached = [(photo, path) for photo, path in cached if path is not None]
+        if not cached:
+            raise
+        logger.warning(f"⚠️ Telegram не принял file_id ({e}), отправляем {len(cached)} миниатюр из кэша")
+        media = [InputMediaPhoto(path.read_bytes(), caption=_photo_caption(photo)) for photo, path in cached]
+        if len(media) == 1:
+            await bot.send_photo(chat_id, media[0].media, caption=media[0].caption, **kwargs)
+        else:
+            await bot.send_media_group(chat_id, media, **kwargs)
+
+def _album_keyboard(offset: int, total: int) -> InlineKeyboardMarkup:
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"album_page_{max(offset - ALBUM_PAGE_SIZE, 0)}"))
+    if offset + ALBUM_PAGE_SIZE < total:
+        buttons.append(InlineKeyboardButton("Старее ➡️", callback_data=f"album_page_{offset + ALBUM_PAGE_SIZE}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def send_album_page(update: Update, context: ContextTypes.DEFAULT_TYPE, offset: int):
+    """Страница альбома по фильтру из user_data['album']"""
+    photo_filter = _filter_from_data(context.user_data.get('album', {}))
+    chat_id = update.effective_chat.id
+
+    total, photos = await asyncio.gather(
+        asyncio.to_thread(count_review_photos, photo_filter),
+        asyncio.to_thread(get_review_photos, photo_filter, offset, ALBUM_PAGE_SIZE)
+    )
+    if not photos:
+        await context.bot.send_message(chat_id, "📭 Фото не найдено.")
+        return
+
+    await send_photo_group(context.bot, chat_id, photos)
+    title = photo_filter.barista or "все бариста"
+    await context.bot.send_message(
+        chat_id,
+        f"🖼 {title}: {offset + 1}-{offset + len(photos)} из {total}",
+        reply_markup=_album_keyboard(offset, total)
+    )
+
+    # Лениво докачиваем миниатюры просмотренной страницы, не задерживая ответ
+    if thumbnail_cache.enabled:
+        context.application.create_task(thumbnail_cache.warm(context.bot, photos))
+
+@require_roles([ROLE_SENIOR, ROLE_MENTOR])
+async def album_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /album [бариста] - альбом фото оценок"""
+    if context.args:
+        context.user_data['album'] = _filter_to_data(PhotoFilter(barista=" ".join(context.args)))
+        await send_album_page(update, context, 0)
+        return
+
+    baristas = await asyncio.to_thread(get_baristas_with_photos)
+    if not baristas:
+        await update.message.reply_text("📭 Фото в оценках пока нет.")
+        return
+
+    # В callback_data только номер: имя может не влезть в 64 байта
+    context.user_data['album_baristas'] = [name for name, _ in baristas]
+    keyboard = [
+        [InlineKeyboardButton(f"{name} ({count})", callback_data=f"album_barista_{index}")]
+        for index, (name, count) in enumerate(baristas)
+    ]
+    await update.message.reply_text("🖼 Чей альбом показать?", reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def handle_album_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор бариста и листание страниц альбома"""
+    query = update.callback_query
+    await query.answer()
+    if not is_senior_or_mentor(update):
+        return
+
+    if query.data.startswith("album_barista_"):
+        baristas = context.user_data.get('album_baristas', [])
+        index = int(query.data[len("album_barista_"):])
+        if index >= len(baristas):
+            await query.edit_message_text("⚠️ Список устарел, откройте /album заново.")
+            return
+        context.user_data['album'] = _filter_to_data(PhotoFilter(barista=baristas[index]))
+        await send_album_page(update, context, 0)
+    else:
+        await query.edit_message_reply_markup(reply_markup=None)
+        await send_album_page(update, context, int(query.data[len("album_page_"):]))
+
+def parse_gallery_args(args: Sequence[str], points: Sequence[str], today: date) -> PhotoFilter:
+    """Фильтр галереи из аргументов: даты, точка из известных, остальное - имя бариста"""
+    dates = [datetime.strptime(arg, '%Y-%m-%d').date() for arg in args if DATE_ARG.match(arg)]
+    if len(dates) not in (0, 2):
+        raise ValueError("Нужны две даты: начало и конец")
+    rest = [arg for arg in args if not DATE_ARG.match(arg)]
+    point = next((arg for arg in rest if arg in points), None)
+    barista = " ".join(arg for arg in rest if arg != point) or None
+
+    start_date, end_date = dates if dates else (today - timedelta(days=GALLERY_DEFAULT_DAYS), today)
+    if start_date > end_date:
+        raise ValueError("Дата начала позже даты окончания")
+    return PhotoFilter(barista=barista, point=point, start_date=start_date, end_date=end_date)
+
+@require_roles([ROLE_SENIOR, ROLE_MENTOR])
+async def gallery_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /gallery [бариста] [точка] [начало конец] - все фото под фильтром пачками по 10"""
+    points = await asyncio.to_thread(get_photo_points)
+    try:
+        photo_filter = parse_gallery_args(context.args or [], points, date.today())
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}\n\n{GALLERY_USAGE_TEXT}")
+        return
+
+    # Один запрос по индексу; +1 - чтобы понять, что под фильтр попало больше лимита
+    photos = await asyncio.to_thread(get_review_photos, photo_filter, 0, GALLERY_MAX_PHOTOS + 1)
+    description = ", ".join(filter(None, [
+        photo_filter.barista, photo_filter.point,
+        f"{photo_filter.start_date.strftime('%d.%m.%Y')} - {photo_filter.end_date.strftime('%d.%m.%Y')}"
+    ]))
+    if not photos:
+        await update.message.reply_text(f"📭 Фото не найдено ({description}).")
+        return
+
+    truncated = len(photos) > GALLERY_MAX_PHOTOS
+    photos = photos[:GALLERY_MAX_PHOTOS]
+    await update.message.reply_text(
+        f"🖼 {description}: {len(photos)} фото"
+        + (f" (показаны последние {GALLERY_MAX_PHOTOS}, сузьте фильтр или листайте /album)" if truncated else "")
+    )
+
+    # Рассылка в фоне: обновления обрабатываются по одному, и ~10 с отправки задержали бы всех остальных
+    context.application.create_task(
+        _send_gallery_batches(context, update.effective_chat.id, photos), update=update
+    )
+
+async def _send_gallery_batches(context: ContextTypes.DEFAULT_TYPE, chat_id: int, photos: List):
+    """Фото галереи пачками: в ограничителе отправки идут после интерактивных ответов"""
+    for start in range(0, len(photos), ALBUM_PAGE_SIZE):
+        await send_photo_group(context.bot, chat_id, photos[start:start + ALBUM_PAGE_SIZE],
+                               rate_limit_args=PRIORITY_BULK)
+
+    if thumbnail_cache.enabled:
+        context.application.create_task(thumbnail_cache.warm(context.bot, photos))
+
+def get_gallery_handlers():
+    """Обработчики альбома и галереи фото"""
+    return [
+        CommandHandler("album", album_command),
+        CommandHandler("gallery", gallery_command),
+        CallbackQueryHandler(handle_album_callback, pattern="^album_(barista|page)_"),
+    ]
@@ -19,6 +19,9 @@ rating_keyboard.append([BACK_BUTTON])
 rating_keyboard.append(["❌ Отмена"])
 rating_markup = ReplyKeyboardMarkup(rating_keyboard, resize_keyboard=True)
 
+# Метаданные фото для индекса review_photos (кроме самого photo_file_id)
+PHOTO_DATA_KEYS = ('photo_unique_id', 'photo_thumb_file_id', 'photo_size', 'photo_width', 'photo_height')
+
 def _get_points_from_db():
     shift_types = get_shift_types()
     points = sorted({shift_type.point for shift_type in shift_types if shift_type.point})
@@ -525,15 +528,22 @@ async def select_milk_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await prompt_milk_latte_art(update, context)
     
     if update.message.text == "-":
+        for key in PHOTO_DATA_KEYS:
+            context.user_data.pop(key, None)
         context.user_data['photo_file_id'] = None
         return await prompt_milk_comment(update, context)
     elif update.message.photo:
         try:
             # Получаем file_id самого большого фото (последний элемент в списке)
-            photo_file_id = update.message.photo[-1].file_id
+            largest = update.message.photo[-1]
             
-            # Сохраняем file_id
-            context.user_data['photo_file_id'] = photo_file_id
+            # Сохраняем file_id и метаданные для индекса фото (самый маленький размер - миниатюра)
+            context.user_data['photo_file_id'] = largest.file_id
+            context.user_data['photo_unique_id'] = largest.file_unique_id
+            context.user_data['photo_thumb_file_id'] = update.message.photo[0].file_id
+            context.user_data['photo_size'] = largest.file_size
+            context.user_data['photo_width'] = largest.width
+            context.user_data['photo_height'] = largest.height
             
             return await prompt_milk_comment(update, context, with_success=True)
             
@@ -588,6 +598,7 @@ async def save_review_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'foam': data.get('foam'),
         'latte_art': data.get('latte_art'),
         'photo_file_id': data.get('photo_file_id'),  # 🆕 Сохраняем file_id вместо пути
+        **{key: data.get(key) for key in PHOTO_DATA_KEYS},
         'comment': data.get('comment', '-')
     }
     
@@ -675,5 +686,7 @@ def get_review_conversation_handler():
             CommandHandler("start", start_cancel_conversation),
             MessageHandler(filters.Regex("^❌ Отмена$"), cancel_conversation),
         ],
-        allow_reentry=True
+        allow_reentry=True,
+        name="review_conversation",
+        persistent=True
     )
@@ -2,11 +2,12 @@
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
 from bot.utils.common_handlers import cancel_conversation, start_cancel_conversation
-from bot.database.user_operations import get_user_by_telegram_id, get_all_users
+from bot.database.user_operations import get_user_by_telegram_id
 from bot.database.schedule_operations import (
     get_upcoming_shifts_by_iiko_id, update_shift_iiko_id, get_shift_by_id,
-    get_shifts_by_iiko_id, create_shift, update_shift
+    create_shift, update_shift
 )
+from bot.database.swap_candidates import build_swap_planner
 from bot.utils.emulation import get_current_iiko_id, get_current_user_name, is_emulation_mode 
 from bot.keyboards.menus import get_main_menu
 import logging
@@ -158,31 +159,30 @@ async def handle_swap_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             await query.edit_message_text("❌ Ошибка: смена не найдена")
             return ConversationHandler.END
         
-        # Получаем список всех активных пользователей (исключая текущего)     
-        users = get_all_users(active_only=True)
-        users_with_iiko = [u for u in users if u.iiko_id and str(u.iiko_id) != current_iiko_id]
+        # Одно чтение окна расписания: кто свободен и с кем возможен обмен без конфликтов
+        planner = build_swap_planner(shift_id, current_iiko_id)
+        candidates = planner.candidates() if planner else []
         
-        if not users_with_iiko:
+        if not any(candidate.has_options for candidate in candidates):
             await query.edit_message_text("❌ Нет доступных сотрудников для замены")
             return ConversationHandler.END
         
-        # Формируем список сотрудников
+        # Формируем список сотрудников: сначала те, кто может взять смену
         keyboard = []
         text = f"👥 Выберите сотрудника для замены на {shift.shift_date.strftime('%d.%m.%Y')}:\n\n"
         
-        for user in users_with_iiko:
-            # Проверяем, есть ли у сотрудника смена в этот день
-            user_shifts = get_shifts_by_iiko_id(str(user.iiko_id), 
-                                              start_date=shift.shift_date, 
-                                              end_date=shift.shift_date)
-            has_shift = len(user_shifts) > 0
+        for candidate in candidates:
+            if not candidate.has_options:
+                text += f"⛔ {candidate.name} - конфликт смен\n"
+                continue
             
-            status = "🟢" if not has_shift else "🟡"
-            text += f"{status} {user.name} - {'есть смена' if has_shift else 'вых'}\n"
+            status = "🟢" if candidate.is_free else "🟡"
+            day_text = 'вых' if candidate.is_free else 'есть смена'
+            text += f"{status} {candidate.name} - {day_text}, обменов: {len(candidate.exchanges)}\n"
             
             keyboard.append([InlineKeyboardButton(
-                f"{user.name} {'🟡' if has_shift else '🟢'}",
-                callback_data=f"swap_employee_{user.iiko_id}"
+                f"{candidate.name} {status}",
+                callback_data=f"swap_employee_{candidate.iiko_id}"
             )])
         
         keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_conversation")])
@@ -247,25 +247,25 @@ async def handle_employee_selection(update: Update, context: ContextTypes.DEFAUL
             return await cancel_swap(update, context)
         
         from bot.database.user_operations import get_user_by_iiko_id
-        new_employee = get_user_by_iiko_id(int(new_iiko_id))
+        new_employee = get_user_by_iiko_id(new_iiko_id)
         employee_name = new_employee.name if new_employee else new_iiko_id
         
         # Сохраняем данные
         context.user_data['swap_new_iiko_id'] = new_iiko_id
         context.user_data['swap_employee_name'] = employee_name
         
-        # 🎯 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: ВКЛЮЧАЕМ смены в тот же день для прямых замен
-        all_shifts = get_upcoming_shifts_by_iiko_id(str(new_iiko_id), days=60)
-        
-        # НЕ исключаем смены в тот же день - они нужны для прямых замен!
-        shifts_for_swap = all_shifts
+        # Только обмены без пересечений и с отдыхом между сменами у обоих, лучшие - первыми
+        planner = build_swap_planner(shift_id, get_current_iiko_id(update, context))
+        candidate = planner.candidate(new_iiko_id) if planner else None
         
-        logger.info(f"🎯 ДИАГНОСТИКА: Всего смен у сотрудника: {len(all_shifts)}")
-        logger.info(f"🎯 ДИАГНОСТИКА: Доступно смен для обмена (ВКЛЮЧАЯ день замены): {len(shifts_for_swap)}")
+        if not candidate or not candidate.has_options:
+            await query.edit_message_text(
+                f"❌ С {employee_name} нет вариантов замены без конфликта в расписании"
+            )
+            return await cancel_swap(update, context)
         
-        # Логируем все смены сотрудника для диагностики
-        for shift in all_shifts:
-            logger.info(f"🎯 Смена сотрудника: {shift.shift_date} - {shift.shift_type_obj.start_time if shift.shift_type_obj else 'NO_TYPE'}")
+        shifts_for_swap = [option.shift for option in candidate.exchanges]
+        logger.info(f"🎯 Вариантов обмена с {employee_name}: {len(shifts_for_swap)}, может взять смену: {candidate.can_take}")
         
         if not shifts_for_swap:
             # Если нет других смен - предлагаем только одностороннюю замену
@@ -283,7 +283,7 @@ async def handle_employee_selection(update: Update, context: ContextTypes.DEFAUL
             
             await query.edit_message_text(
                 f"🔄 Обмен сменами между {current_user_name}{mode_text} и {employee_name}\n\n"
-                f"У сотрудника нет других смен для обмена.\n"
+                f"У сотрудника нет смен, обмен на которые не создает конфликтов.\n"
                 f"Вы можете сделать одностороннюю замену:",
                 reply_markup=reply_markup
             )
@@ -302,34 +302,32 @@ async def handle_employee_selection(update: Update, context: ContextTypes.DEFAUL
             )
             
             # Добавляем пометку для смены в тот же день
-            for i, shift in enumerate(shifts_for_swap[:10]):  # Ограничиваем 10 сменами
-                if not shift.shift_type_obj:
-                    continue
-                    
+            for i, shift in enumerate(shifts_for_swap[:10]):  # Ограничиваем 10 лучшими вариантами
                 shift_type_names = {
                     'morning': '🌅 Утро',
                     'hybrid': '🌤️ Пересмен', 
                     'evening': '🌆 Вечер'
                 }
-                shift_type_text = shift_type_names.get(shift.shift_type_obj.shift_type, shift.shift_type_obj.shift_type)
+                shift_type_text = shift_type_names.get(shift.shift_type, shift.shift_type)
                 date_str = shift.shift_date.strftime("%d.%m.%Y")
-                start_str = shift.shift_type_obj.start_time.strftime("%H:%M")
-                end_str = shift.shift_type_obj.end_time.strftime("%H:%M")
+                start_str = shift.start_time.strftime("%H:%M")
+                end_str = shift.end_time.strftime("%H:%M")
                 
                 # 🎯 Помечаем смену в тот же день
                 same_day_marker = " 🔄" if shift.shift_date == original_shift.shift_date else ""
                 
-                text += f"{i+1}. {date_str} ({shift_type_text}) {shift.shift_type_obj.point}: {start_str} - {end_str}{same_day_marker}\n"
+                text += f"{i+1}. {date_str} ({shift_type_text}) {shift.point}: {start_str} - {end_str}{same_day_marker}\n"
                 keyboard.append([InlineKeyboardButton(
-                    f"{date_str} {shift.shift_type_obj.point} {start_str}{same_day_marker}",
+                    f"{date_str} {shift.point} {start_str}{same_day_marker}",
                     callback_data=f"swap_return_shift_{shift.shift_id}"
                 )])
             
-            # Добавляем опцию односторонней замены
-            keyboard.append([InlineKeyboardButton(
-                "✅ Односторонняя замена (без получения смены)", 
-                callback_data=f"swap_force_{new_iiko_id}"
-            )])
+            # Односторонняя замена - только если коллега может взять смену без конфликта
+            if candidate.can_take:
+                keyboard.append([InlineKeyboardButton(
+                    "✅ Односторонняя замена (без получения смены)", 
+                    callback_data=f"swap_force_{new_iiko_id}"
+                )])
             keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_conversation")])
             
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -448,7 +446,7 @@ async def confirm_one_way_swap(update: Update, context: ContextTypes.DEFAULT_TYP
     
     original_shift = get_shift_by_id(shift_id)
     from bot.database.user_operations import get_user_by_iiko_id
-    new_employee = get_user_by_iiko_id(int(new_iiko_id))
+    new_employee = get_user_by_iiko_id(new_iiko_id)
     employee_name = new_employee.name if new_employee else new_iiko_id
     
     keyboard = [
@@ -498,6 +496,7 @@ def get_swap_conversation_handler():
         ],
         allow_reentry=True,
         name="swap_conversation",
+        persistent=True,
         per_user=True,
         per_chat=True
     )
@@ -577,7 +576,7 @@ async def execute_one_way_swap(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Получаем имя нового сотрудника
     from bot.database.user_operations import get_user_by_iiko_id
-    new_employee = get_user_by_iiko_id(int(new_iiko_id))
+    new_employee = get_user_by_iiko_id(new_iiko_id)
     employee_name = new_employee.name if new_employee else new_iiko_id
     
     # Сообщаем о результате
@@ -711,8 +710,8 @@ async def execute_two_way_swap(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Получаем имена сотрудников
     from bot.database.user_operations import get_user_by_iiko_id
-    original_employee = get_user_by_iiko_id(int(original_data['iiko_id']))
-    return_employee = get_user_by_iiko_id(int(return_data['iiko_id']))
+    original_employee = get_user_by_iiko_id(original_data['iiko_id'])
+    return_employee = get_user_by_iiko_id(return_data['iiko_id'])
     original_name = original_employee.name if original_employee else original_data['iiko_id']
     return_name = return_employee.name if return_employee else return_data['iiko_id']
     
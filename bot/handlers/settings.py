@@ -15,9 +15,13 @@ from bot.database.checklist_operations import get_hybrid_assignment_tasks
 from bot.utils.google_sheets import get_current_month_name, get_next_month_name, parse_schedule_from_sheet, parse_month_name
 from bot.utils.common_handlers import cancel_conversation, start_cancel_conversation
 from bot.utils.emulation import is_emulation_mode, stop_emulation, start_emulation, get_emulated_user
+from bot.utils.report_sender import send_report
 from bot.keyboards.menus import get_main_menu
-import sqlite3
-import os
+from bot.database.backup import create_backup
+from bot.database.archive import DRINK_REVIEWS, clear_with_archive
+from bot.database.photo_operations import delete_all_review_photos
+from bot.database.score_series import score_series
+import asyncio
 from datetime import datetime, date, timedelta
 import calendar
 import logging
@@ -507,23 +511,17 @@ async def handle_clear_reviews(update: Update, context: ContextTypes.DEFAULT_TYP
     
     if text == 'Y' or text == 'ДА':
         try:
-            # Создаем бэкап
-            backup_filename = f"coffee_quality_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+            # Создаем бэкап (онлайн-снимок в отдельном потоке); без бэкапа не очищаем
+            backup_path = await asyncio.to_thread(create_backup, "before_clear_reviews")
             
-            if os.path.exists('coffee_quality.db'):
-                import shutil
-                shutil.copy2('coffee_quality.db', backup_filename)
-            
-            # Очищаем таблицу
-            conn = sqlite3.connect('coffee_quality.db')
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM drink_reviews")
-            conn.commit()
-            conn.close()
+            # Очищаем таблицу вместе с архивом, иначе старые оценки остались бы в статистике
+            await asyncio.to_thread(clear_with_archive, DRINK_REVIEWS)
+            await asyncio.to_thread(delete_all_review_photos)
+            score_series.reset()
             
             await update.message.reply_text(
                 f"✅ Таблица оценок очищена!\n"
-                f"📦 Бэкап сохранен: {backup_filename}"
+                f"📦 Бэкап сохранен: {backup_path}"
             )
         except Exception as e:
             await update.message.reply_text(f"❌ Ошибка при очистке: {str(e)}")
@@ -1012,7 +1010,7 @@ async def handle_employee_shifts_callback(update: Update, context: ContextTypes.
     
     if query.data.startswith("view_shifts_"):
         iiko_id = query.data.split("_")[2]
-        user = get_user_by_iiko_id(int(iiko_id))
+        user = get_user_by_iiko_id(iiko_id)
         
         if not user:
             await query.edit_message_text("❌ Сотрудник не найден")
@@ -1690,7 +1688,7 @@ async def edit_shift_iiko_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         # Проверяем существование пользователя
         from bot.database.user_operations import get_user_by_iiko_id
-        user = get_user_by_iiko_id(int(new_iiko_id))
+        user = get_user_by_iiko_id(new_iiko_id)
         
         if not user:
             await update.message.reply_text(
@@ -2506,7 +2504,7 @@ async def checklist_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def checklist_stats_individual(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Индивидуальная статистика"""
-    from bot.database.checklist_stats_operations import get_individual_stats, get_weekday_name, format_stats_period
+    from bot.database.checklist_stats_operations import get_individual_stats, render_individual_stats, format_stats_period
     from datetime import date, timedelta
     
     # Статистика за текущую неделю
@@ -2514,9 +2512,9 @@ async def checklist_stats_individual(update: Update, context: ContextTypes.DEFAU
     start_date = today - timedelta(days=today.weekday())
     end_date = start_date + timedelta(days=6)
     
-    stats_data = get_individual_stats(start_date, end_date)
+    stats = await asyncio.to_thread(get_individual_stats, start_date, end_date)
     
-    if not stats_data:
+    if not stats:
         await update.message.reply_text(
             "👤 Индивидуальная статистика\n\n"
             "❌ Нет данных для отображения за текущую неделю."
@@ -2524,21 +2522,6 @@ async def checklist_stats_individual(update: Update, context: ContextTypes.DEFAU
         return await checklist_stats(update, context)
     
     period_text = format_stats_period(start_date, end_date)
-    response = f"👤 Индивидуальная статистика\n\nПериод: {period_text}\n\n"
-    
-    # Группируем по пользователям
-    user_stats = {}
-    for stat in stats_data:
-        if stat['user_name'] not in user_stats:
-            user_stats[stat['user_name']] = []
-        user_stats[stat['user_name']].append(stat)
-    
-    for user_name, user_data in user_stats.items():
-        response += f"👤 {user_name}:\n"
-        for stat in user_data:
-            weekday_name = get_weekday_name(stat['weekday'])
-            response += f"   {weekday_name}: {stat['completed_tasks']}/{stat['total_tasks']} ({stat['completion_percent']}%)\n"
-        response += "\n"
     
     # Добавляем кнопку для других периодов
     keyboard = [
@@ -2547,7 +2530,7 @@ async def checklist_stats_individual(update: Update, context: ContextTypes.DEFAU
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await send_report(update.message, render_individual_stats(stats, period_text), reply_markup=reply_markup)
     
     # Сохраняем тип статистики для использования в обработчиках периода
     context.user_data['stats_type'] = 'individual'
@@ -2556,7 +2539,7 @@ async def checklist_stats_individual(update: Update, context: ContextTypes.DEFAU
 
 async def checklist_stats_point(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Статистика по точкам"""
-    from bot.database.checklist_stats_operations import get_point_stats, get_weekday_name, format_stats_period
+    from bot.database.checklist_stats_operations import get_point_stats, render_point_stats, format_stats_period
     from datetime import date, timedelta
     
     # Статистика за текущую неделю
@@ -2564,9 +2547,9 @@ async def checklist_stats_point(update: Update, context: ContextTypes.DEFAULT_TY
     start_date = today - timedelta(days=today.weekday())
     end_date = start_date + timedelta(days=6)
     
-    stats_data = get_point_stats(start_date, end_date)
+    stats = await asyncio.to_thread(get_point_stats, start_date, end_date)
     
-    if not stats_data:
+    if not stats:
         await update.message.reply_text(
             "📍 Статистика по точкам\n\n"
             "❌ Нет данных для отображения за текущую неделю."
@@ -2574,25 +2557,6 @@ async def checklist_stats_point(update: Update, context: ContextTypes.DEFAULT_TY
         return await checklist_stats(update, context)
     
     period_text = format_stats_period(start_date, end_date)
-    response = f"📍 Статистика по точкам\n\nПериод: {period_text}\n\n"
-    
-    # Группируем по точкам
-    point_stats = {}
-    for stat in stats_data:
-        if stat['point'] not in point_stats:
-            point_stats[stat['point']] = []
-        point_stats[stat['point']].append(stat)
-    
-    for point_name, point_data in point_stats.items():
-        response += f"📍 {point_name}:\n"
-        for stat in point_data:
-            weekday_name = get_weekday_name(stat['weekday'])
-            response += f"   {weekday_name}:\n"
-            response += f"     🌅 Утро: {stat['morning_avg_completion']}% ({stat['morning_shift_count']} смен)\n"
-            response += f"     🌆 Вечер: {stat['evening_avg_completion']}% ({stat['evening_shift_count']} смен)\n"
-            if stat['hybrid_shift_count'] > 0:
-                response += f"     🔄 Пересмен: {stat['hybrid_avg_completion']}% ({stat['hybrid_shift_count']} смен)\n"
-        response += "\n"
     
     keyboard = [
         [KeyboardButton("📅 За неделю"), KeyboardButton("📅 За месяц"), KeyboardButton("📅 Произвольный период")],
@@ -2600,14 +2564,14 @@ async def checklist_stats_point(update: Update, context: ContextTypes.DEFAULT_TY
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await send_report(update.message, render_point_stats(stats, period_text), reply_markup=reply_markup)
     
     context.user_data['stats_type'] = 'point'
     return CHECKLIST_STATS_POINT_PERIOD
 
 async def checklist_stats_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Статистика по заданиям"""
-    from bot.database.checklist_stats_operations import get_task_stats, get_weekday_name, format_stats_period
+    from bot.database.checklist_stats_operations import get_task_stats, render_task_stats, format_stats_period
     from datetime import date, timedelta
     
     # Статистика за текущую неделю
@@ -2615,9 +2579,9 @@ async def checklist_stats_task(update: Update, context: ContextTypes.DEFAULT_TYP
     start_date = today - timedelta(days=today.weekday())
     end_date = start_date + timedelta(days=6)
     
-    stats_data = get_task_stats(start_date, end_date)
+    stats = await asyncio.to_thread(get_task_stats, start_date, end_date)
     
-    if not stats_data:
+    if not stats:
         await update.message.reply_text(
             "📝 Статистика по заданиям\n\n"
             "❌ Нет данных для отображения за текущую неделю."
@@ -2625,16 +2589,6 @@ async def checklist_stats_task(update: Update, context: ContextTypes.DEFAULT_TYP
         return await checklist_stats(update, context)
     
     period_text = format_stats_period(start_date, end_date)
-    response = f"📝 Статистика по заданиям\n\nПериод: {period_text}\n\n"
-    
-    for stat in stats_data[:10]:  # Ограничиваем вывод первыми 10 заданиями
-        weekday_name = get_weekday_name(stat['day_of_week'])
-        response += f"📍 {stat['point']} | {weekday_name} | {stat['shift_type']}\n"
-        response += f"   {stat['task_description']}\n"
-        response += f"   Выполнено: {stat['completed_shifts']}/{stat['total_shifts']} ({stat['completion_percent']}%)\n\n"
-    
-    if len(stats_data) > 10:
-        response += f"... и еще {len(stats_data) - 10} заданий\n\n"
     
     keyboard = [
         [KeyboardButton("📅 За неделю"), KeyboardButton("📅 За месяц"), KeyboardButton("📅 Произвольный период")],
@@ -2642,14 +2596,14 @@ async def checklist_stats_task(update: Update, context: ContextTypes.DEFAULT_TYP
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await send_report(update.message, render_task_stats(stats, period_text, limit=10), reply_markup=reply_markup)
     
     context.user_data['stats_type'] = 'task'
     return CHECKLIST_STATS_TASK_PERIOD
 
 async def handle_individual_stats_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора периода для индивидуальной статистики"""
-    from bot.database.checklist_stats_operations import get_individual_stats, get_weekday_name, format_stats_period
+    from bot.database.checklist_stats_operations import get_individual_stats, render_individual_stats, format_stats_period
     from datetime import date, timedelta
     
     period_text = update.message.text
@@ -2676,9 +2630,9 @@ async def handle_individual_stats_period(update: Update, context: ContextTypes.D
         return CHECKLIST_STATS_INDIVIDUAL
     
     # Показываем отчет
-    stats_data = get_individual_stats(start_date, end_date)
+    stats = await asyncio.to_thread(get_individual_stats, start_date, end_date)
     
-    if not stats_data:
+    if not stats:
         await update.message.reply_text(
             f"👤 Индивидуальная статистика\n\n"
             f"❌ Нет данных для отображения за период: {format_stats_period(start_date, end_date)}."
@@ -2686,21 +2640,6 @@ async def handle_individual_stats_period(update: Update, context: ContextTypes.D
         return await checklist_stats(update, context)
     
     period_text_display = format_stats_period(start_date, end_date)
-    response = f"👤 Индивидуальная статистика\n\nПериод: {period_text_display}\n\n"
-    
-    # Группируем по пользователям
-    user_stats = {}
-    for stat in stats_data:
-        if stat['user_name'] not in user_stats:
-            user_stats[stat['user_name']] = []
-        user_stats[stat['user_name']].append(stat)
-    
-    for user_name, user_data in user_stats.items():
-        response += f"👤 {user_name}:\n"
-        for stat in user_data:
-            weekday_name = get_weekday_name(stat['weekday'])
-            response += f"   {weekday_name}: {stat['completed_tasks']}/{stat['total_tasks']} ({stat['completion_percent']}%)\n"
-        response += "\n"
     
     keyboard = [
         [KeyboardButton("📅 За неделю"), KeyboardButton("📅 За месяц"), KeyboardButton("📅 Произвольный период")],
@@ -2708,12 +2647,12 @@ async def handle_individual_stats_period(update: Update, context: ContextTypes.D
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await send_report(update.message, render_individual_stats(stats, period_text_display), reply_markup=reply_markup)
     return CHECKLIST_STATS_INDIVIDUAL
 
 async def handle_point_stats_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора периода для статистики по точкам"""
-    from bot.database.checklist_stats_operations import get_point_stats, get_weekday_name, format_stats_period
+    from bot.database.checklist_stats_operations import get_point_stats, render_point_stats, format_stats_period
     from datetime import date, timedelta
     
     period_text = update.message.text
@@ -2740,9 +2679,9 @@ async def handle_point_stats_period(update: Update, context: ContextTypes.DEFAUL
         return CHECKLIST_STATS_POINT
     
     # Показываем отчет
-    stats_data = get_point_stats(start_date, end_date)
+    stats = await asyncio.to_thread(get_point_stats, start_date, end_date)
     
-    if not stats_data:
+    if not stats:
         await update.message.reply_text(
             f"📍 Статистика по точкам\n\n"
             f"❌ Нет данных для отображения за период: {format_stats_period(start_date, end_date)}."
@@ -2750,25 +2689,6 @@ async def handle_point_stats_period(update: Update, context: ContextTypes.DEFAUL
         return await checklist_stats(update, context)
     
     period_text_display = format_stats_period(start_date, end_date)
-    response = f"📍 Статистика по точкам\n\nПериод: {period_text_display}\n\n"
-    
-    # Группируем по точкам
-    point_stats = {}
-    for stat in stats_data:
-        if stat['point'] not in point_stats:
-            point_stats[stat['point']] = []
-        point_stats[stat['point']].append(stat)
-    
-    for point_name, point_data in point_stats.items():
-        response += f"📍 {point_name}:\n"
-        for stat in point_data:
-            weekday_name = get_weekday_name(stat['weekday'])
-            response += f"   {weekday_name}:\n"
-            response += f"     🌅 Утро: {stat['morning_avg_completion']}% ({stat['morning_shift_count']} смен)\n"
-            response += f"     🌆 Вечер: {stat['evening_avg_completion']}% ({stat['evening_shift_count']} смен)\n"
-            if stat['hybrid_shift_count'] > 0:
-                response += f"     🔄 Пересмен: {stat['hybrid_avg_completion']}% ({stat['hybrid_shift_count']} смен)\n"
-        response += "\n"
     
     keyboard = [
         [KeyboardButton("📅 За неделю"), KeyboardButton("📅 За месяц"), KeyboardButton("📅 Произвольный период")],
@@ -2776,12 +2696,12 @@ async def handle_point_stats_period(update: Update, context: ContextTypes.DEFAUL
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await send_report(update.message, render_point_stats(stats, period_text_display), reply_markup=reply_markup)
     return CHECKLIST_STATS_POINT
 
 async def handle_task_stats_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора периода для статистики по заданиям"""
-    from bot.database.checklist_stats_operations import get_task_stats, get_weekday_name, format_stats_period
+    from bot.database.checklist_stats_operations import get_task_stats, render_task_stats, format_stats_period
     from datetime import date, timedelta
     
     period_text = update.message.text
@@ -2808,9 +2728,9 @@ async def handle_task_stats_period(update: Update, context: ContextTypes.DEFAULT
         return CHECKLIST_STATS_TASK
     
     # Показываем отчет
-    stats_data = get_task_stats(start_date, end_date)
+    stats = await asyncio.to_thread(get_task_stats, start_date, end_date)
     
-    if not stats_data:
+    if not stats:
         await update.message.reply_text(
             f"📝 Статистика по заданиям\n\n"
             f"❌ Нет данных для отображения за период: {format_stats_period(start_date, end_date)}."
@@ -2818,16 +2738,6 @@ async def handle_task_stats_period(update: Update, context: ContextTypes.DEFAULT
         return await checklist_stats(update, context)
     
     period_text_display = format_stats_period(start_date, end_date)
-    response = f"📝 Статистика по заданиям\n\nПериод: {period_text_display}\n\n"
-    
-    for stat in stats_data[:10]:  # Ограничиваем вывод первыми 10 заданиями
-        weekday_name = get_weekday_name(stat['day_of_week'])
-        response += f"📍 {stat['point']} | {weekday_name} | {stat['shift_type']}\n"
-        response += f"   {stat['task_description']}\n"
-        response += f"   Выполнено: {stat['completed_shifts']}/{stat['total_shifts']} ({stat['completion_percent']}%)\n\n"
-    
-    if len(stats_data) > 10:
-        response += f"... и еще {len(stats_data) - 10} заданий\n\n"
     
     keyboard = [
         [KeyboardButton("📅 За неделю"), KeyboardButton("📅 За месяц"), KeyboardButton("📅 Произвольный период")],
@@ -2835,14 +2745,14 @@ async def handle_task_stats_period(update: Update, context: ContextTypes.DEFAULT
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await send_report(update.message, render_task_stats(stats, period_text_display, limit=10), reply_markup=reply_markup)
     return CHECKLIST_STATS_TASK
 
 async def handle_custom_period_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка ввода произвольного периода"""
     from bot.database.checklist_stats_operations import (
-        get_individual_stats, get_point_stats, get_task_stats, 
-        get_weekday_name, format_stats_period
+        get_individual_stats, get_point_stats, get_task_stats,
+        render_individual_stats, render_point_stats, render_task_stats, format_stats_period
     )
     from datetime import datetime
     
@@ -2858,8 +2768,8 @@ async def handle_custom_period_input(update: Update, context: ContextTypes.DEFAU
         stats_type = context.user_data.get('stats_type', 'individual')
         
         if stats_type == 'individual':
-            stats_data = get_individual_stats(start_date, end_date)
-            if not stats_data:
+            stats = await asyncio.to_thread(get_individual_stats, start_date, end_date)
+            if not stats:
                 await update.message.reply_text(
                     f"👤 Индивидуальная статистика\n\n"
                     f"❌ Нет данных для отображения за период: {format_stats_period(start_date, end_date)}."
@@ -2867,27 +2777,13 @@ async def handle_custom_period_input(update: Update, context: ContextTypes.DEFAU
                 return await checklist_stats(update, context)
             
             period_text_display = format_stats_period(start_date, end_date)
-            response = f"👤 Индивидуальная статистика\n\nПериод: {period_text_display}\n\n"
             
-            user_stats = {}
-            for stat in stats_data:
-                if stat['user_name'] not in user_stats:
-                    user_stats[stat['user_name']] = []
-                user_stats[stat['user_name']].append(stat)
-            
-            for user_name, user_data in user_stats.items():
-                response += f"👤 {user_name}:\n"
-                for stat in user_data:
-                    weekday_name = get_weekday_name(stat['weekday'])
-                    response += f"   {weekday_name}: {stat['completed_tasks']}/{stat['total_tasks']} ({stat['completion_percent']}%)\n"
-                response += "\n"
-            
-            await update.message.reply_text(response)
+            await send_report(update.message, render_individual_stats(stats, period_text_display))
             return await checklist_stats(update, context)
             
         elif stats_type == 'point':
-            stats_data = get_point_stats(start_date, end_date)
-            if not stats_data:
+            stats = await asyncio.to_thread(get_point_stats, start_date, end_date)
+            if not stats:
                 await update.message.reply_text(
                     f"📍 Статистика по точкам\n\n"
                     f"❌ Нет данных для отображения за период: {format_stats_period(start_date, end_date)}."
@@ -2895,31 +2791,13 @@ async def handle_custom_period_input(update: Update, context: ContextTypes.DEFAU
                 return await checklist_stats(update, context)
             
             period_text_display = format_stats_period(start_date, end_date)
-            response = f"📍 Статистика по точкам\n\nПериод: {period_text_display}\n\n"
-            
-            point_stats = {}
-            for stat in stats_data:
-                if stat['point'] not in point_stats:
-                    point_stats[stat['point']] = []
-                point_stats[stat['point']].append(stat)
             
-            for point_name, point_data in point_stats.items():
-                response += f"📍 {point_name}:\n"
-                for stat in point_data:
-                    weekday_name = get_weekday_name(stat['weekday'])
-                    response += f"   {weekday_name}:\n"
-                    response += f"     🌅 Утро: {stat['morning_avg_completion']}% ({stat['morning_shift_count']} смен)\n"
-                    response += f"     🌆 Вечер: {stat['evening_avg_completion']}% ({stat['evening_shift_count']} смен)\n"
-                    if stat['hybrid_shift_count'] > 0:
-                        response += f"     🔄 Пересмен: {stat['hybrid_avg_completion']}% ({stat['hybrid_shift_count']} смен)\n"
-                response += "\n"
-            
-            await update.message.reply_text(response)
+            await send_report(update.message, render_point_stats(stats, period_text_display))
             return await checklist_stats(update, context)
             
         elif stats_type == 'task':
-            stats_data = get_task_stats(start_date, end_date)
-            if not stats_data:
+            stats = await asyncio.to_thread(get_task_stats, start_date, end_date)
+            if not stats:
                 await update.message.reply_text(
                     f"📝 Статистика по заданиям\n\n"
                     f"❌ Нет данных для отображения за период: {format_stats_period(start_date, end_date)}."
@@ -2927,18 +2805,8 @@ async def handle_custom_period_input(update: Update, context: ContextTypes.DEFAU
                 return await checklist_stats(update, context)
             
             period_text_display = format_stats_period(start_date, end_date)
-            response = f"📝 Статистика по заданиям\n\nПериод: {period_text_display}\n\n"
-            
-            for stat in stats_data[:10]:
-                weekday_name = get_weekday_name(stat['day_of_week'])
-                response += f"📍 {stat['point']} | {weekday_name} | {stat['shift_type']}\n"
-                response += f"   {stat['task_description']}\n"
-                response += f"   Выполнено: {stat['completed_shifts']}/{stat['total_shifts']} ({stat['completion_percent']}%)\n\n"
-            
-            if len(stats_data) > 10:
-                response += f"... и еще {len(stats_data) - 10} заданий\n\n"
             
-            await update.message.reply_text(response)
+            await send_report(update.message, render_task_stats(stats, period_text_display, limit=10))
             return await checklist_stats(update, context)
         
     except ValueError:
@@ -3016,7 +2884,7 @@ async def handle_detailed_log_date(update: Update, context: ContextTypes.DEFAULT
 
 async def handle_detailed_log_point(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора точки для детального лога"""
-    from bot.database.checklist_stats_operations import get_detailed_log
+    from bot.database.checklist_stats_operations import get_detailed_log, render_detailed_log
     
     point = update.message.text
     if point not in ['ДЕ', 'УЯ']:
@@ -3040,24 +2908,7 @@ async def handle_detailed_log_point(update: Update, context: ContextTypes.DEFAUL
         )
         return await checklist_stats(update, context)
     
-    response = f"📋 Детальный лог выполнения\n\n"
-    response += f"📍 Точка: {point}\n"
-    response += f"📅 Дата: {target_date.strftime('%d.%m.%Y')}\n\n"
-    
-    completed_count = 0
-    for task_log in detailed_log:
-        status = "✅" if task_log['completed'] else "❌"
-        response += f"{status} {task_log['task_description']}\n"
-        
-        if task_log['completed']:
-            completed_count += 1
-            for completion in task_log['completions']:
-                response += f"   👤 {completion['completed_by']} в {completion['completed_at']}\n"
-        response += "\n"
-    
-    response += f"📊 Итого: {completed_count}/{len(detailed_log)} заданий выполнено"
-    
-    await update.message.reply_text(response)
+    await send_report(update.message, render_detailed_log(detailed_log, target_date, point, with_total=True))
     return await checklist_stats(update, context)
 
 
@@ -3489,7 +3340,7 @@ async def handle_emulation_selection(update: Update, context: ContextTypes.DEFAU
 
     if query.data.startswith("emulate_user_"):
         iiko_id = query.data.split("_")[2]
-        user = get_user_by_iiko_id(int(iiko_id))
+        user = get_user_by_iiko_id(iiko_id)
 
         if not user:
             await query.edit_message_text("❌ Сотрудник не найден")
@@ -3798,5 +3649,7 @@ def get_settings_conversation_handler():
             CallbackQueryHandler(handle_user_callback, pattern="^(edit_user_|delete_user_|back_to_users_management)"),
             CallbackQueryHandler(handle_shift_type_callback, pattern="^(edit_shift_type_|delete_shift_type_|back_to_shift_types_management)"),
         ],
-        allow_reentry=True
+        allow_reentry=True,
+        name="settings_conversation",
+        persistent=True
     )
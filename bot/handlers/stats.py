@@ -1,14 +1,25 @@
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from bot.database.stats_queries import get_period_stats, get_custom_period_stats
-from datetime import datetime
+from bot.database.score_series import score_series, SERIES, SERIES_NAMES
+from bot.utils.charts import render_chart, render_trend_chart, render_barista_bars
+from datetime import date, datetime, timedelta
+from typing import Hashable, List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Период графика динамики и окно скользящего среднего
+TREND_CHART_DAYS = 90
+TREND_WINDOW_DAYS = 7
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /stats - показывает меню выбора периода"""
     keyboard = [
         [KeyboardButton("📊 За неделю"), KeyboardButton("📈 За месяц")],
         [KeyboardButton("📅 За год"), KeyboardButton("🗓️ Произвольный период")],
-        [KeyboardButton("⬅️ Назад")]
+        [KeyboardButton("📉 Динамика"), KeyboardButton("⬅️ Назад")]
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
@@ -50,7 +61,8 @@ async def handle_custom_period(update: Update, context: ContextTypes.DEFAULT_TYP
         datetime.strptime(end_date, '%Y-%m-%d')
         
         stats = get_custom_period_stats(start_date, end_date)
-        await format_and_send_stats(update, stats, f"период с {start_date} по {end_date}")
+        await format_and_send_stats(update, stats, f"период с {start_date} по {end_date}",
+                                    chart_key=('barista_stats', start_date, end_date))
         
     except ValueError as e:
         await update.message.reply_text(
@@ -62,10 +74,29 @@ async def handle_custom_period(update: Update, context: ContextTypes.DEFAULT_TYP
 async def show_stats(update: Update, period: str, period_name: str):
     """Показывает статистику за указанный период"""
     stats = get_period_stats(period)
-    await format_and_send_stats(update, stats, period_name)
+    await format_and_send_stats(update, stats, period_name, chart_key=('barista_stats', period, date.today()))
+
+async def send_stats_chart(update: Update, stats: list, period_name: str, chart_key: Hashable) -> bool:
+    """Статистика графиком (читается на телефоне лучше таблицы). False - нарисовать не удалось."""
+    try:
+        png = await render_chart(chart_key, render_barista_bars, f"Оценки бариста за {period_name}", stats)
+    except Exception as e:
+        logger.error(f"❌ Не удалось нарисовать график статистики: {e}")
+        return False
 
-async def format_and_send_stats(update: Update, stats: list, period_name: str):
-    """Форматирует и отправляет статистику"""
+    await update.message.reply_photo(
+        png,
+        caption=(
+            f"📊 Статистика по бариста (за {period_name})\n"
+            f"Эспрессо: {sum(row[1] or 0 for row in stats)}, фильтр: {sum(row[3] or 0 for row in stats)}, "
+            f"молочные: {sum(row[5] or 0 for row in stats)}, всего: {sum(row[7] for row in stats)}\n"
+            "На полосах - средняя оценка (количество)"
+        )
+    )
+    return True
+
+async def format_and_send_stats(update: Update, stats: list, period_name: str, chart_key: Optional[Hashable] = None):
+    """Форматирует и отправляет статистику: графиком, а если он не нарисовался - таблицей"""
     if not stats:
         await update.message.reply_text(
             f"📭 За {period_name} данных нет.\n"
@@ -73,6 +104,9 @@ async def format_and_send_stats(update: Update, stats: list, period_name: str):
         )
         return
     
+    if chart_key is not None and await send_stats_chart(update, stats, period_name, chart_key):
+        return
+    
     # Создаем красивую таблицу
     header = "📊 Статистика по бариста (за {}):\n\n".format(period_name)
     header += "{:<15} {:<6} {:<6} {:<6} {:<6} {:<6} {:<6} {:<6} {:<6}\n".format(
@@ -139,6 +173,85 @@ async def format_and_send_stats(update: Update, stats: list, period_name: str):
     )
     await update.message.reply_text(explanation)
 
+def _find_barista(query: str, baristas: List[str]) -> Optional[str]:
+    """Бариста по точному имени или единственному совпадению части имени"""
+    query = query.casefold()
+    for name in baristas:
+        if name.casefold() == query:
+            return name
+    matches = [name for name in baristas if query in name.casefold()]
+    return matches[0] if len(matches) == 1 else None
+
+def _format_delta(delta: Optional[float]) -> str:
+    if delta is None:
+        return "—"
+    arrow = "↑" if delta > 0 else "↓" if delta < 0 else "→"
+    return f"{arrow} {delta:+.2f}"
+
+def _week_over_week_text() -> str:
+    score_series.refresh()
+    deltas = score_series.week_over_week()
+    if not deltas:
+        return "📭 За последние две недели оценок нет."
+    lines = ["📉 Общая оценка: 7 дней против предыдущих 7\n"]
+    for item in deltas:
+        this_week = f"{item.this_week:.2f}" if item.this_week is not None else "—"
+        last_week = f"{item.last_week:.2f}" if item.last_week is not None else "—"
+        lines.append(f"• {item.barista}: {this_week} (было {last_week}) {_format_delta(item.delta)}, оценок {item.reviews}")
+    lines.append("\nПодробнее по бариста: /trend Имя")
+    return "\n".join(lines)
+
+def _barista_trend(query: str):
+    """Текст динамики бариста и линии для графика (None - бариста не найден)"""
+    score_series.refresh()
+    barista = _find_barista(query, score_series.baristas())
+    if barista is None:
+        return None, None, None
+
+    lines = [f"📉 Динамика: {barista}", "Средние по неделям за 8 недель, наклон - изменение за неделю\n"]
+    for trend in score_series.criterion_trends(barista):
+        known = [value for value in trend.weekly if value is not None]
+        if not known:
+            continue
+        slope = f", {_format_delta(trend.slope)}/нед" if trend.slope is not None else ""
+        lines.append(f"• {SERIES_NAMES[trend.series]}: {known[0]:.2f} → {known[-1]:.2f}{slope}")
+
+    end_date = date.today()
+    start_date = end_date - timedelta(days=TREND_CHART_DAYS - 1)
+    chart_lines = {}
+    for name in SERIES:
+        points = score_series.rolling_average(barista, name, TREND_WINDOW_DAYS, start_date, end_date)
+        if any(value is not None for _, value in points):
+            chart_lines[SERIES_NAMES[name]] = points
+    return barista, "\n".join(lines), chart_lines
+
+async def show_trends(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Динамика за неделю по всем бариста (кнопка меню)"""
+    await update.message.reply_text(await asyncio.to_thread(_week_over_week_text))
+
+async def trend_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /trend [бариста] - динамика оценок по критериям и график"""
+    if not context.args:
+        await show_trends(update, context)
+        return
+
+    barista, text, chart_lines = await asyncio.to_thread(_barista_trend, " ".join(context.args))
+    if barista is None:
+        await update.message.reply_text("❌ Бариста не найден или совпадений несколько. Уточните имя.")
+        return
+
+    await update.message.reply_text(text)
+    if chart_lines:
+        try:
+            png = await render_chart(
+                ('trend', barista, date.today()), render_trend_chart,
+                f"{barista}: среднее за {TREND_WINDOW_DAYS} дней", chart_lines
+            )
+        except Exception as e:
+            logger.error(f"❌ Не удалось нарисовать график динамики: {e}")
+            return
+        await update.message.reply_photo(png, caption=f"📈 {barista}, последние {TREND_CHART_DAYS} дней")
+
 # Для регистрации в main.py
 def get_stats_handlers():
     """Возвращает обработчики для статистики"""
@@ -147,5 +260,7 @@ def get_stats_handlers():
         MessageHandler(filters.Regex("^📈 За месяц$"), show_monthly_stats),
         MessageHandler(filters.Regex("^📅 За год$"), show_yearly_stats),
         MessageHandler(filters.Regex("^🗓️ Произвольный период$"), ask_custom_period),
+        MessageHandler(filters.Regex("^📉 Динамика$"), show_trends),
+        CommandHandler("trend", trend_command),
         MessageHandler(filters.Regex(r'^\d{4}-\d{2}-\d{2} \d{4}-\d{2}-\d{2}$'), handle_custom_period),
     ]
\ No newline at end of file
@@ -11,11 +11,18 @@ from bot.handlers.stats import stats_command, get_stats_handlers
 from bot.handlers.settings import get_settings_conversation_handler
 from bot.handlers.checklist import get_checklist_conversation_handler
 from bot.handlers.schedule import get_swap_conversation_handler
+from bot.handlers.export import get_export_handlers
+from bot.handlers.gallery import get_gallery_handlers
 from bot.keyboards.menus import get_main_menu
 from bot.utils.auth import is_mentor, is_senior_or_mentor, get_user_role
 from bot.utils.common_handlers import cancel_conversation
-from bot.database.user_operations import get_user_by_username
-from bot.database.schedule_operations import get_upcoming_shifts_by_iiko_id, get_shift_partner
+from bot.database.user_operations import get_user_by_username, update_user
+from bot.database.schedule_operations import get_shift_partner
+from bot.database.schedule_snapshot import get_schedule_snapshot
+from bot.utils.persistence import SQLitePersistence
+from bot.utils.rate_limiter import OutboundRateLimiter
+from bot.utils.jobs import setup_jobs, flush_on_shutdown
+from bot.database.checklist_log_buffer import checklist_log_buffer
 from datetime import date, timedelta
 
 # Настройка логирования с обработкой ошибок
@@ -27,13 +34,23 @@ logger = logging.getLogger(__name__)
 
 class CoffeeBot:
     def __init__(self):
-        self.application = Application.builder().token(BotConfig.token).build()
+        self.application = (
+            Application.builder()
+            .token(BotConfig.token)
+            .persistence(SQLitePersistence(BotConfig.persistence_path))
+            .rate_limiter(OutboundRateLimiter())
+            .post_shutdown(flush_on_shutdown)
+            .build()
+        )
         
         # Добавляем обработчик ошибок
         self.application.add_error_handler(self.error_handler)
         
         init_db()
+        # Отметки чек-листа, не дошедшие до БД при прошлом запуске
+        checklist_log_buffer.recover()
         self.setup_handlers()
+        setup_jobs(self.application)
     
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик ошибок с детальным логированием"""
@@ -68,6 +85,14 @@ class CoffeeBot:
         for handler in stats_handlers:
             self.application.add_handler(handler)
         
+        # Выгрузка сырых данных
+        for handler in get_export_handlers():
+            self.application.add_handler(handler)
+        
+        # Альбом фото оценок
+        for handler in get_gallery_handlers():
+            self.application.add_handler(handler)
+        
         # Отладочные команды
         self.application.add_handler(CommandHandler("show_db", self.show_db_command))
         self.application.add_handler(CommandHandler("stats_debug", self.stats_debug_command))
@@ -97,18 +122,18 @@ class CoffeeBot:
         print("✅ Все обработчики настроены!")
 
     def _format_partner_line(self, shift, current_iiko_id: str) -> str:
-        """Сформировать строку с напарником для смены."""
+        """Сформировать строку с напарником для смены (смена из снимка расписания)."""
         partner_info = get_shift_partner(
             shift.shift_date,
-            shift.shift_type_obj.point,
-            shift.shift_type_obj.shift_type,
+            shift.point,
+            shift.shift_type,
             current_iiko_id
         )
         if not partner_info:
             return ""
 
-        partner_name = partner_info["user"].name
-        if partner_info["shift_type"] == "hybrid" and shift.shift_type_obj.shift_type != "hybrid":
+        partner_name = partner_info["name"]
+        if partner_info["shift_type"] == "hybrid" and shift.shift_type != "hybrid":
             return f"  🤝 Напарник: {partner_name} (пересмен)\n"
         return f"  🤝 Напарник: {partner_name}\n"
     
@@ -125,6 +150,13 @@ class CoffeeBot:
         if user.username:
             db_user = get_user_by_username(user.username)
         
+        # Запоминаем chat id: без него бот не сможет прислать напоминание о смене
+        if db_user and db_user.telegram_id != user.id:
+            try:
+                update_user(db_user.id, telegram_id=user.id)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось сохранить telegram_id для @{user.username}: {e}")
+        
         # Формируем приветствие в зависимости от роли
         if db_user:
             role_names = {
@@ -137,23 +169,21 @@ class CoffeeBot:
             
             # Получаем ближайшие смены на неделю
             if db_user.iiko_id:
-                shifts = get_upcoming_shifts_by_iiko_id(str(db_user.iiko_id), days=7)
+                shifts = get_schedule_snapshot().get_upcoming_shifts(str(db_user.iiko_id), days=7)
                 if shifts:
                     greeting += "\n\n📅 Ваши ближайшие смены на неделю:\n"
                     for shift in shifts:
-                        if not shift.shift_type_obj:
-                            continue
                         shift_type_names = {
                             'morning': '🌅 Утро',
                             'hybrid': '🌤️ Пересмен',
                             'evening': '🌆 Вечер'
                         }
-                        shift_type_text = shift_type_names.get(shift.shift_type_obj.shift_type, shift.shift_type_obj.shift_type)
+                        shift_type_text = shift_type_names.get(shift.shift_type, shift.shift_type)
                         date_str = shift.shift_date.strftime("%d.%m")
-                        start_str = shift.shift_type_obj.start_time.strftime("%H:%M")
-                        end_str = shift.shift_type_obj.end_time.strftime("%H:%M")
+                        start_str = shift.start_time.strftime("%H:%M")
+                        end_str = shift.end_time.strftime("%H:%M")
                         greeting += (
-                            f"• {date_str} ({shift_type_text}) {shift.shift_type_obj.point}: {start_str} - {end_str}\n"
+                            f"• {date_str} ({shift_type_text}) {shift.point}: {start_str} - {end_str}\n"
                             f"{self._format_partner_line(shift, str(db_user.iiko_id))}"
                         )
                 else:
@@ -371,6 +401,7 @@ class CoffeeBot:
                 "/start - Главное меню\n"
                 "/review - Начать оценку\n"
                 "/stats - Статистика\n"
+                "/trend [бариста] - Динамика оценок\n"
                 "/show_db - Показать базу\n"
                 "/stats_debug - Статистика (отладка)\n"
                 "/show_photo [id] - Показать фото\n"
@@ -389,23 +420,18 @@ class CoffeeBot:
         """Показать мои смены на 2 недели вперед"""
         user = update.effective_user
     
-        # Получаем пользователя по username
-        db_user = None
-        if user.username:
-            from bot.database.user_operations import get_user_by_username
-            db_user = get_user_by_username(user.username)
+        # Смены, напарники и сам пользователь берутся из снимка расписания без запросов к БД
+        snapshot = get_schedule_snapshot()
+        iiko_id = snapshot.get_iiko_id_by_username(user.username) if user.username else None
     
-        if not db_user or not db_user.iiko_id:
+        if not iiko_id:
             await update.message.reply_text(
                 "❌ Ваш аккаунт не найден в системе. Обратитесь к администратору."
             )
             return
     
         # Получаем смены на 2 недели вперед
-        from bot.database.schedule_operations import get_upcoming_shifts_by_iiko_id
-        from datetime import date, timedelta
-    
-        shifts = get_upcoming_shifts_by_iiko_id(str(db_user.iiko_id), days=14)
+        shifts = snapshot.get_upcoming_shifts(iiko_id, days=14)
     
         if not shifts:
             await update.message.reply_text("📅 У вас нет запланированных смен на ближайшие 2 недели.")
@@ -415,24 +441,21 @@ class CoffeeBot:
         message = "📅 Ваши смены на ближайшие 2 недели:\n\n"
     
         for shift in shifts:
-            if not shift.shift_type_obj:
-                continue
-            
             shift_type_names = {
                 'morning': '🌅 Утро',
                 'hybrid': '🌤️ Пересмен', 
                 'evening': '🌆 Вечер'
             }
         
-            shift_type_text = shift_type_names.get(shift.shift_type_obj.shift_type, shift.shift_type_obj.shift_type)
+            shift_type_text = shift_type_names.get(shift.shift_type, shift.shift_type)
             date_str = shift.shift_date.strftime("%d.%m.%Y")
-            start_str = shift.shift_type_obj.start_time.strftime("%H:%M")
-            end_str = shift.shift_type_obj.end_time.strftime("%H:%M")
+            start_str = shift.start_time.strftime("%H:%M")
+            end_str = shift.end_time.strftime("%H:%M")
         
             message += f"• {date_str} ({shift_type_text})\n"
-            message += f"  🏪 {shift.shift_type_obj.point}\n"
+            message += f"  🏪 {shift.point}\n"
             message += f"  ⏰ {start_str} - {end_str}\n"
-            message += self._format_partner_line(shift, str(db_user.iiko_id))
+            message += self._format_partner_line(shift, iiko_id)
             message += "\n"
     
         await update.message.reply_text(message)
@@ -0,0 +1,27 @@
+"""Пакетная рассылка сообщений с низким приоритетом в ограничителе отправки"""
+from typing import Iterable, Tuple
+import logging
+
+from telegram import Bot
+from telegram.error import Forbidden, TelegramError
+
+from bot.utils.rate_limiter import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+async def send_batch(bot: Bot, messages: Iterable[Tuple[int, str]]) -> int:
+    """Разослать (chat_id, текст). Темп и повторы после 429 обеспечивает OutboundRateLimiter.
+
+    Возвращает количество доставленных сообщений.
+    """
+    sent = 0
+    for chat_id, text in messages:
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, rate_limit_args=PRIORITY_BULK)
+            sent += 1
+        except Forbidden:
+            # Пользователь заблокировал бота - это не ошибка рассылки
+            logger.info(f"🚫 Чат {chat_id} недоступен для бота")
+        except TelegramError as e:
+            logger.error(f"❌ Ошибка отправки в чат {chat_id}: {e}")
+    return sent
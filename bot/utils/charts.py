@@ -0,0 +1,156 @@
+"""Графики статистики в PNG (matplotlib).
+
+Рисование идет в отдельных процессах: CPU-нагрузка matplotlib не держит цикл событий и GIL бота.
+Готовые картинки кэшируются по (отчет, период) вместе с отпечатком данных.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+import asyncio
+import io
+import multiprocessing
+import threading
+import logging
+
+from bot.config import BotConfig
+
+logger = logging.getLogger(__name__)
+
+CHART_CACHE_MAX_ENTRIES = 100
+WEEKDAY_LABELS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+# ===== Рисование (выполняется в процессе-воркере) =====
+
+def _figure(width: float, height: float):
+    # Figure без pyplot: нет глобального состояния и GUI-бэкенда
+    from matplotlib.figure import Figure
+    return Figure(figsize=(width, height), dpi=100)
+
+def _to_png(figure) -> bytes:
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+def render_trend_chart(title: str, lines: Dict[str, List[Tuple[date, Optional[float]]]]) -> bytes:
+    """Линии скользящих средних"""
+    from matplotlib.dates import DateFormatter
+
+    figure = _figure(8, 4.5)
+    axes = figure.subplots()
+    for label, points in lines.items():
+        axes.plot([day for day, _ in points], [value for _, value in points], label=label, linewidth=1.8)
+    axes.set_title(title)
+    axes.set_ylim(0, 5.2)
+    axes.grid(True, alpha=0.3)
+    axes.xaxis.set_major_formatter(DateFormatter('%d.%m'))
+    axes.legend(loc='lower left', fontsize='small', ncol=2)
+    figure.autofmt_xdate()
+    return _to_png(figure)
+
+def render_barista_bars(title: str, stats: Sequence[Tuple]) -> bytes:
+    """Средние оценки по бариста: эспрессо, фильтр, молочные и общая (строки get_barista_stats_period)"""
+    groups = (("Эспрессо", 2, 1), ("Фильтр", 4, 3), ("Молочные", 6, 5), ("Общая", 8, 7))
+    names = [row[0] for row in stats]
+
+    # Горизонтальные полосы: длинные имена читаются и на телефоне
+    figure = _figure(8, max(3.0, 0.9 * len(names) + 1.2))
+    axes = figure.subplots()
+    bar_height = 0.8 / len(groups)
+    for group_index, (label, avg_index, count_index) in enumerate(groups):
+        positions = [index + group_index * bar_height for index in range(len(names))]
+        values = [row[avg_index] or 0 for row in stats]
+        bars = axes.barh(positions, values, height=bar_height, label=label)
+        for bar, row in zip(bars, stats):
+            if row[count_index]:
+                axes.text(bar.get_width() + 0.05, bar.get_y() + bar.get_height() / 2,
+                          f"{row[avg_index] or 0} ({row[count_index]})", va='center', fontsize='x-small')
+    axes.set_yticks([index + 0.4 - bar_height / 2 for index in range(len(names))], names)
+    axes.invert_yaxis()
+    axes.set_xlim(0, 5.8)
+    axes.set_title(title)
+    axes.grid(True, axis='x', alpha=0.3)
+    axes.legend(loc='lower right', fontsize='small')
+    return _to_png(figure)
+
+def render_completion_heatmap(title: str, points: Sequence[str], cells: Dict[Tuple[str, int], float]) -> bytes:
+    """Процент выполнения чек-листов: день недели × точка"""
+    import numpy
+
+    grid = numpy.full((7, len(points)), numpy.nan)
+    for (point, weekday), value in cells.items():
+        grid[weekday, points.index(point)] = value
+
+    figure = _figure(max(4.0, 1.6 * len(points) + 2), 5)
+    axes = figure.subplots()
+    image = axes.imshow(numpy.ma.masked_invalid(grid), cmap='RdYlGn', vmin=0, vmax=100, aspect='auto')
+    axes.set_xticks(range(len(points)), points)
+    axes.set_yticks(range(7), WEEKDAY_LABELS)
+    for weekday in range(7):
+        for column in range(len(points)):
+            if not numpy.isnan(grid[weekday, column]):
+                axes.text(column, weekday, f"{grid[weekday, column]:.0f}%", ha='center', va='center', fontsize='small')
+    axes.set_title(title)
+    figure.colorbar(image, ax=axes, label='% выполнения')
+    return _to_png(figure)
+
+# ===== Пул процессов и кэш =====
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# (отчет, период) -> (отпечаток данных, png)
+_cache: "OrderedDict[Hashable, Tuple[int, bytes]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _init_worker():
+    # Импорт matplotlib - самая долгая часть первого графика, платим при старте процесса
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.figure  # noqa: F401
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: форк процесса с потоками бота может унаследовать захваченные блокировки
+            _pool = ProcessPoolExecutor(max_workers=BotConfig.chart_workers,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+        return _pool
+
+def shutdown_chart_pool():
+    """Остановить процессы рисования (при остановке бота)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+async def render_chart(key: Hashable, render: Callable[..., bytes], *args) -> bytes:
+    """PNG из кэша или нарисованный в пуле процессов.
+
+    Картинка берется из кэша, только если данные (args) не изменились с прошлого рисования.
+    """
+    fingerprint = hash(repr(args))
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            _cache.move_to_end(key)
+            logger.debug(f"📦 График {key} взят из кэша")
+            return cached[1]
+
+    try:
+        png = await asyncio.get_running_loop().run_in_executor(_get_pool(), render, *args)
+    except BrokenProcessPool:
+        # Воркер упал (например, по памяти) - следующий вызов поднимет пул заново
+        logger.error("❌ Процесс рисования графиков упал, пул будет пересоздан")
+        shutdown_chart_pool()
+        raise
+
+    with _cache_lock:
+        _cache[key] = (fingerprint, png)
+        _cache.move_to_end(key)
+        while len(_cache) > CHART_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return png
@@ -0,0 +1,116 @@
+"""Периодические задачи бота (JobQueue)"""
+from telegram.ext import Application, ContextTypes
+from datetime import datetime, time
+import asyncio
+import logging
+
+from bot.database.checklist_log_buffer import checklist_log_buffer, FLUSH_INTERVAL_SECONDS
+from bot.database.backup import create_backup
+from bot.database.archive import archive_old_rows
+from bot.database.active_shifts import refresh_active_shift_index, ACTIVE_SHIFTS_REFRESH_SECONDS
+from bot.utils.shift_reminders import setup_shift_reminders, replan_reminders_if_changed
+from bot.utils.rate_limiter import OutboundRateLimiter
+from bot.utils.sheets_dashboard import push_dashboard, DASHBOARD_INTERVAL_SECONDS
+from bot.utils.charts import shutdown_chart_pool
+
+logger = logging.getLogger(__name__)
+
+# Как часто писать в лог счетчики ограничителя отправки
+RATE_LIMITER_METRICS_SECONDS = 15 * 60
+# Ежедневный бэкап БД - ночью, когда смен нет
+BACKUP_TIME = time(4, 0)
+# Архивация - после бэкапа, чтобы перед переносом строк был свежий снимок
+ARCHIVE_TIME = time(4, 30)
+
+async def flush_checklist_log_job(context: ContextTypes.DEFAULT_TYPE):
+    """Сбросить накопленные отметки чек-листа в БД (в отдельном потоке, не блокируя бота)"""
+    await asyncio.to_thread(checklist_log_buffer.flush)
+
+async def refresh_active_shifts_job(context: ContextTypes.DEFAULT_TYPE):
+    """Перестроить снимок расписания и индекс активных смен заранее, вне обработчиков"""
+    await asyncio.to_thread(refresh_active_shift_index)
+    # Снимок мог смениться после правок расписания - напоминания должны идти по новому
+    await replan_reminders_if_changed(context)
+
+async def log_rate_limiter_metrics_job(context: ContextTypes.DEFAULT_TYPE):
+    """Счетчики ограничителя отправки в лог"""
+    rate_limiter = context.bot.rate_limiter
+    if isinstance(rate_limiter, OutboundRateLimiter) and rate_limiter.metrics.requests:
+        logger.info(f"📨 Ограничитель отправки: {rate_limiter.metrics.format()}")
+
+async def backup_database_job(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневный бэкап БД в отдельном потоке"""
+    try:
+        await asyncio.to_thread(create_backup, "daily")
+    except Exception:
+        # Ошибка уже в логе, следующая попытка - завтра
+        pass
+
+async def archive_old_rows_job(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневный перенос старых строк в архив в отдельном потоке"""
+    try:
+        await asyncio.to_thread(archive_old_rows)
+    except Exception:
+        # Ошибка уже в логе; недоперенесенное доедет завтра
+        pass
+
+async def push_dashboard_job(context: ContextTypes.DEFAULT_TYPE):
+    """Обновить дашборд в Google Sheets (пишет только изменившиеся строки)"""
+    try:
+        await asyncio.to_thread(push_dashboard)
+    except FileNotFoundError:
+        # Нет credentials.json - Google Sheets не настроен на этом сервере
+        logger.warning("⚠️ Дашборд в Google Sheets отключен: нет credentials.json")
+        context.job.schedule_removal()
+    except Exception:
+        # Ошибка уже в логе, повторим по расписанию
+        pass
+
+def setup_jobs(application: Application):
+    """Зарегистрировать периодические задачи"""
+    job_queue = application.job_queue
+    if job_queue is None:
+        logger.warning("⚠️ JobQueue недоступен: установите python-telegram-bot[job-queue]")
+        return
+
+    job_queue.run_repeating(
+        flush_checklist_log_job,
+        interval=FLUSH_INTERVAL_SECONDS,
+        first=FLUSH_INTERVAL_SECONDS,
+        name="checklist_log_flush"
+    )
+    job_queue.run_repeating(
+        refresh_active_shifts_job,
+        interval=ACTIVE_SHIFTS_REFRESH_SECONDS,
+        first=0,
+        name="active_shifts_refresh"
+    )
+    setup_shift_reminders(job_queue)
+    job_queue.run_repeating(
+        log_rate_limiter_metrics_job,
+        interval=RATE_LIMITER_METRICS_SECONDS,
+        first=RATE_LIMITER_METRICS_SECONDS,
+        name="rate_limiter_metrics"
+    )
+    job_queue.run_daily(
+        backup_database_job,
+        time=BACKUP_TIME.replace(tzinfo=datetime.now().astimezone().tzinfo),
+        name="database_backup"
+    )
+    job_queue.run_daily(
+        archive_old_rows_job,
+        time=ARCHIVE_TIME.replace(tzinfo=datetime.now().astimezone().tzinfo),
+        name="archive_old_rows"
+    )
+    job_queue.run_repeating(
+        push_dashboard_job,
+        interval=DASHBOARD_INTERVAL_SECONDS,
+        first=60,
+        name="sheets_dashboard"
+    )
+    logger.info("⏱️ Периодические задачи зарегистрированы")
+
+async def flush_on_shutdown(application: Application):
+    """Дописать все буферы и остановить фоновые процессы при остановке бота"""
+    checklist_log_buffer.flush()
+    shutdown_chart_pool()
@@ -0,0 +1,98 @@
+"""Распределение «кто кому дарит»: случайная перестановка без неподвижных точек (деранжемент)"""
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, TypeVar
+import random
+
+T = TypeVar("T", bound=Hashable)
+
+# Правило запрета: True, если giver не может получить receiver
+Exclusion = Callable[[T, T], bool]
+
+# Сколько случайных перестановок пробуем при починке одного запрещенного ребра
+REPAIR_ATTEMPTS_PER_EDGE = 200
+# Сколько раз начинаем с нового цикла, если починка зашла в тупик
+RESTARTS = 20
+
+class MatchingError(Exception):
+    """Распределение с заданными ограничениями не найдено"""
+
+def sattolo_cycle(items: Sequence[T], rng: Optional[random.Random] = None) -> List[T]:
+    """Алгоритм Саттоло: равновероятная перестановка, образующая один цикл длины n, за O(n).
+
+    Возвращает образы: items[i] дарит result[i]. Один цикл - значит, себе никто не дарит.
+    """
+    rng = rng or random.Random()
+    order = list(items)
+    # j < i строго - отличие от Фишера-Йетса, дающее ровно один цикл
+    for i in range(len(order) - 1, 0, -1):
+        j = rng.randrange(i)
+        order[i], order[j] = order[j], order[i]
+    return order
+
+def forbid_pairs(pairs: Iterable[tuple]) -> Exclusion:
+    """Запрет конкретных пар (например, прошлогоднее распределение)"""
+    forbidden = set(pairs)
+    return lambda giver, receiver: (giver, receiver) in forbidden
+
+def forbid_same(key: Callable[[T], Hashable]) -> Exclusion:
+    """Запрет внутри группы (например, одна кофейня). Участники без группы (None) не ограничены."""
+    def rule(giver, receiver):
+        group = key(giver)
+        return group is not None and group == key(receiver)
+    return rule
+
+def combine_exclusions(*rules: Exclusion) -> Exclusion:
+    return lambda giver, receiver: any(rule(giver, receiver) for rule in rules)
+
+def derange(items: Sequence[T], exclude: Optional[Exclusion] = None,
+            rng: Optional[random.Random] = None) -> Dict[T, T]:
+    """Назначить каждому участнику получателя: никто не дарит себе, запрещенные пары не встречаются.
+
+    Без ограничений успех гарантирован для n >= 2. С ограничениями запрещенные ребра цикла
+    чинятся обменом позиций: обмен двух участников в цикле сохраняет один цикл.
+    """
+    if len(set(items)) != len(items):
+        raise MatchingError("Участники повторяются")
+    if len(items) < 2:
+        raise MatchingError("Нужно минимум два участника")
+
+    rng = rng or random.Random()
+    assignment = dict(zip(items, sattolo_cycle(items, rng)))
+    if exclude is None:
+        return assignment
+
+    for attempt in range(RESTARTS):
+        if attempt:
+            assignment = dict(zip(items, sattolo_cycle(items, rng)))
+        # Порядок обхода цикла: order[k] дарит order[k+1], последний - первому
+        order = [items[0]]
+        while len(order) < len(items):
+            order.append(assignment[order[-1]])
+        if _repair(order, exclude, rng):
+            return {order[k]: order[(k + 1) % len(order)] for k in range(len(order))}
+    raise MatchingError("Не удалось распределить участников с заданными ограничениями")
+
+def _repair(order: List[T], exclude: Exclusion, rng: random.Random) -> bool:
+    """Убрать запрещенные ребра из цикла на месте. False - тупик."""
+    n = len(order)
+
+    def edge_ok(k: int) -> bool:
+        return not exclude(order[k % n], order[(k + 1) % n])
+
+    for k in range(n):
+        if edge_ok(k):
+            continue
+        # Ребро k -> k+1 запрещено: меняем получателя (позицию k+1) местами со случайным участником
+        target = (k + 1) % n
+        for _ in range(REPAIR_ATTEMPTS_PER_EDGE):
+            other = rng.randrange(n)
+            if other == target:
+                continue
+            order[target], order[other] = order[other], order[target]
+            # Обмен меняет только ребра вокруг двух позиций; уже проверенные (0..k) ломать нельзя
+            touched = {edge % n for edge in (target - 1, target, other - 1, other)}
+            if all(edge_ok(edge) for edge in touched if edge <= k):
+                break
+            order[target], order[other] = order[other], order[target]
+        else:
+            return False
+    return True
@@ -0,0 +1,306 @@
+"""Хранение состояния диалогов и user_data в SQLite с отложенной пакетной записью"""
+from dataclasses import fields
+from datetime import date, datetime, time
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import json
+import sqlite3
+import logging
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.database.read_models import READ_MODELS
+
+logger = logging.getLogger(__name__)
+
+# PTB сам собирает изменения и отдает их раз в update_interval секунд
+PERSISTENCE_UPDATE_INTERVAL = 30
+# Пауза, за которую накопившиеся изменения одной волны пишутся одной транзакцией
+FLUSH_DELAY = 1.0
+
+_SKIP = object()
+
+def _to_jsonable(value: Any) -> Any:
+    """Привести значение к JSON. ORM-объекты и прочее несериализуемое пропускаются (_SKIP)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    # datetime - подкласс date, проверяем первым
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, time):
+        return {"__time__": value.isoformat()}
+    if READ_MODELS.get(type(value).__name__) is type(value):
+        # Модели чтения (read_models) - неизменяемые снимки строк, их можно восстановить
+        encoded = _to_jsonable({field.name: getattr(value, field.name) for field in fields(value)})
+        return _SKIP if encoded is _SKIP else {"__read_model__": type(value).__name__, "fields": encoded}
+    if isinstance(value, (list, tuple)):
+        items = [_to_jsonable(item) for item in value]
+        return _SKIP if any(item is _SKIP for item in items) else items
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if not isinstance(key, (str, int)):
+                return _SKIP
+            item = _to_jsonable(item)
+            if item is _SKIP:
+                return _SKIP
+            result[key] = item
+        if all(isinstance(key, str) for key in result):
+            return result
+        # Числовые ключи (например task_id) JSON превратил бы в строки
+        return {"__items__": [[key, item] for key, item in result.items()]}
+    return _SKIP
+
+def _from_json(value: Dict) -> Any:
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    if "__time__" in value:
+        return time.fromisoformat(value["__time__"])
+    if "__items__" in value:
+        return {key: item for key, item in value["__items__"]}
+    if "__read_model__" in value:
+        return READ_MODELS[value["__read_model__"]](**value["fields"])
+    return value
+
+def encode_user_data(data: Dict) -> str:
+    """Сериализовать user_data, отбросив ключи с несериализуемыми значениями"""
+    result = {}
+    for key, value in data.items():
+        encoded = _to_jsonable(value)
+        if encoded is _SKIP:
+            logger.debug(f"💾 Ключ user_data '{key}' не сохраняется: несериализуемое значение")
+            continue
+        result[str(key)] = encoded
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
+def decode_user_data(raw: str) -> Dict:
+    return json.loads(raw, object_hook=_from_json)
+
+def _last_written(saved: Dict, writing: Dict, key) -> Optional[str]:
+    """Значение, которое будет в файле после текущей записи"""
+    return writing[key] if key in writing else saved.get(key)
+
+class SQLitePersistence(BasePersistence):
+    """Состояния ConversationHandler'ов и user_data в отдельном файле SQLite.
+
+    Записи копятся в памяти и сбрасываются одной транзакцией, неизменившиеся значения не пишутся.
+    chat_data, bot_data и callback_data бот не использует - они не сохраняются.
+    """
+
+    def __init__(self, path: str, update_interval: float = PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        # Последние записанные значения: по ним отсекаются холостые записи
+        self._saved_user_data: Dict[int, str] = {}
+        self._saved_conversations: Dict[Tuple[str, str], str] = {}
+        # Ожидающие записи: None означает удаление строки
+        self._pending_user_data: Dict[int, Optional[str]] = {}
+        self._pending_conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        # Снимок, который сейчас пишется в потоке: до конца записи сравниваем с ним, а не с _saved_*
+        self._writing_user_data: Dict[int, Optional[str]] = {}
+        self._writing_conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._init_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def _init_tables(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS persisted_user_data (
+                    user_id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS persisted_conversations (
+                    name TEXT NOT NULL,
+                    conversation_key TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    PRIMARY KEY (name, conversation_key)
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- Чтение при старте ---
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT user_id, data FROM persisted_user_data").fetchall()
+        finally:
+            conn.close()
+
+        result = {}
+        for user_id, raw in rows:
+            try:
+                result[user_id] = decode_user_data(raw)
+            except (ValueError, TypeError, KeyError) as e:
+                # TypeError/KeyError - модель чтения сохранена до изменения ее полей или удалена
+                logger.warning(f"⚠️ Поврежденные или устаревшие user_data пользователя {user_id}: {e!r}")
+                continue
+            self._saved_user_data[user_id] = raw
+        logger.info(f"💾 Восстановлены user_data {len(result)} пользователей")
+        return result
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT conversation_key, state FROM persisted_conversations WHERE name = ?", (name,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        result = {}
+        for key, raw_state in rows:
+            self._saved_conversations[(name, key)] = raw_state
+            result[tuple(json.loads(key))] = json.loads(raw_state)
+        if result:
+            logger.info(f"💾 Восстановлено {len(result)} активных диалогов '{name}'")
+        return result
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- Запись ---
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        raw = encode_user_data(data)
+        if _last_written(self._saved_user_data, self._writing_user_data, user_id) == raw:
+            self._pending_user_data.pop(user_id, None)
+            return
+        self._pending_user_data[user_id] = raw
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        conversation_key = (name, json.dumps(list(key)))
+        raw_state = None if new_state is None else json.dumps(new_state)
+        if _last_written(self._saved_conversations, self._writing_conversations, conversation_key) == raw_state:
+            self._pending_conversations.pop(conversation_key, None)
+            return
+        self._pending_conversations[conversation_key] = raw_state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    def _schedule_flush(self):
+        """Запланировать запись: все изменения одной волны update_persistence уйдут вместе"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Изменения, пришедшие во время записи, уходят следующей пачкой
+        while self._pending_user_data or self._pending_conversations:
+            await asyncio.sleep(FLUSH_DELAY)
+            if not await self._write_pending():
+                break
+
+    async def _write_pending(self) -> bool:
+        """Записать накопленные изменения одной транзакцией.
+
+        Снимок забирается и _saved_* обновляются в цикле событий, в потоке - только запись в SQLite.
+        """
+        user_data, self._pending_user_data = self._pending_user_data, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not user_data and not conversations:
+            return True
+
+        self._writing_user_data, self._writing_conversations = user_data, conversations
+        try:
+            await asyncio.to_thread(self._write_snapshot, user_data, conversations)
+        except Exception as e:
+            # Возвращаем несохраненное обратно, более свежие значения не перетираем
+            for user_id, raw in user_data.items():
+                self._pending_user_data.setdefault(user_id, raw)
+            for key, state in conversations.items():
+                self._pending_conversations.setdefault(key, state)
+            logger.error(f"❌ Ошибка записи состояния диалогов: {e}")
+            return False
+        finally:
+            self._writing_user_data, self._writing_conversations = {}, {}
+
+        for user_id, raw in user_data.items():
+            if raw is None:
+                self._saved_user_data.pop(user_id, None)
+            else:
+                self._saved_user_data[user_id] = raw
+        for key, state in conversations.items():
+            if state is None:
+                self._saved_conversations.pop(key, None)
+            else:
+                self._saved_conversations[key] = state
+        logger.debug(f"💾 Сохранено: user_data {len(user_data)}, диалогов {len(conversations)}")
+        return True
+
+    def _write_snapshot(self, user_data: Dict[int, Optional[str]],
+                        conversations: Dict[Tuple[str, str], Optional[str]]):
+        """Запись снимка в SQLite (выполняется в потоке, состояние объекта не трогает)"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO persisted_user_data (user_id, data) VALUES (?, ?)",
+                    [(user_id, raw) for user_id, raw in user_data.items() if raw is not None]
+                )
+                conn.executemany(
+                    "DELETE FROM persisted_user_data WHERE user_id = ?",
+                    [(user_id,) for user_id, raw in user_data.items() if raw is None]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO persisted_conversations (name, conversation_key, state) VALUES (?, ?, ?)",
+                    [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+                )
+                conn.executemany(
+                    "DELETE FROM persisted_conversations WHERE name = ? AND conversation_key = ?",
+                    [key for key, state in conversations.items() if state is None]
+                )
+        finally:
+            conn.close()
+
+    async def flush(self) -> None:
+        """Дописать все при остановке бота"""
+        # Дожидаемся начатой записи, чтобы старые значения не легли поверх новых
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        await self._write_pending()
@@ -0,0 +1,86 @@
+"""Локальный кэш миниатюр фото оценок: качается лениво при просмотре, вытесняется LRU по объему диска"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+import os
+import logging
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+from bot.config import BotConfig
+
+logger = logging.getLogger(__name__)
+
+class ThumbnailCache:
+    """Миниатюры по file_unique_id. file_id привязан к боту - локальная копия переживает смену токена."""
+
+    def __init__(self, directory: str, budget_bytes: int):
+        self.directory = Path(directory)
+        self.budget_bytes = budget_bytes
+        # file_unique_id -> размер; порядок - от давно использованных к недавним
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    def _load(self) -> "OrderedDict[str, int]":
+        if self._entries is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.jpg"), key=lambda path: path.stat().st_mtime)
+            self._entries = OrderedDict((path.stem, path.stat().st_size) for path in files)
+            self._total = sum(self._entries.values())
+        return self._entries
+
+    def _path(self, unique_id: str) -> Path:
+        return self.directory / f"{unique_id}.jpg"
+
+    def get(self, unique_id: str) -> Optional[Path]:
+        """Путь к миниатюре, если она уже скачана (отмечает использование)"""
+        entries = self._load()
+        if unique_id not in entries:
+            return None
+        entries.move_to_end(unique_id)
+        path = self._path(unique_id)
+        # mtime - порядок LRU после перезапуска
+        os.utime(path)
+        return path
+
+    async def fetch(self, bot: Bot, unique_id: str, file_id: str) -> Optional[Path]:
+        """Миниатюра из кэша или скачанная сейчас"""
+        path = self.get(unique_id)
+        if path is not None or not self.enabled:
+            return path
+
+        path = self._path(unique_id)
+        partial = path.with_suffix(".part")
+        try:
+            telegram_file = await bot.get_file(file_id)
+            await telegram_file.download_to_drive(partial)
+            os.replace(partial, path)
+        except (TelegramError, OSError) as e:
+            logger.warning(f"⚠️ Не удалось скачать миниатюру {unique_id}: {e}")
+            partial.unlink(missing_ok=True)
+            return None
+
+        size = path.stat().st_size
+        self._entries[unique_id] = size
+        self._total += size
+        self._evict()
+        return path
+
+    async def warm(self, bot: Bot, photos: Iterable):
+        """Докачать миниатюры просмотренных фото (ReviewPhoto с file_unique_id)"""
+        for photo in photos:
+            if photo.file_unique_id:
+                await self.fetch(bot, photo.file_unique_id, photo.thumb_file_id or photo.file_id)
+
+    def _evict(self):
+        while self._total > self.budget_bytes and self._entries:
+            unique_id, size = self._entries.popitem(last=False)
+            self._path(unique_id).unlink(missing_ok=True)
+            self._total -= size
+
+thumbnail_cache = ThumbnailCache(BotConfig.photo_cache_dir, BotConfig.photo_cache_budget_mb * 1024 * 1024)
@@ -0,0 +1,174 @@
+"""Единый ограничитель исходящих запросов к Telegram: корзины токенов на чат и на бота, приоритеты"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (rate_limit_args): меньше - раньше
+PRIORITY_INTERACTIVE = 0  # ответы на действия пользователя (по умолчанию)
+PRIORITY_BULK = 1  # рассылки, напоминания
+
+# Telegram: ~30 сообщений/сек на бота, ~1/сек в личный чат, 20/мин в группу
+GLOBAL_RATE = 25
+GLOBAL_BURST = 25
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+CHAT_BURST = 3
+MAX_RETRIES = 3
+# Сколько корзин чатов держать, прежде чем выбросить простаивающие
+MAX_CHAT_BUCKETS = 1000
+
+class _TokenBucket:
+    """Корзина токенов с очередью ожидающих по приоритету"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def is_idle(self) -> bool:
+        self._refill()
+        return not self._waiters and self._tokens >= self.capacity
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (после RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self, priority: int):
+        self._refill()
+        if not self._waiters and self._tokens >= 1 and time.monotonic() >= self._paused_until:
+            self._tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._schedule()
+        await future
+
+    def _schedule(self):
+        if self._timer is not None:
+            return
+        delay = max((1 - self._tokens) / self.rate, self._paused_until - time.monotonic(), 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        self._refill()
+        if time.monotonic() >= self._paused_until:
+            while self._waiters and self._tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                # Запрос, который отменили, пока он ждал
+                if future.done():
+                    continue
+                self._tokens -= 1
+                future.set_result(None)
+        if self._waiters:
+            self._schedule()
+
+@dataclass
+class RateLimiterMetrics:
+    """Счетчики ограничителя с момента запуска"""
+    requests: int = 0
+    delayed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    retry_after: int = 0
+    by_priority: Dict[int, int] = field(default_factory=dict)
+
+    def format(self) -> str:
+        average = self.total_wait / self.delayed if self.delayed else 0
+        lanes = ", ".join(f"p{priority}: {count}" for priority, count in sorted(self.by_priority.items()))
+        return (
+            f"запросов {self.requests} ({lanes or '-'}), задержано {self.delayed}, "
+            f"ожидание ср. {average:.2f}с / макс. {self.max_wait:.2f}с, 429: {self.retry_after}"
+        )
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Ограничитель для Application: сообщения в чаты проходят через корзину чата и общую корзину.
+
+    rate_limit_args - приоритет (PRIORITY_*): при очереди интерактивные ответы уходят раньше рассылок.
+    Запросы без chat_id (getUpdates, answerCallbackQuery и т.п.) не ограничиваются.
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+        self.metrics = RateLimiterMetrics()
+        self._global: Optional[_TokenBucket] = None
+        self._chats: Dict[Union[int, str], _TokenBucket] = {}
+
+    async def initialize(self) -> None:
+        self._global = _TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+
+    async def shutdown(self) -> None:
+        logger.info(f"📨 Ограничитель отправки: {self.metrics.format()}")
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                for idle_chat_id in [key for key, value in self._chats.items() if value.is_idle()]:
+                    del self._chats[idle_chat_id]
+            # Отрицательный chat_id (или @username канала) - группа или канал
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = _TokenBucket(GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE, CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        metrics = self.metrics
+        metrics.requests += 1
+        metrics.by_priority[priority] = metrics.by_priority.get(priority, 0) + 1
+        chat_bucket = self._chat_bucket(chat_id)
+
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            # Сначала лимит чата: запрос, упершийся в свой чат, не занимает общий токен
+            await chat_bucket.acquire(priority)
+            await self._global.acquire(priority)
+            waited = time.monotonic() - started
+            if waited > 0.01:
+                metrics.delayed += 1
+                metrics.total_wait += waited
+                metrics.max_wait = max(metrics.max_wait, waited)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                metrics.retry_after += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"⚠️ 429 на {endpoint} в чат {chat_id}: пауза {e.retry_after} сек")
+                # Flood control у Telegram общий для бота - притормаживаем все
+                self._global.pause(e.retry_after)
+                chat_bucket.pause(e.retry_after)
@@ -0,0 +1,61 @@
+"""Отправка длинных отчетов: строки из генератора упаковываются в сообщения по границам строк"""
+from typing import Iterable, Iterator
+import logging
+
+from telegram import Message
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram 4096 символов, оставляем запас
+MESSAGE_LIMIT = 4000
+
+def pack_lines(lines: Iterable[str], limit: int = MESSAGE_LIMIT) -> Iterator[str]:
+    """Собрать строки в сообщения не длиннее limit, не разрывая строки.
+
+    Строка длиннее лимита режется на куски - иначе ее не отправить.
+    """
+    buffer = []
+    size = 0
+    for line in lines:
+        while len(line) > limit:
+            if buffer:
+                yield "\n".join(buffer)
+                buffer, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+
+        # +1 на перевод строки перед новой строкой
+        added = len(line) + (1 if buffer else 0)
+        if buffer and size + added > limit:
+            yield "\n".join(buffer)
+            buffer, size = [], 0
+            added = len(line)
+        buffer.append(line)
+        size += added
+
+    text = "\n".join(buffer)
+    if text.strip():
+        yield text
+
+async def send_report(message: Message, lines: Iterable[str], reply_markup=None,
+                      limit: int = MESSAGE_LIMIT) -> int:
+    """Отправить отчет частями. Клавиатура прикрепляется к последней части.
+
+    Строки должны строиться из уже загруженных данных: сессию БД на время отправки не держим.
+
+    Возвращает количество отправленных сообщений.
+    """
+    sent = 0
+    pending = None
+    for chunk in pack_lines(lines, limit):
+        if pending is not None:
+            await message.reply_text(pending)
+            sent += 1
+        pending = chunk
+
+    if pending is not None:
+        await message.reply_text(pending, reply_markup=reply_markup)
+        sent += 1
+    elif reply_markup is not None:
+        logger.warning("⚠️ Пустой отчет, клавиатура не отправлена")
+    return sent
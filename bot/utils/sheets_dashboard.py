@@ -0,0 +1,185 @@
+"""Дашборд в Google Sheets: статистика бариста и чек-листов одним запросом, только изменившиеся строки"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import threading
+import logging
+
+import gspread
+
+from bot.database.stats_queries import get_barista_stats_period
+from bot.database.checklist_stats_operations import iter_point_stats
+from bot.utils.google_sheets import get_sheet_client, SPREADSHEET_ID
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_SHEET_TITLE = "Дашборд"
+DASHBOARD_INTERVAL_SECONDS = 15 * 60
+# Ширина сетки дашборда: A:I
+DASHBOARD_COLUMNS = 9
+DASHBOARD_LAST_COLUMN = gspread.utils.rowcol_to_a1(1, DASHBOARD_COLUMNS).rstrip("0123456789")
+
+BARISTA_HEADER = ["Бариста", "Эспрессо", "Ср", "Фильтр", "Ср", "Молочные", "Ср", "Всего", "Общ. ср"]
+CHECKLIST_HEADER = ["Точка", "Утро, %", "Смен", "Вечер, %", "Смен", "Пересмен, %", "Смен"]
+CHECKLIST_SHIFT_TYPES = ("morning", "evening", "hybrid")
+
+Row = List
+Grid = List[Row]
+
+# Что лежит на листе после последней успешной записи (None - неизвестно: после перезапуска или ошибки читаем лист)
+_last_grid: Optional[Grid] = None
+_last_section_rows: Tuple[int, ...] = ()
+_worksheet: Optional[gspread.Worksheet] = None
+_push_lock = threading.Lock()
+
+def _barista_rows(stats: Sequence[Tuple]) -> Grid:
+    rows = []
+    for barista, espresso_count, espresso_avg, filter_count, filter_avg, milk_count, milk_avg, total_count, total_avg in stats:
+        rows.append([
+            barista, espresso_count or 0, espresso_avg or 0, filter_count or 0, filter_avg or 0,
+            milk_count or 0, milk_avg or 0, total_count, total_avg or 0
+        ])
+    return rows
+
+def _checklist_rows(start_date: date, end_date: date) -> Grid:
+    """Средний % выполнения по точке и типу смены (взвешенный по числу смен)"""
+    totals: Dict[str, Dict[str, List[float]]] = {}
+    for row in iter_point_stats(start_date, end_date):
+        point_totals = totals.setdefault(row['point'], {shift_type: [0.0, 0] for shift_type in CHECKLIST_SHIFT_TYPES})
+        for shift_type in CHECKLIST_SHIFT_TYPES:
+            count = row[f'{shift_type}_shift_count']
+            point_totals[shift_type][0] += row[f'{shift_type}_avg_completion'] * count
+            point_totals[shift_type][1] += count
+
+    rows = []
+    for point in sorted(totals):
+        row = [point]
+        for shift_type in CHECKLIST_SHIFT_TYPES:
+            weighted, count = totals[point][shift_type]
+            row += [round(weighted / count, 1) if count else 0, count]
+        rows.append(row)
+    return rows
+
+def build_dashboard(today: date) -> Tuple[Grid, Tuple[int, ...]]:
+    """Сетка значений дашборда (без строки «обновлено») и номера строк заголовков секций"""
+    grid: Grid = []
+    # grid[i] - строка листа i + 2 (первая строка - «обновлено»)
+    section_rows = []
+
+    def section(title: str, header: Row, rows: Grid):
+        grid.append([])
+        grid.append([title])
+        section_rows.append(len(grid) + 1)
+        grid.append(list(header))
+        section_rows.append(len(grid) + 1)
+        grid.extend(rows or [["Нет данных"]])
+
+    for title, days in (("Оценки бариста — 7 дней", 7), ("Оценки бариста — 30 дней", 30)):
+        stats = get_barista_stats_period((today - timedelta(days=days)).isoformat(), today.isoformat())
+        section(title, BARISTA_HEADER, _barista_rows(stats))
+
+    # Чек-листы - по вчерашний день: закрытый период считается один раз и дальше берется из кэша отчетов
+    yesterday = today - timedelta(days=1)
+    section("Чек-листы — 30 дней (по вчера)", CHECKLIST_HEADER, _checklist_rows(yesterday - timedelta(days=29), yesterday))
+    return grid, tuple(section_rows)
+
+def _pad(row: Row) -> Row:
+    return list(row) + [""] * (DASHBOARD_COLUMNS - len(row))
+
+def diff_ranges(old: Grid, new: Grid, first_row: int = 2) -> List[Dict]:
+    """Диапазоны для values.batchUpdate: только подряд идущие изменившиеся строки.
+
+    Строки, которых в новой сетке нет, очищаются. first_row - номер строки листа для grid[0].
+    """
+    ranges = []
+    block_start = None
+    block: Grid = []
+    for index in range(max(len(old), len(new)) + 1):
+        old_row = _pad(old[index]) if index < len(old) else None
+        new_row = _pad(new[index]) if index < len(new) else (_pad([]) if index < len(old) else None)
+        if new_row is not None and old_row != new_row:
+            if block_start is None:
+                block_start = index
+            block.append(new_row)
+            continue
+        if block_start is not None:
+            start = first_row + block_start
+            ranges.append({
+                "range": f"'{DASHBOARD_SHEET_TITLE}'!A{start}:{DASHBOARD_LAST_COLUMN}{start + len(block) - 1}",
+                "values": block
+            })
+            block_start, block = None, []
+    return ranges
+
+def _format_requests(worksheet: gspread.Worksheet, section_rows: Tuple[int, ...], total_rows: int) -> List[Dict]:
+    """Один batchUpdate форматирования: жирные заголовки секций, остальное обычным"""
+    def bold(start_row: int, end_row: int, is_bold: bool) -> Dict:
+        return {
+            "repeatCell": {
+                "range": {
+                    "sheetId": worksheet.id,
+                    "startRowIndex": start_row - 1,
+                    "endRowIndex": end_row,
+                    "startColumnIndex": 0,
+                    "endColumnIndex": DASHBOARD_COLUMNS
+                },
+                "cell": {"userEnteredFormat": {"textFormat": {"bold": is_bold}}},
+                "fields": "userEnteredFormat.textFormat.bold"
+            }
+        }
+    return [bold(1, total_rows, False), bold(1, 1, True)] + [bold(row, row, True) for row in section_rows]
+
+def _get_worksheet() -> gspread.Worksheet:
+    global _worksheet
+    if _worksheet is None:
+        spreadsheet = get_sheet_client().open_by_key(SPREADSHEET_ID)
+        try:
+            _worksheet = spreadsheet.worksheet(DASHBOARD_SHEET_TITLE)
+        except gspread.exceptions.WorksheetNotFound:
+            _worksheet = spreadsheet.add_worksheet(DASHBOARD_SHEET_TITLE, rows=200, cols=DASHBOARD_COLUMNS)
+            logger.info(f"✅ Создан лист {DASHBOARD_SHEET_TITLE}")
+    return _worksheet
+
+def _read_grid(worksheet: gspread.Worksheet) -> Grid:
+    """Текущая сетка на листе (со второй строки) - база для сравнения, когда прошлая запись неизвестна"""
+    return worksheet.get_values(f"A2:{DASHBOARD_LAST_COLUMN}{worksheet.row_count}")
+
+def push_dashboard(today: Optional[date] = None) -> int:
+    """Обновить дашборд. Возвращает количество записанных диапазонов (0 - ничего не изменилось, API не трогали)."""
+    global _last_grid, _last_section_rows, _worksheet
+    with _push_lock:
+        grid, section_rows = build_dashboard(today or date.today())
+        if _last_grid is not None:
+            ranges = diff_ranges(_last_grid, grid)
+            layout_changed = section_rows != _last_section_rows
+            if not ranges and not layout_changed:
+                return 0
+
+        try:
+            worksheet = _get_worksheet()
+            if _last_grid is None:
+                # Первая запись после запуска: на листе могут остаться строки длиннее новой сетки - сравниваем с ними
+                _last_grid = _read_grid(worksheet)
+                ranges = diff_ranges(_last_grid, grid)
+                layout_changed = True
+            # +1 - строка «обновлено» над сеткой
+            needed_rows = max(len(grid), len(_last_grid)) + 1
+            if needed_rows > worksheet.row_count:
+                worksheet.add_rows(needed_rows - worksheet.row_count)
+
+            ranges.insert(0, {
+                "range": f"'{DASHBOARD_SHEET_TITLE}'!A1:C1",
+                "values": [["☕ Дашборд качества", "Обновлено:", datetime.now().strftime('%d.%m.%Y %H:%M')]]
+            })
+            worksheet.spreadsheet.values_batch_update({"valueInputOption": "RAW", "data": ranges})
+            if layout_changed:
+                worksheet.spreadsheet.batch_update({"requests": _format_requests(worksheet, section_rows, needed_rows)})
+        except Exception as e:
+            # Лист могли удалить или переименовать - найдем заново в следующий раз
+            _worksheet, _last_grid = None, None
+            logger.error(f"❌ Ошибка обновления дашборда в Google Sheets: {e}")
+            raise
+
+        _last_grid, _last_section_rows = grid, section_rows
+        logger.info(f"📊 Дашборд обновлен: диапазонов {len(ranges)}"
+                    f"{', форматирование' if layout_changed else ''}")
+        return len(ranges)
@@ -0,0 +1,184 @@
+"""Напоминания о сменах и чек-листах через JobQueue"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+from telegram.ext import ContextTypes, JobQueue
+
+from bot.database.active_shifts import CHECKLIST_WINDOW
+from bot.database.checklist_operations import get_tasks_for_shift, get_completed_tasks_for_shift
+from bot.database.unit_of_work import use_session
+from bot.database.schedule_snapshot import ScheduleSnapshot, SnapshotShift, get_schedule_snapshot
+from bot.utils.batch_sender import send_batch
+
+logger = logging.getLogger(__name__)
+
+REMINDER_BEFORE_START = timedelta(minutes=30)
+# Напоминание отметить задачи, пока смена еще идет
+CHECKLIST_DUE_BEFORE_END = timedelta(hours=1)
+# Последнее предупреждение перед закрытием окна чек-листа (конец смены + 1 час)
+INCOMPLETE_BEFORE_CLOSE = timedelta(minutes=20)
+# Ежедневное планирование напоминаний на сутки вперед
+PLANNING_TIME = time(0, 5)
+
+REMINDER_JOB_PREFIX = "shift_reminder"
+
+REMINDER_START = "start"
+REMINDER_CHECKLIST_DUE = "checklist_due"
+REMINDER_INCOMPLETE = "incomplete"
+
+@dataclass(frozen=True)
+class Reminder:
+    """Одно напоминание сотруднику по конкретной смене"""
+    kind: str
+    fire_at: datetime
+    shift: SnapshotShift
+    user_id: int
+    telegram_id: int
+
+def _shift_bounds(shift: SnapshotShift) -> Tuple[datetime, datetime]:
+    starts_at = datetime.combine(shift.shift_date, shift.start_time)
+    ends_at = datetime.combine(shift.shift_date, shift.end_time)
+    if ends_at <= starts_at:
+        ends_at += timedelta(days=1)
+    return starts_at, ends_at
+
+def build_reminders(snapshot: ScheduleSnapshot, now: datetime) -> List[Reminder]:
+    """Все будущие напоминания по сменам вчера/сегодня/завтра одним проходом по снимку"""
+    reminders = []
+    skipped_without_chat = set()
+    for offset in (-1, 0, 1):
+        day = now.date() + timedelta(days=offset)
+        for slot in snapshot.by_date.get(day, {}).values():
+            for shift in slot:
+                user = snapshot.users.get(shift.iiko_id)
+                if not user or not user.is_active:
+                    continue
+                if not user.telegram_id:
+                    skipped_without_chat.add(user.iiko_id)
+                    continue
+                starts_at, ends_at = _shift_bounds(shift)
+                for kind, fire_at in (
+                    (REMINDER_START, starts_at - REMINDER_BEFORE_START),
+                    (REMINDER_CHECKLIST_DUE, ends_at - CHECKLIST_DUE_BEFORE_END),
+                    (REMINDER_INCOMPLETE, ends_at + CHECKLIST_WINDOW - INCOMPLETE_BEFORE_CLOSE),
+                ):
+                    if fire_at > now:
+                        reminders.append(Reminder(kind, fire_at, shift, user.user_id, user.telegram_id))
+    if skipped_without_chat:
+        logger.info(f"🔕 Без напоминаний (не нажимали /start): {len(skipped_without_chat)} сотрудников")
+    return reminders
+
+_planned_snapshot: Optional[ScheduleSnapshot] = None
+
+def plan_reminders(job_queue: JobQueue, snapshot: ScheduleSnapshot, now: datetime) -> int:
+    """Пересоздать задания напоминаний: одно задание на момент времени со всеми получателями"""
+    global _planned_snapshot
+    for job in job_queue.jobs():
+        if job.name and job.name.startswith(REMINDER_JOB_PREFIX):
+            job.schedule_removal()
+
+    batches: Dict[datetime, List[Reminder]] = {}
+    for reminder in build_reminders(snapshot, now):
+        batches.setdefault(reminder.fire_at, []).append(reminder)
+
+    for fire_at, reminders in batches.items():
+        job_queue.run_once(
+            send_reminders_job,
+            # Время в расписании локальное
+            when=fire_at.astimezone(),
+            data=reminders,
+            name=f"{REMINDER_JOB_PREFIX}_{fire_at:%Y%m%d_%H%M}"
+        )
+    _planned_snapshot = snapshot
+    logger.info(f"🔔 Запланировано напоминаний: {sum(len(batch) for batch in batches.values())} "
+                f"({len(batches)} заданий)")
+    return len(batches)
+
+async def plan_reminders_job(context: ContextTypes.DEFAULT_TYPE):
+    """Ежедневное планирование (и при старте бота)"""
+    snapshot = await asyncio.to_thread(get_schedule_snapshot)
+    plan_reminders(context.job_queue, snapshot, datetime.now())
+
+async def replan_reminders_if_changed(context: ContextTypes.DEFAULT_TYPE):
+    """Перепланировать, если снимок расписания перестроен (замена, парсинг, новый пользователь)"""
+    snapshot = await asyncio.to_thread(get_schedule_snapshot)
+    if snapshot is not _planned_snapshot:
+        plan_reminders(context.job_queue, snapshot, datetime.now())
+
+def _render_reminders(reminders: List[Reminder]) -> List[Tuple[int, str]]:
+    """Тексты напоминаний. Задачи и отметки читаются один раз на смену точки, а не на сотрудника"""
+    snapshot = get_schedule_snapshot()
+    tasks_cache: Dict[Tuple[date, str, str], list] = {}
+    completed_cache: Dict[Tuple[date, str], set] = {}
+    messages = []
+
+    # Одна сессия на всю пачку напоминаний
+    with use_session() as db:
+        for reminder in reminders:
+            shift = reminder.shift
+            # Смену могли передать другому или изменить после планирования
+            if shift not in snapshot.get_shifts(shift.iiko_id, shift.shift_date, shift.shift_date):
+                continue
+
+            tasks_key = (shift.shift_date, shift.shift_type, shift.point)
+            if tasks_key not in tasks_cache:
+                tasks_cache[tasks_key] = get_tasks_for_shift(reminder.user_id, *tasks_key, db)
+            tasks = tasks_cache[tasks_key]
+            time_text = f"{shift.start_time.strftime('%H:%M')} - {shift.end_time.strftime('%H:%M')}"
+
+            if reminder.kind == REMINDER_START:
+                text = (
+                    f"⏰ Через {int(REMINDER_BEFORE_START.total_seconds() // 60)} минут смена\n\n"
+                    f"📍 {shift.point}, {shift.name}\n"
+                    f"🕒 {time_text}"
+                )
+                if tasks:
+                    text += f"\n📝 В чек-листе задач: {len(tasks)}"
+                messages.append((reminder.telegram_id, text))
+                continue
+
+            if not tasks:
+                continue
+            completed_key = (shift.shift_date, shift.point)
+            if completed_key not in completed_cache:
+                completed_cache[completed_key] = set(get_completed_tasks_for_shift(*completed_key, db))
+            pending = [task for task in tasks if task.id not in completed_cache[completed_key]]
+            if not pending:
+                continue
+
+            if reminder.kind == REMINDER_CHECKLIST_DUE:
+                text = (
+                    f"📝 До конца смены час — проверьте чек-лист\n\n"
+                    f"📍 {shift.point}, {time_text}\n"
+                    f"📊 Выполнено: {len(tasks) - len(pending)}/{len(tasks)}"
+                )
+            else:
+                pending_text = "\n".join(f"☐ {task.task_description}" for task in pending)
+                text = (
+                    f"⚠️ Чек-лист закроется через {int(INCOMPLETE_BEFORE_CLOSE.total_seconds() // 60)} минут\n\n"
+                    f"📍 {shift.point}, {time_text}\n"
+                    f"Не отмечено:\n{pending_text}"
+                )
+            messages.append((reminder.telegram_id, text))
+    return messages
+
+async def send_reminders_job(context: ContextTypes.DEFAULT_TYPE):
+    """Отправить пачку напоминаний, назначенных на один момент времени"""
+    reminders = context.job.data
+    messages = await asyncio.to_thread(_render_reminders, reminders)
+    if not messages:
+        return
+    sent = await send_batch(context.bot, messages)
+    logger.info(f"🔔 Напоминания {context.job.name}: отправлено {sent}/{len(messages)}")
+
+def setup_shift_reminders(job_queue: JobQueue):
+    """Ежедневное планирование напоминаний + первичное при старте"""
+    job_queue.run_daily(
+        plan_reminders_job,
+        time=PLANNING_TIME.replace(tzinfo=datetime.now().astimezone().tzinfo),
+        name="reminders_planning"
+    )
+    job_queue.run_once(plan_reminders_job, when=0, name="reminders_initial_planning")
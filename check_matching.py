@@ -0,0 +1,88 @@
+"""Проверка и замер распределения «кто кому дарит» (bot/utils/matching.py).
+
+Запуск: python check_matching.py
+Для n = 2..5000 проверяет, что derange дает корректный деранжемент (один цикл, никто не дарит себе,
+запрещенные пары не встречаются) без ограничений, с forbid_same, с forbid_pairs и с обоими сразу.
+"""
+import random
+import sys
+import time
+
+from bot.utils.matching import MatchingError, combine_exclusions, derange, forbid_pairs, forbid_same
+
+SIZES = list(range(2, 201)) + [300, 500, 1000, 2000, 3000, 5000]
+SEEDS_SMALL = 5
+POINTS = 12
+# Меньше этого ограничения «точка + прошлые пары» могут быть невыполнимы - MatchingError допустим
+MIN_FEASIBLE = 10
+
+def check_assignment(items, assignment, exclude=None):
+    """Текст ошибки или None"""
+    if set(assignment) != set(items) or set(assignment.values()) != set(items):
+        return "не биекция"
+    if any(giver == receiver for giver, receiver in assignment.items()):
+        return "кто-то дарит себе"
+    if exclude and any(exclude(giver, receiver) for giver, receiver in assignment.items()):
+        return "запрещенная пара"
+    # Один цикл: от любого участника обходим всех
+    current, steps = items[0], 0
+    while True:
+        current, steps = assignment[current], steps + 1
+        if current == items[0]:
+            break
+    if steps != len(items):
+        return f"несколько циклов (первый длины {steps})"
+    return None
+
+def main():
+    print("🔍 Проверяем derange...")
+    failures = 0
+    allowed_errors = 0
+    timings = {}
+
+    for n in SIZES:
+        items = list(range(n))
+        point_of = {item: item % min(POINTS, n) for item in items}
+        for seed in range(SEEDS_SMALL if n <= 200 else 1):
+            rng = random.Random(seed * 100003 + n)
+            previous = derange(items, rng=rng)
+            rules = {
+                "без ограничений": None,
+                "одна точка": forbid_same(point_of.get),
+                "прошлые пары": forbid_pairs(previous.items()),
+                "точка + прошлые пары": combine_exclusions(forbid_same(point_of.get),
+                                                           forbid_pairs(previous.items())),
+            }
+            for name, exclude in rules.items():
+                started = time.perf_counter()
+                try:
+                    assignment = derange(items, exclude, rng)
+                except MatchingError as e:
+                    if n < MIN_FEASIBLE and exclude is not None:
+                        allowed_errors += 1
+                        continue
+                    print(f"❌ n={n}, seed={seed}, {name}: {e}")
+                    failures += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                if n >= 1000:
+                    timings[(n, name)] = elapsed
+                error = check_assignment(items, assignment, exclude)
+                if error:
+                    print(f"❌ n={n}, seed={seed}, {name}: {error}")
+                    failures += 1
+
+    print("\n⏱️ Время derange:")
+    for (n, name), elapsed in timings.items():
+        print(f"  n={n:5d}  {name:22s} {elapsed * 1000:8.1f} мс")
+
+    if allowed_errors:
+        print(f"\nℹ️ Невыполнимых ограничений при n < {MIN_FEASIBLE}: {allowed_errors}")
+    if failures:
+        print(f"\n🚨 Ошибок: {failures}")
+        return 1
+    print(f"\n✅ Все распределения корректны ({len(SIZES)} размеров, n до {SIZES[-1]})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Проверка восстановления user_data из bot_state.db (bot/utils/persistence.py).
+
+Запуск: python check_persistence.py
+Запись с моделью чтения, у которой после деплоя изменились поля или которой больше нет, должна
+отбрасываться с предупреждением, а не ронять запуск бота.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import date
+
+from bot.database.read_models import UserView
+from bot.utils.persistence import SQLitePersistence, decode_user_data, encode_user_data
+
+def _user_fields():
+    return {"id": 1, "name": "Анна", "iiko_id": "101", "telegram_id": 5, "telegram_username": "anna",
+            "role": "barista", "is_active": 1}
+
+def _record(model: str, fields: dict) -> str:
+    return json.dumps({"user": {"__read_model__": model, "fields": fields}, "step": "ok"})
+
+def main():
+    print("🔍 Проверяем восстановление user_data...")
+    failures = 0
+
+    original = {"user": UserView(**_user_fields()), "day": date(2026, 10, 19), "tasks": {3: True}}
+    if decode_user_data(encode_user_data(original)) != original:
+        print("❌ Модель чтения не восстанавливается без изменений")
+        failures += 1
+
+    extra = dict(_user_fields(), nickname="Аня")
+    missing = {key: value for key, value in _user_fields().items() if key != "role"}
+    records = {
+        1: _record("UserView", _user_fields()),
+        2: _record("UserView", extra),
+        3: _record("UserView", missing),
+        4: _record("RemovedView", _user_fields()),
+        5: "{не json",
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        persistence = SQLitePersistence(path)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany("INSERT INTO persisted_user_data (user_id, data) VALUES (?, ?)", records.items())
+        conn.close()
+
+        try:
+            restored = asyncio.run(persistence.get_user_data())
+        except Exception as e:
+            print(f"❌ get_user_data упал: {e!r}")
+            return 1
+
+    if set(restored) != {1}:
+        print(f"❌ Восстановлены пользователи {sorted(restored)}, ожидался только 1")
+        failures += 1
+    elif restored[1]["user"] != UserView(**_user_fields()):
+        print("❌ Корректная запись восстановлена с ошибкой")
+        failures += 1
+
+    if failures:
+        print(f"\n🚨 Ошибок: {failures}")
+        return 1
+    print("\n✅ Лишнее поле, недостающее поле, удаленная модель и битый JSON отброшены, корректная запись восстановлена")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())